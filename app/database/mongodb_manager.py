@@ -3,23 +3,34 @@ MongoDB数据库管理类
 """
 
 import os
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError, PyMongoError
-import hashlib
-import json
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from datetime import datetime, timezone
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+import logging
 from dotenv import load_dotenv
+from app.database.shared_state import SharedStateManager
+from app.utils.article_codec import pack_extra, split_article, unpack_extra
+from app.utils.date_parser import parse_datetime, get_published
+from app.utils.article_id import ARTICLE_ID_FIELD, compute_article_id, ensure_article_id
+from app.utils.tickers import get_tickers
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 舊文檔遷移的版本，完成後記錄在 schema_info 集合；新增遷移步驟時加一
+SCHEMA_VERSION = 1
+
 
 class MongoDBManager:
     """MongoDB数据库管理器"""
     
     def __init__(self):
         self.connection_string = os.getenv("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017/newsfilter")
+        # 文章保留天數，由 created_at 上的 TTL 索引自動刪除
+        self.retention_days = int(os.getenv("MONGODB_RETENTION_DAYS", "30"))
         self.client = None
         self.db = None
         self.collection = None
@@ -40,20 +51,142 @@ class MongoDBManager:
             
             # 创建唯一索引
             self.collection.create_index("article_hash", unique=True)
-            self.collection.create_index([("symbol", 1), ("published_at", -1)])
+            # symbols 為多鍵索引：文章帶的每隻股票各有一個索引項；article_hash 作為同一時間的排序鍵，
+            # 按股票和時間範圍的鍵集分頁完全走索引
+            self.collection.create_index([("symbols", 1), ("published_at", -1), ("article_hash", -1)])
+            self._drop_index_if_exists("symbol_1_published_at_-1")
+            self._drop_index_if_exists("symbols_1_published_at_-1")
+            # 入庫時計算的評分，跨股票查詢高分新聞；與 get_top_articles 的排序和鍵集游標一致
+            self.collection.create_index([("score", -1), ("published_at", -1), ("article_hash", -1)])
+            self._drop_index_if_exists("score_-1_published_at_-1")
+            self._ensure_ttl_index()
+            
+            self._run_migrations()
             
-            print(f"✅ MongoDB connected to: {db_name}")
+            logger.info(f"✅ MongoDB connected to: {db_name}")
             
         except Exception as e:
-            print(f"❌ MongoDB connection failed: {e}")
-            print("⚠️ Running without MongoDB - data will only be cached in SQLite")
+            logger.error(f"❌ MongoDB connection failed: {e}")
+            logger.warning("⚠️ Running without MongoDB - data will only be cached in SQLite")
             self.client = None
     
-    def _generate_article_hash(self, article: Dict[str, Any]) -> str:
-        """生成文章唯一hash"""
-        # 使用标题+URL+发布时间生成唯一hash
-        unique_string = f"{article.get('title', '')}{article.get('url', '')}{article.get('published', '')}"
-        return hashlib.md5(unique_string.encode()).hexdigest()
+    def _drop_index_if_exists(self, name: str):
+        """刪除已被新索引覆蓋的舊索引"""
+        if name in self.collection.index_information():
+            self.collection.drop_index(name)
+            logger.info(f"🗂️ Dropped redundant MongoDB index {name}")
+    
+    def _ensure_ttl_index(self):
+        """created_at 上的 TTL 索引，過期文章由 MongoDB 後台自動刪除"""
+        expire_seconds = self.retention_days * 86400
+        try:
+            self.collection.create_index("created_at", name="created_at_ttl", expireAfterSeconds=expire_seconds)
+        except OperationFailure:
+            # 保留天數改變：修改已有索引的過期時間，不用重建
+            self.db.command("collMod", self.collection.name,
+                            index={"name": "created_at_ttl", "expireAfterSeconds": expire_seconds})
+            logger.info(f"🕒 MongoDB retention updated to {self.retention_days} days")
+    
+    def _schema_version(self) -> int:
+        doc = self.db.schema_info.find_one({"_id": self.collection.name})
+        return doc.get("version", 0) if doc else 0
+    
+    def _run_migrations(self):
+        """
+        舊文檔遷移（全表掃描），完成後記錄版本，之後的啟動直接跳過
+        多個 worker 或 CLI 同時啟動時由共享鎖保證只有一個進程執行，其他進程不等待、不重複執行
+        """
+        if self._schema_version() >= SCHEMA_VERSION:
+            return
+        
+        shared_state = SharedStateManager()
+        owner = shared_state.try_lock("mongodb_migrations", ttl=3600)
+        if owner is None:
+            logger.info("⏳ Another process is migrating MongoDB documents, skipping")
+            return
+        
+        try:
+            if self._schema_version() >= SCHEMA_VERSION:
+                return
+            
+            self._migrate_article_ids()
+            self._migrate_symbols()
+            self._fix_missing_published_at()
+            self._compact_legacy_articles()
+            
+            self.db.schema_info.update_one(
+                {"_id": self.collection.name},
+                {"$set": {"version": SCHEMA_VERSION, "migrated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+            logger.info(f"🗂️ MongoDB documents migrated to schema version {SCHEMA_VERSION}")
+        finally:
+            shared_state.release_lock("mongodb_migrations", owner)
+    
+    def _migrate_article_ids(self):
+        """舊文檔以 md5(title+url+published) 為鍵，改為統一的文章ID；轉換後重複的舊文檔刪除"""
+        migrated = removed = 0
+        
+        for doc in self.collection.find({f"raw_data.{ARTICLE_ID_FIELD}": {"$exists": False}}, {"raw_data": 1}):
+            article_id = compute_article_id(doc.get("raw_data") or {})
+            try:
+                self.collection.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {"article_hash": article_id, f"raw_data.{ARTICLE_ID_FIELD}": article_id}}
+                )
+                migrated += 1
+            except DuplicateKeyError:
+                self.collection.delete_one({"_id": doc["_id"]})
+                removed += 1
+        
+        if migrated or removed:
+            logger.info(f"🔑 Migrated {migrated} MongoDB articles to canonical article IDs ({removed} duplicates removed)")
+    
+    def _migrate_symbols(self):
+        """舊文檔只有查詢時的 symbol，補充 symbols 列表（合併原始數據中的 symbols）"""
+        result = self.collection.update_many(
+            {"symbols": {"$exists": False}},
+            [{"$set": {"symbols": {"$setUnion": [["$symbol"], {"$ifNull": ["$raw_data.symbols", []]}]}}}]
+        )
+        if result.modified_count:
+            logger.info(f"🏷️ Added symbols list to {result.modified_count} MongoDB articles")
+    
+    def _fix_missing_published_at(self):
+        """舊版日期解析只支持少數格式，留下 published_at 為 null 的文檔：重新解析，仍然失敗時用入庫時間"""
+        fixed = 0
+        for doc in self.collection.find({"published_at": None}, {"published": 1, "created_at": 1}):
+            published_at = self._parse_published_date(doc.get("published", "")) or doc.get("created_at")
+            if published_at:
+                published_at = published_at.replace(microsecond=0)
+                self.collection.update_one({"_id": doc["_id"]}, {"$set": {"published_at": published_at}})
+                fixed += 1
+        
+        if fixed:
+            logger.info(f"📅 Filled published_at for {fixed} MongoDB articles")
+    
+    def _compact_legacy_articles(self, batch_size: int = 1000):
+        """
+        舊文檔的 raw_data 為完整原始文章，且在頂層重複保存了標題、鏈接等欄位：
+        改為緊湊格式（raw_data 只留核心欄位，其餘欄位壓縮到 raw_extra）
+        """
+        compacted = 0
+        operations = []
+        duplicated = {"title": "", "url": "", "description": "", "source": "", "keywords": ""}
+        
+        for doc in self.collection.find({"raw_extra": {"$exists": False}}, {"raw_data": 1}):
+            core, extra = split_article(doc.get("raw_data") or {})
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"raw_data": core, "raw_extra": pack_extra(extra)}, "$unset": duplicated}
+            ))
+            if len(operations) >= batch_size:
+                compacted += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        
+        if operations:
+            compacted += self.collection.bulk_write(operations, ordered=False).modified_count
+        if compacted:
+            logger.info(f"🗜️ Compacted {compacted} MongoDB articles")
     
     def save_news_articles(self, symbol: str, articles: List[Dict[str, Any]]) -> int:
         """保存新闻文章到MongoDB，去重处理"""
@@ -64,100 +197,264 @@ class MongoDBManager:
         
         for article in articles:
             try:
-                # 准备文档
-                doc = {
-                    "article_hash": self._generate_article_hash(article),
-                    "symbol": symbol.upper(),
-                    "title": article.get("title", ""),
-                    "url": article.get("url", ""),
-                    "description": article.get("description", ""),
-                    "published": article.get("publishedAt", "") or article.get("published", ""),
-                    "published_at": self._parse_published_date(article.get("publishedAt", "") or article.get("published", "")),
-                    "source": article.get("source", {}),
-                    "raw_data": article,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
+                article_hash = ensure_article_id(article)
+                doc = self._article_doc(symbol, article)
                 
-                # 尝试插入，如果重复则跳过
-                self.collection.insert_one(doc)
-                saved_count += 1
+                # 新文章插入；已存在的文章只補充股票
+                result = self.collection.update_one(
+                    {"article_hash": article_hash},
+                    {
+                        "$setOnInsert": doc,
+                        "$addToSet": {"symbols": {"$each": get_tickers(article, symbol)}},
+                        "$set": {"updated_at": datetime.utcnow()}
+                    },
+                    upsert=True
+                )
+                if result.upserted_id is not None:
+                    saved_count += 1
                 
             except DuplicateKeyError:
-                # 文章已存在，跳过
+                # 並發插入同一篇文章，已由另一個請求保存
                 continue
             except Exception as e:
-                print(f"⚠️ Error saving article: {e}")
+                logger.warning(f"⚠️ Error saving article: {e}")
                 continue
         
         if saved_count > 0:
-            print(f"💾 Saved {saved_count} new articles for {symbol} to MongoDB")
+            logger.info(f"💾 Saved {saved_count} new articles for {symbol} to MongoDB")
         
         return saved_count
     
-    def get_news_articles(self, symbol: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """从MongoDB获取新闻文章"""
+    def _article_doc(self, symbol: str, article: Dict[str, Any], published_ts: Optional[int] = None) -> Dict[str, Any]:
+        """
+        新文章的文檔（symbol 為首次抓取時查詢的股票，symbols 為文章關聯的所有股票）
+        raw_data 只保存流程用到的核心欄位，其餘原始欄位壓縮保存在 raw_extra（讀取時不取）
+        published_ts: 已解析的發布時間戳，不傳時在此解析
+        """
+        if published_ts:
+            published_at = datetime.fromtimestamp(published_ts, tz=timezone.utc)
+        else:
+            published_at = self._parse_published_date(get_published(article))
+        
+        article_hash = ensure_article_id(article)
+        core, extra = split_article(article)
+        return {
+            "article_hash": article_hash,
+            "symbol": symbol.upper(),
+            "published": get_published(article),
+            # 無法解析的發布時間用入庫時間代替，避免文章從按時間的查詢中消失
+            "published_at": published_at or datetime.utcnow().replace(microsecond=0),
+            "raw_data": core,
+            "raw_extra": pack_extra(extra),
+            "score": article.get("score"),
+            "created_at": datetime.utcnow()
+        }
+    
+    def bulk_save_articles(self, articles: List[Dict[str, Any]],
+                           published_ts: Optional[List[int]] = None) -> int:
+        """
+        批量寫入文章（無序 bulk upsert，一次往返，單條失敗不影響其他），用於導入歷史數據
+        每篇文章以自己帶的第一隻股票作為 symbol，沒有股票的文章跳過
+        
+        Returns:
+            新插入的文章數
+        """
+        if not self.client or not articles:
+            return 0
+        
+        now = datetime.utcnow()
+        operations = []
+        for i, article in enumerate(articles):
+            tickers = get_tickers(article)
+            if not tickers:
+                continue
+            doc = self._article_doc(tickers[0], article, published_ts[i] if published_ts else None)
+            operations.append(UpdateOne(
+                {"article_hash": doc["article_hash"]},
+                {
+                    "$setOnInsert": doc,
+                    "$addToSet": {"symbols": {"$each": tickers}},
+                    "$set": {"updated_at": now}
+                },
+                upsert=True
+            ))
+        
+        if not operations:
+            return 0
+        
+        try:
+            return self.collection.bulk_write(operations, ordered=False).upserted_count
+        except BulkWriteError as e:
+            # 並發插入同一篇文章的重複鍵等錯誤只影響單條，其餘已寫入
+            logger.warning(f"⚠️ {len(e.details.get('writeErrors', []))} bulk write errors")
+            return e.details.get("nUpserted", 0)
+    
+    def get_news_articles(self, symbol: str, limit: int = 10, since_ts: Optional[int] = None,
+                          since_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        从MongoDB获取新闻文章（最新的在前；有游標時從舊到新）
+        since_ts 只返回游標之後的文章，按 (發布時間, 文章ID) 從舊到新取前 limit 篇；
+        since_id 為游標文章的ID，同一秒發布的文章按ID區分先後
+        """
         if not self.client:
             return []
         
         try:
+            query: Dict[str, Any] = {"symbols": symbol.upper()}
+            sort = [("published_at", -1)]
+            if since_ts is not None:
+                published_at = datetime.fromtimestamp(since_ts, tz=timezone.utc)
+                if since_id:
+                    query["$or"] = [
+                        {"published_at": {"$gt": published_at}},
+                        {"published_at": published_at, "article_hash": {"$gt": since_id}}
+                    ]
+                else:
+                    query["published_at"] = {"$gt": published_at}
+                sort = [("published_at", 1), ("article_hash", 1)]
+            
             cursor = self.collection.find(
-                {"symbol": symbol.upper()},
+                query,
                 {"_id": 0, "raw_data": 1}  # 只返回原始数据
-            ).sort("published_at", -1).limit(limit)
+            ).sort(sort).limit(limit)
             
             articles = [doc["raw_data"] for doc in cursor]
             
             if articles:
-                print(f"📚 Retrieved {len(articles)} articles for {symbol} from MongoDB")
+                logger.debug("📚 Retrieved %d articles for %s from MongoDB", len(articles), symbol)
             
             return articles
             
         except Exception as e:
-            print(f"❌ Error retrieving articles from MongoDB: {e}")
+            logger.error(f"❌ Error retrieving articles from MongoDB: {e}")
             return []
     
-    def _parse_published_date(self, date_str: str) -> Optional[datetime]:
-        """解析发布日期"""
-        if not date_str:
-            return None
+    def get_top_articles(self, since_ts: int, min_score: Optional[float] = None, limit: int = 20,
+                         cursor: Optional[Tuple[float, int, str]] = None) -> List[Dict[str, Any]]:
+        """
+        跨所有股票按評分從高到低返回發布時間在 since_ts 之後的文章
+        cursor 為上一頁最後一條的 (score, published_ts, article_hash)，按鍵集分頁
+        """
+        if not self.client:
+            return []
         
         try:
-            # 尝试多种日期格式
-            formats = [
-                "%Y-%m-%dT%H:%M:%S.%fZ",
-                "%Y-%m-%dT%H:%M:%SZ", 
-                "%Y-%m-%d %H:%M:%S",
-                "%Y-%m-%d"
-            ]
+            query: Dict[str, Any] = {
+                "published_at": {"$gt": datetime.fromtimestamp(since_ts, tz=timezone.utc)},
+                "score": {"$ne": None} if min_score is None else {"$gte": min_score}
+            }
+            if cursor is not None:
+                score, published_ts, article_hash = cursor
+                published_at = datetime.fromtimestamp(published_ts, tz=timezone.utc)
+                query["$or"] = [
+                    {"score": {"$lt": score}},
+                    {"score": score, "published_at": {"$lt": published_at}},
+                    {"score": score, "published_at": published_at, "article_hash": {"$lt": article_hash}}
+                ]
             
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_str, fmt)
-                except ValueError:
-                    continue
+            docs = self.collection.find(
+                query,
+                {"_id": 0, "raw_data": 1, "score": 1, "published_at": 1, "article_hash": 1}
+            ).sort([("score", -1), ("published_at", -1), ("article_hash", -1)]).limit(limit)
             
-            return None
+            return [
+                {
+                    "article": doc["raw_data"],
+                    "score": doc["score"],
+                    "published_ts": int(doc["published_at"].replace(tzinfo=timezone.utc).timestamp()),
+                    "article_id": doc["article_hash"]
+                }
+                for doc in docs
+            ]
             
-        except Exception:
-            return None
+        except Exception as e:
+            logger.error(f"❌ Error retrieving top articles from MongoDB: {e}")
+            return []
     
-    def cleanup_old_articles(self, days: int = 30):
-        """清理旧文章"""
+    def iter_articles(self, symbols: Optional[List[str]] = None, from_ts: Optional[int] = None,
+                      to_ts: Optional[int] = None, after: Optional[Tuple[int, str]] = None,
+                      limit: int = 0, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        按發布時間從新到舊逐條讀取文章（服務端游標，分批拉取，內存佔用與結果總數無關）
+        
+        Args:
+            symbols: 只返回關聯這些股票的文章，None 為全部
+            from_ts / to_ts: 發布時間範圍 [from_ts, to_ts)
+            after: 上一頁最後一條的 (published_ts, article_hash)，按鍵集分頁
+            limit: 最多返回條數，0 為不限
+        
+        Yields:
+            {"article": 原始文章, "published_ts": 發布時間戳, "article_id": 文章ID, "symbols": 關聯股票}
+        """
         if not self.client:
             return
         
+        query: Dict[str, Any] = {}
+        if symbols:
+            query["symbols"] = {"$in": [s.upper() for s in symbols]}
+        
+        published_range: Dict[str, Any] = {"$ne": None}
+        if from_ts is not None:
+            published_range["$gte"] = datetime.fromtimestamp(from_ts, tz=timezone.utc)
+        if to_ts is not None:
+            published_range["$lt"] = datetime.fromtimestamp(to_ts, tz=timezone.utc)
+        query["published_at"] = published_range
+        
+        if after is not None:
+            published_at = datetime.fromtimestamp(after[0], tz=timezone.utc)
+            query["$or"] = [
+                {"published_at": {"$lt": published_at}},
+                {"published_at": published_at, "article_hash": {"$lt": after[1]}}
+            ]
+        
+        cursor = self.collection.find(
+            query,
+            {"_id": 0, "raw_data": 1, "published_at": 1, "article_hash": 1, "symbols": 1}
+        ).sort([("published_at", -1), ("article_hash", -1)]).limit(limit).batch_size(batch_size)
+        
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            result = self.collection.delete_many({
-                "created_at": {"$lt": cutoff_date}
-            })
-            
-            if result.deleted_count > 0:
-                print(f"🗑️ Deleted {result.deleted_count} old articles from MongoDB")
-                
+            for doc in cursor:
+                yield {
+                    "article": doc["raw_data"],
+                    "published_ts": int(doc["published_at"].replace(tzinfo=timezone.utc).timestamp()),
+                    "article_id": doc["article_hash"],
+                    "symbols": doc.get("symbols", [])
+                }
+        finally:
+            cursor.close()
+    
+    def get_article_timestamp(self, article_hash: str) -> Optional[int]:
+        """根据文章ID获取发布时间戳"""
+        if not self.client:
+            return None
+        
+        try:
+            doc = self.collection.find_one({"article_hash": article_hash}, {"_id": 0, "published_at": 1})
+            if doc and doc.get("published_at"):
+                return int(doc["published_at"].replace(tzinfo=timezone.utc).timestamp())
+        except Exception as e:
+            logger.error(f"❌ Error looking up article in MongoDB: {e}")
+        
+        return None
+    
+    def get_raw_article(self, article_hash: str) -> Optional[Dict[str, Any]]:
+        """完整的原始文章（解壓 raw_extra 並與核心欄位合併），其他讀取只取核心欄位"""
+        if not self.client:
+            return None
+        
+        try:
+            doc = self.collection.find_one({"article_hash": article_hash}, {"_id": 0, "raw_data": 1, "raw_extra": 1})
+            if doc:
+                return {**unpack_extra(doc.get("raw_extra")), **(doc.get("raw_data") or {})}
         except Exception as e:
-            print(f"❌ Error cleaning up MongoDB: {e}")
+            logger.error(f"❌ Error loading raw article from MongoDB: {e}")
+        
+        return None
+    
+    def _parse_published_date(self, date_str: str) -> Optional[datetime]:
+        """解析发布日期（統一為 UTC，精確到秒，與分頁游標中的秒級時間戳一致）"""
+        dt = parse_datetime(date_str)
+        return dt.replace(microsecond=0) if dt else None
     
     def get_stats(self) -> Dict[str, Any]:
         """获取数据库统计信息"""
@@ -169,8 +466,9 @@ class MongoDBManager:
             
             # 按符号统计
             symbol_stats = list(self.collection.aggregate([
+                {"$unwind": "$symbols"},
                 {"$group": {
-                    "_id": "$symbol", 
+                    "_id": "$symbols", 
                     "count": {"$sum": 1},
                     "latest": {"$max": "$published_at"}
                 }},
@@ -184,11 +482,11 @@ class MongoDBManager:
             }
             
         except Exception as e:
-            print(f"❌ Error getting MongoDB stats: {e}")
+            logger.error(f"❌ Error getting MongoDB stats: {e}")
             return {}
     
     def close(self):
         """关闭连接"""
         if self.client:
             self.client.close()
-            print("🔌 MongoDB connection closed")
\ No newline at end of file
+            logger.info("🔌 MongoDB connection closed")
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+slowapi / limits 的 SQLite 存儲
+請求計數保存在共享的 cache.db，多個 uvicorn / gunicorn worker 進程共用同一個限額，
+不需要額外部署 Redis。導入本模組後即可使用 RATE_LIMIT_STORAGE_URI=sqlite:///cache.db
+（與 SQLAlchemy 相同：sqlite:///相對路徑，sqlite:////絕對路徑）
+"""
+
+import sqlite3
+import time
+from typing import Optional
+
+from limits.storage import Storage
+
+
+class SQLiteRateLimitStorage(Storage):
+    """固定窗口計數（slowapi 默認策略）"""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.db_path = (uri or "")[len("sqlite:///"):] or "cache.db"
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开连接（autocommit 模式，由调用方显式 BEGIN IMMEDIATE）"""
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def init_database(self):
+        """初始化請求計數表"""
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                limit_key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits(expires_at)")
+        conn.close()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        """計數加 amount，窗口已過期時從 amount 重新開始"""
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            row = conn.execute(
+                "SELECT count, expires_at FROM rate_limits WHERE limit_key = ?", (key,)
+            ).fetchone()
+
+            if row is None or row[1] <= now:
+                count, expires_at = amount, now + expiry
+                # 新窗口開始時順便清掉已過期的計數，表的大小只與最近活躍的客戶端有關
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            else:
+                count, expires_at = row[0] + amount, row[1]
+
+            conn.execute("""
+                INSERT OR REPLACE INTO rate_limits (limit_key, count, expires_at)
+                VALUES (?, ?, ?)
+            """, (key, count, expires_at))
+            conn.execute("COMMIT")
+
+            return count
+
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> int:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT count FROM rate_limits WHERE limit_key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        conn.close()
+
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT expires_at FROM rate_limits WHERE limit_key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        conn.close()
+
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            conn = self._connect()
+            conn.execute("SELECT 1 FROM rate_limits LIMIT 1")
+            conn.close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        conn = self._connect()
+        deleted = conn.execute("DELETE FROM rate_limits").rowcount
+        conn.close()
+
+        return deleted
+
+    def clear(self, key: str) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM rate_limits WHERE limit_key = ?", (key,))
+        conn.close()
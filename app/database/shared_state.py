@@ -0,0 +1,223 @@
+"""
+跨進程共享狀態管理器
+多個 uvicorn / gunicorn worker 共用同一個 SQLite 文件，協調上游令牌桶和單飛鎖
+"""
+
+import sqlite3
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStateManager:
+    """基於 SQLite 的跨進程令牌桶和互斥鎖"""
+
+    def __init__(self, db_path: str = "cache.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开连接（autocommit 模式，由调用方显式 BEGIN IMMEDIATE）"""
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def init_database(self):
+        """初始化共享狀態表"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        # WAL 模式讓多進程讀寫互不阻塞
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        # 令牌桶
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                bucket_name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+        # 單飛鎖
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS shared_locks (
+                lock_name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+        conn.close()
+
+    def try_acquire_token(self, bucket: str, rate: float, capacity: float, amount: float = 1.0) -> float:
+        """
+        嘗試從令牌桶取 amount 個令牌（默認一個，按 token 計費的預算可一次取多個）
+
+        Returns:
+            0 表示已取得，否則返回需要等待的秒數
+        """
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE bucket_name = ?", (bucket,)
+            ).fetchone()
+
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+
+            # 超過桶容量的請求按整桶計算，否則永遠取不到
+            amount = min(amount, capacity)
+            if tokens >= amount:
+                tokens -= amount
+                wait = 0.0
+            else:
+                wait = (amount - tokens) / rate
+
+            conn.execute("""
+                INSERT OR REPLACE INTO rate_buckets (bucket_name, tokens, updated_at)
+                VALUES (?, ?, ?)
+            """, (bucket, tokens, now))
+            conn.execute("COMMIT")
+
+            return wait
+
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def release_token(self, bucket: str, rate: float, capacity: float, amount: float = 1.0):
+        """歸還已取得但沒有用掉的令牌（例如同時需要的另一個預算沒有取到），不超過桶容量"""
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE bucket_name = ?", (bucket,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+
+            tokens = min(capacity, row[0] + (now - row[1]) * rate + min(amount, capacity))
+            conn.execute(
+                "UPDATE rate_buckets SET tokens = ?, updated_at = ? WHERE bucket_name = ?",
+                (tokens, now, bucket)
+            )
+            conn.execute("COMMIT")
+
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire_token(self, bucket: str, rate: float, capacity: float, timeout: Optional[float] = None,
+                      amount: float = 1.0) -> bool:
+        """阻塞直到取得令牌（在線程中調用），超時返回 False"""
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while True:
+            wait = self.try_acquire_token(bucket, rate, capacity, amount)
+            if wait <= 0:
+                return True
+
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+
+            time.sleep(wait)
+
+    def try_lock(self, name: str, ttl: float = 60) -> Optional[str]:
+        """
+        嘗試取得鎖，成功返回 owner token（釋放時需要）
+        持有者崩潰時鎖會在 ttl 秒後自動失效
+        """
+        owner = uuid.uuid4().hex
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            row = conn.execute(
+                "SELECT expires_at FROM shared_locks WHERE lock_name = ?", (name,)
+            ).fetchone()
+
+            if row and row[0] > now:
+                conn.execute("ROLLBACK")
+                return None
+
+            conn.execute("""
+                INSERT OR REPLACE INTO shared_locks (lock_name, owner, expires_at)
+                VALUES (?, ?, ?)
+            """, (name, owner, now + ttl))
+            conn.execute("COMMIT")
+
+            return owner
+
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def release_lock(self, name: str, owner: str):
+        """釋放自己持有的鎖"""
+        conn = self._connect()
+        conn.execute("DELETE FROM shared_locks WHERE lock_name = ? AND owner = ?", (name, owner))
+        conn.close()
+
+    def renew_lock(self, name: str, owner: str, ttl: float = 60) -> bool:
+        """延長自己持有的鎖，鎖已過期並被他人取得時返回 False"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE shared_locks SET expires_at = ? WHERE lock_name = ? AND owner = ?",
+                (time.time() + ttl, name, owner)
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def is_locked(self, name: str) -> bool:
+        """檢查鎖是否被持有"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT 1 FROM shared_locks WHERE lock_name = ? AND expires_at > ?", (name, time.time())
+        ).fetchone()
+        conn.close()
+
+        return row is not None
+
+    @contextmanager
+    def lock(self, name: str, ttl: float = 60, timeout: float = 30, poll_interval: float = 0.2):
+        """
+        阻塞式上下文鎖（在線程中使用）
+
+        yield True 表示取得鎖；等待超時 yield False，由調用方決定是否繼續
+        """
+        owner = None
+        deadline = time.time() + timeout
+
+        while owner is None and time.time() < deadline:
+            owner = self.try_lock(name, ttl)
+            if owner is None:
+                time.sleep(poll_interval)
+
+        try:
+            yield owner is not None
+        finally:
+            if owner:
+                self.release_lock(name, owner)
@@ -1,14 +1,62 @@
 """
 SQLite缓存数据库管理器
 保留1小时内的新闻数据，管理JWT token
+
+新聞緩存按創建時間分桶存放在 news_cache_<YYYYMMDDHH> 表中，文章關聯的每隻股票
+在同一分桶的 news_links_<YYYYMMDDHH> 表中各有一行，news_fts_<YYYYMMDDHH> 為標題和摘要的
+FTS5 全文索引（觸發器同步）；news_cache 視圖合併所有分桶，每行是一個 (股票, 文章)。
+過期分桶由後台維護整表刪除，不需要逐行 DELETE
 """
 
 import sqlite3
 import json
-import hashlib
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
 import os
+import logging
+from app.utils.date_parser import parse_timestamp, get_published
+from app.utils.article_codec import decode_article, encode_article, update_core
+from app.utils.article_id import ARTICLE_ID_FIELD, compute_article_id, ensure_article_id
+from app.utils.tickers import get_tickers
+
+logger = logging.getLogger(__name__)
+
+NEWS_VIEW = "news_cache"
+NEWS_BUCKET_PREFIX = "news_cache_"
+NEWS_LINK_PREFIX = "news_links_"
+NEWS_FTS_PREFIX = "news_fts_"
+# 視圖按欄位名合併分桶（舊版升級的表欄位順序不同）
+NEWS_COLUMNS = (
+    "id", "symbol", "article_hash", "title", "url", "content", "published_at", "published_ts",
+    "source_name", "raw_data", "score", "created_at", "updated_at"
+)
+
+_FTS_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def build_fts_query(text: str) -> str:
+    """
+    把用戶輸入轉為 FTS5 查詢：每個詞或引號內的短語按字面匹配（全部都要出現），
+    大寫 OR 保留為運算符，詞尾 * 為前綴匹配；其他 FTS5 語法字符不會導致查詢出錯
+    """
+    parts: List[str] = []
+    for phrase, word in _FTS_TOKEN.findall(text or ''):
+        if word == 'OR':
+            if parts and parts[-1] != 'OR':
+                parts.append('OR')
+            continue
+        term = (phrase or word).strip()
+        prefix = not phrase and term.endswith('*')
+        term = term.rstrip('*') if prefix else term
+        if term:
+            parts.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    
+    if parts and parts[-1] == 'OR':
+        parts.pop()
+    return ' '.join(parts)
 
 
 class SQLiteCacheManager:
@@ -16,6 +64,21 @@ class SQLiteCacheManager:
     
     def __init__(self, db_path: str = "cache.db"):
         self.db_path = db_path
+        # 過期緩存保留時長（小時），上游不可用時作為降級數據
+        self.stale_retention_hours = int(os.getenv("CACHE_STALE_RETENTION_HOURS", "24"))
+        # 每個分桶覆蓋的小時數
+        self.bucket_hours = max(1, int(os.getenv("CACHE_BUCKET_HOURS", "1")))
+        # 緩存容量上限（文章行數 / 數據庫已用 MB，0 為不限），超出時按訪問頻率和最近訪問時間淘汰股票
+        self.max_rows = int(os.getenv("CACHE_MAX_ROWS", "50000"))
+        self.max_mb = float(os.getenv("CACHE_MAX_MB", "0"))
+        # 訪問次數的半衰期：很久沒訪問的熱門股票逐漸讓位給最近常用的股票
+        self.access_half_life = float(os.getenv("CACHE_ACCESS_HALF_LIFE_HOURS", "6")) * 3600
+        # 同時生效的負緩存條目上限，超出時先淘汰最早到期的
+        self.max_negative_entries = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+        self._known_buckets = set()
+        # 訪問統計先記在內存，由後台維護批量寫入，讀緩存不產生寫操作
+        self._access_lock = threading.Lock()
+        self._pending_access: Dict[str, List[float]] = {}
         self.init_database()
     
     def init_database(self):
@@ -23,22 +86,8 @@ class SQLiteCacheManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # 新闻缓存表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS news_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT NOT NULL,
-                article_hash TEXT UNIQUE NOT NULL,
-                title TEXT,
-                url TEXT,
-                content TEXT,
-                published_at TEXT,
-                source_name TEXT,
-                raw_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # 新建的數據庫使用增量 VACUUM，淘汰後歸還空閒頁（對已有數據庫不生效）
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         
         # JWT Token存储表
         cursor.execute("""
@@ -63,153 +112,1012 @@ class SQLiteCacheManager:
             )
         """)
         
+        # 每隻股票的狀態（covered_at: 最近一次被監控列表批量抓取完整覆蓋的時間）
+        # fetched_at: 最近一次以該股票本身查詢、寫入完整結果的時間（其他股票的文章帶入的關聯不算）
+        # last_access / hit_count: 緩存訪問統計，容量淘汰時使用
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS symbol_status (
+                symbol TEXT PRIMARY KEY,
+                covered_at REAL
+            )
+        """)
+        # negative_until / negative_reason: 上游沒有（近期）新聞的負緩存
+        self._add_missing_columns(cursor, "symbol_status", {
+            "fetched_at": "REAL",
+            "last_access": "REAL",
+            "hit_count": "INTEGER DEFAULT 0",
+            "negative_at": "REAL",
+            "negative_until": "REAL",
+            "negative_reason": "TEXT"
+        })
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_symbol_status_negative ON symbol_status(negative_until)")
+        
+        # 每隻股票每種上游查詢方式的結果統計（nonempty: 有結果的次數；useful: 帶該股票標籤的文章數）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS query_stats (
+                symbol TEXT NOT NULL,
+                shape TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                nonempty INTEGER NOT NULL DEFAULT 0,
+                returned INTEGER NOT NULL DEFAULT 0,
+                useful INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL,
+                PRIMARY KEY (symbol, shape)
+            )
+        """)
+        
         # 创建索引
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_symbol_time ON news_cache(symbol, created_at)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_hash ON news_cache(article_hash)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_jwt_active ON jwt_tokens(is_active, expires_at)")
         
         conn.commit()
         conn.close()
         
-        print("✅ SQLite cache database initialized")
+        # 新闻缓存分桶和合併視圖
+        conn = self._connect_ddl()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._upgrade_legacy_table(conn)
+            self._create_bucket(conn, self._bucket_table())
+            # 沒有股票關聯表的舊分桶補建並回填
+            for table in self._list_buckets(conn):
+                self._create_bucket(conn, table)
+            self._rebuild_view(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        
+        self._known_buckets.add(self._bucket_table())
+        
+        logger.info("✅ SQLite cache database initialized")
+    
+    # ---------- 分桶 ----------
+    
+    def _connect_ddl(self) -> sqlite3.Connection:
+        """打开连接（autocommit 模式，由调用方显式 BEGIN IMMEDIATE，多進程建表/刪表互斥）"""
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+    
+    def _bucket_table(self, ts: Optional[float] = None) -> str:
+        """時間戳所在分桶的表名（按分桶起始的UTC時間命名，字典序即時間順序）"""
+        seconds = self.bucket_hours * 3600
+        start = int((time.time() if ts is None else ts) // seconds * seconds)
+        return f"{NEWS_BUCKET_PREFIX}{datetime.fromtimestamp(start, tz=timezone.utc):%Y%m%d%H}"
+    
+    @staticmethod
+    def _bucket_start(table: str) -> float:
+        """分桶起始的時間戳"""
+        start = datetime.strptime(table[len(NEWS_BUCKET_PREFIX):], "%Y%m%d%H")
+        return start.replace(tzinfo=timezone.utc).timestamp()
+    
+    def _list_buckets(self, conn: sqlite3.Connection) -> List[str]:
+        """所有分桶表名，按時間排序"""
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (f"{NEWS_BUCKET_PREFIX}[0-9]*",)
+        ).fetchall()
+        return sorted(row[0] for row in rows)
+    
+    @staticmethod
+    def _link_table(table: str) -> str:
+        """分桶對應的股票關聯表"""
+        return NEWS_LINK_PREFIX + table[len(NEWS_BUCKET_PREFIX):]
+    
+    @staticmethod
+    def _fts_table(table: str) -> str:
+        """分桶對應的全文索引表"""
+        return NEWS_FTS_PREFIX + table[len(NEWS_BUCKET_PREFIX):]
+    
+    @staticmethod
+    def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+    
+    def _create_bucket(self, conn: sqlite3.Connection, table: str):
+        """建立一個分桶表、股票關聯表和全文索引；舊分桶缺少的部分補建並回填"""
+        links = self._link_table(table)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                article_hash TEXT UNIQUE NOT NULL,
+                title TEXT,
+                url TEXT,
+                content TEXT,
+                published_at TEXT,
+                published_ts INTEGER,
+                source_name TEXT,
+                raw_data BLOB,
+                score REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # 入庫時計算的評分（舊分桶補充欄位），跨股票的高分新聞按它查詢
+        self._add_missing_columns(conn.cursor(), table, {"score": "REAL"})
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_score ON {table}(score, published_ts)")
+        
+        self._create_fts(conn, table)
+        
+        if self._table_exists(conn, links):
+            return
+        
+        conn.execute(f"""
+            CREATE TABLE {links} (
+                symbol TEXT NOT NULL,
+                article_hash TEXT NOT NULL,
+                published_ts INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (symbol, article_hash)
+            )
+        """)
+        conn.execute(f"CREATE INDEX idx_{links}_symbol_time ON {links}(symbol, created_at)")
+        conn.execute(f"CREATE INDEX idx_{links}_symbol_published ON {links}(symbol, published_ts)")
+        conn.execute(f"CREATE INDEX idx_{links}_hash ON {links}(article_hash)")
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {links} (symbol, article_hash, published_ts, created_at)
+            SELECT symbol, article_hash, published_ts, created_at FROM {table}
+        """)
+    
+    def _create_fts(self, conn: sqlite3.Connection, table: str):
+        """分桶的 FTS5 索引（外部內容表，不重複保存文本），由觸發器與分桶表同步"""
+        fts = self._fts_table(table)
+        if self._table_exists(conn, fts):
+            return
+        
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE {fts} USING fts5(
+                title, content, content='{table}', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF title, content ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO {fts}(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """)
+        # 已有數據的分桶重建索引
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    
+    def _rebuild_view(self, conn: sqlite3.Connection):
+        """
+        重建合併所有分桶的 news_cache 視圖
+        symbol / created_at 來自股票關聯表，bucket 欄位為文章所在的表名
+        """
+        columns = ", ".join(f"c.{col}" for col in NEWS_COLUMNS if col not in ("symbol", "created_at"))
+        selects = [
+            f"SELECT l.symbol AS symbol, l.created_at AS created_at, {columns}, '{table}' AS bucket "
+            f"FROM {self._link_table(table)} l JOIN {table} c ON c.article_hash = l.article_hash"
+            for table in self._list_buckets(conn)
+        ]
+        conn.execute(f"DROP VIEW IF EXISTS {NEWS_VIEW}")
+        conn.execute(f"CREATE VIEW {NEWS_VIEW} AS {' UNION ALL '.join(selects)}")
+    
+    def _ensure_bucket(self, table: str):
+        """確保分桶表存在（每個進程每個分桶只檢查一次）"""
+        if table in self._known_buckets:
+            return
+        
+        conn = self._connect_ddl()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if not exists:
+                self._create_bucket(conn, table)
+                self._rebuild_view(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        
+        self._known_buckets.add(table)
+    
+    def _upgrade_legacy_table(self, conn: sqlite3.Connection):
+        """舊版的單表 news_cache 轉為當前分桶（隨該分桶一起過期）"""
+        row = conn.execute(f"SELECT type FROM sqlite_master WHERE name = '{NEWS_VIEW}'").fetchone()
+        if not row or row[0] != "table":
+            return
+        
+        self._add_missing_columns(conn.cursor(), NEWS_VIEW, {"published_ts": "INTEGER"})
+        self._migrate_article_ids(conn.cursor(), NEWS_VIEW)
+        for index in ("idx_news_symbol_time", "idx_news_hash", "idx_news_symbol_published"):
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        
+        table = self._bucket_table()
+        conn.execute(f"ALTER TABLE {NEWS_VIEW} RENAME TO {table}")
+        logger.info(f"📦 Moved legacy news_cache table into bucket {table}")
+    
+    def _add_missing_columns(self, cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+        """為已存在的表補充缺少的欄位"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
     
-    def _generate_article_hash(self, article: Dict[str, Any]) -> str:
-        """生成文章唯一hash"""
-        unique_string = f"{article.get('title', '')}{article.get('url', '')}"
-        return hashlib.md5(unique_string.encode()).hexdigest()
+    def _migrate_article_ids(self, cursor: sqlite3.Cursor, table: str):
+        """舊緩存以 md5(title+url) 為鍵，改為統一的文章ID（重複的舊記錄直接覆蓋）"""
+        cursor.execute(f"""
+            SELECT id, raw_data FROM {table}
+            WHERE typeof(raw_data) = 'text' AND json_extract(raw_data, '$.{ARTICLE_ID_FIELD}') IS NULL
+        """)
+        rows = cursor.fetchall()
+        
+        for row_id, raw_data in rows:
+            try:
+                article = json.loads(raw_data)
+                article[ARTICLE_ID_FIELD] = compute_article_id(article)
+                cursor.execute(
+                    f"UPDATE OR REPLACE {table} SET article_hash = ?, raw_data = ? WHERE id = ?",
+                    (article[ARTICLE_ID_FIELD], encode_article(article), row_id)
+                )
+            except (json.JSONDecodeError, TypeError):
+                cursor.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        
+        if rows:
+            logger.info(f"🔑 Migrated {len(rows)} cached articles to canonical article IDs")
     
     def save_news_cache(self, symbol: str, articles: List[Dict[str, Any]]) -> int:
         """保存新闻到缓存"""
         if not articles:
             return 0
         
+        # 寫入當前分桶
+        table = self._bucket_table()
+        self._ensure_bucket(table)
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         saved_count = 0
         
+        tickers = set()
         for article in articles:
             try:
-                article_hash = self._generate_article_hash(article)
-                
-                # 检查是否已存在
-                cursor.execute("SELECT id FROM news_cache WHERE article_hash = ?", (article_hash,))
-                if cursor.fetchone():
-                    continue
-                
-                # 插入新文章
-                cursor.execute("""
-                    INSERT INTO news_cache 
-                    (symbol, article_hash, title, url, content, published_at, source_name, raw_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    symbol.upper(),
-                    article_hash,
-                    article.get('title', ''),
-                    article.get('url', ''),
-                    article.get('description') or article.get('content', ''),
-                    article.get('publishedAt', '') or article.get('published', ''),
-                    self._extract_source_name(article.get('source', {})),
-                    json.dumps(article, ensure_ascii=False)
-                ))
-                
-                saved_count += 1
-                
+                if self._save_article(cursor, table, symbol, article, parse_timestamp(get_published(article))):
+                    saved_count += 1
+                tickers.update(get_tickers(article, symbol))
             except Exception as e:
-                print(f"⚠️ Error saving article to cache: {e}")
+                logger.warning(f"⚠️ Error saving article to cache: {e}")
                 continue
         
+        self._clear_negative(cursor, sorted(tickers))
         conn.commit()
         conn.close()
         
         if saved_count > 0:
-            print(f"💾 Cached {saved_count} articles for {symbol}")
+            logger.debug("💾 Cached %d articles for %s", saved_count, symbol)
+        
+        return saved_count
+    
+    def bulk_save_news(self, articles: List[Dict[str, Any]], published_ts: Optional[List[int]] = None) -> int:
+        """
+        在一個事務內批量寫入文章（導入歷史數據用），每篇文章以自己帶的第一隻股票作為 symbol
+        published_ts: 已解析的發布時間戳，不傳時在此解析
+        
+        Returns:
+            新寫入的文章數
+        """
+        if not articles:
+            return 0
+        
+        table = self._bucket_table()
+        self._ensure_bucket(table)
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        saved_count = 0
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            all_tickers = set()
+            for i, article in enumerate(articles):
+                tickers = get_tickers(article)
+                if not tickers:
+                    continue
+                ts = published_ts[i] if published_ts else parse_timestamp(get_published(article))
+                if self._save_article(cursor, table, tickers[0], article, ts):
+                    saved_count += 1
+                all_tickers.update(tickers)
+            self._clear_negative(cursor, sorted(all_tickers))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Error bulk saving articles to cache: {e}")
+            saved_count = 0
+        finally:
+            conn.close()
         
         return saved_count
     
-    def update_article_translation(self, article_hash: str, title_cn: str, summary_cn: str):
-        """更新緩存中文章的翻譯結果到raw_data"""
+    def _save_article(self, cursor: sqlite3.Cursor, table: str, symbol: str, article: Dict[str, Any],
+                      published_ts: int) -> bool:
+        """寫入一篇文章，已存在時只補充股票關聯；返回是否為新文章"""
+        article_hash = ensure_article_id(article)
+        
+        # 已存在的文章只補充股票關聯（關聯寫入文章所在的分桶，一起過期）
+        cursor.execute("SELECT bucket FROM news_cache WHERE article_hash = ? LIMIT 1", (article_hash,))
+        row = cursor.fetchone()
+        if row:
+            self._link_article(cursor, row[0], symbol, article, article_hash, published_ts)
+            return False
+        
+        # 插入新文章
+        cursor.execute(f"""
+            INSERT INTO {table} 
+            (symbol, article_hash, title, url, content, published_at, published_ts, source_name, raw_data, score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            symbol.upper(),
+            article_hash,
+            article.get('title', ''),
+            article.get('url', ''),
+            article.get('description') or article.get('content', ''),
+            get_published(article),
+            published_ts,
+            self._extract_source_name(article.get('source', {})),
+            encode_article(article),
+            article.get('score')
+        ))
+        self._link_article(cursor, table, symbol, article, article_hash, published_ts)
+        return True
+    
+    def _link_article(self, cursor: sqlite3.Cursor, table: str, symbol: str, article: Dict[str, Any],
+                      article_hash: str, published_ts: int):
+        """把文章關聯到它帶的所有股票，查詢的股票刷新關聯時間（重新確認了緩存仍然新鮮）"""
+        links = self._link_table(table)
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {links} (symbol, article_hash, published_ts) VALUES (?, ?, ?)",
+            [(ticker, article_hash, published_ts) for ticker in get_tickers(article, symbol)]
+        )
+        cursor.execute(
+            f"UPDATE {links} SET created_at = CURRENT_TIMESTAMP WHERE symbol = ? AND article_hash = ?",
+            (symbol.upper(), article_hash)
+        )
+    
+    def update_article_translation(self, article_hash: str, title_cn: str, summary_cn: str) -> List[str]:
+        """
+        更新緩存中文章的翻譯結果到raw_data（只改核心欄位，其餘欄位不解壓）
+        
+        Returns:
+            文章關聯的股票（它們已緩存的響應需要失效）
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute("SELECT raw_data FROM news_cache WHERE article_hash = ?", (article_hash,))
+            cursor.execute("SELECT bucket, raw_data FROM news_cache WHERE article_hash = ? LIMIT 1", (article_hash,))
             row = cursor.fetchone()
             if row:
-                article = json.loads(row[0])
-                article["title_cn"] = title_cn
-                article["summary_cn"] = summary_cn
                 cursor.execute(
-                    "UPDATE news_cache SET raw_data = ? WHERE article_hash = ?",
-                    (json.dumps(article, ensure_ascii=False), article_hash)
+                    f"UPDATE {row[0]} SET raw_data = ? WHERE article_hash = ?",
+                    (update_core(row[1], {"title_cn": title_cn, "summary_cn": summary_cn}), article_hash)
                 )
                 conn.commit()
+                cursor.execute("SELECT DISTINCT symbol FROM news_cache WHERE article_hash = ?", (article_hash,))
+                return [r[0] for r in cursor.fetchall()]
         except Exception as e:
-            print(f"⚠️ Error updating cache translation: {e}")
+            logger.warning(f"⚠️ Error updating cache translation: {e}")
         finally:
             conn.close()
+        
+        return []
     
-    def get_news_cache(self, symbol: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """从缓存获取新闻"""
+    def get_raw_article(self, article_hash: str) -> Optional[Dict[str, Any]]:
+        """完整的原始文章（解壓其餘欄位），其他讀取只解析核心欄位"""
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            row = conn.execute("SELECT raw_data FROM news_cache WHERE article_hash = ? LIMIT 1",
+                               (article_hash,)).fetchone()
+            return decode_article(row[0], full=True) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"⚠️ Error loading raw article {article_hash}: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_news_cache(self, symbol: str, limit: int = 10, since_ts: Optional[int] = None,
+                       max_age_seconds: Optional[int] = 3600, since_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        从缓存获取新闻（最新的在前；有游標時從舊到新）
+        since_ts 只返回游標之後的文章，按 (發布時間, 文章ID) 從舊到新取前 limit 篇，
+        本頁最後一篇即可作為下一個游標，不會跳過更早到達的文章；
+        since_id 為游標文章的ID，同一秒發布的文章按ID區分先後，不傳時只返回發布時間更晚的文章
+        max_age_seconds 為 None 時包括已過期的緩存（上游不可用時的降級數據）
+        """
+        self.record_access(symbol)
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute("""
+            conditions = ["symbol = ?"]
+            params: List[Any] = [symbol.upper()]
+            if since_ts is not None and since_id:
+                conditions.append("(published_ts > ? OR (published_ts = ? AND article_hash > ?))")
+                params.extend([since_ts, since_ts, since_id])
+            elif since_ts is not None:
+                conditions.append("published_ts > ?")
+                params.append(since_ts)
+            if max_age_seconds is not None:
+                conditions.append("created_at > datetime('now', ?)")
+                params.append(f"-{int(max_age_seconds)} seconds")
+            order_by = "created_at DESC" if since_ts is None else "published_ts, article_hash"
+            
+            cursor.execute(f"""
                 SELECT raw_data FROM news_cache 
-                WHERE symbol = ? AND created_at > datetime('now', '-1 hour')
-                ORDER BY created_at DESC 
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {order_by} 
                 LIMIT ?
-            """, (symbol.upper(), limit))
+            """, (*params, limit))
             
             articles = []
             for row in cursor.fetchall():
                 try:
-                    article = json.loads(row[0])
+                    article = decode_article(row[0])
                     articles.append(article)
-                except json.JSONDecodeError:
+                except ValueError:
                     continue
             
             conn.close()
             
             if articles:
-                print(f"📚 Retrieved {len(articles)} cached articles for {symbol}")
+                logger.debug("📚 Retrieved %d cached articles for %s", len(articles), symbol)
             
             return articles
             
         except Exception as e:
             conn.close()
-            print(f"❌ Error retrieving cached articles: {e}")
+            logger.error(f"❌ Error retrieving cached articles: {e}")
             return []
     
-    def cleanup_old_cache(self):
-        """清理旧缓存数据"""
+    def search_news(self, query: str, symbols: Optional[List[str]] = None, since_ts: Optional[int] = None,
+                    limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        全文搜索緩存中的文章（BM25 排序，標題權重高於摘要）
+        各分桶的 BM25 分別計算後合併排序；symbols 只搜索關聯這些股票的文章，since_ts 只搜索發布時間更新的文章
+        
+        Returns:
+            [{"article": 原始文章, "rank": BM25 分數（越小越相關）, "snippet": 命中片段}]
+        """
+        match = build_fts_query(query)
+        if not match:
+            return []
+        
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            selects = []
+            params: List[Any] = []
+            for table in self._list_buckets(conn):
+                fts = self._fts_table(table)
+                conditions = [f"{fts} MATCH ?"]
+                params.append(match)
+                if since_ts is not None:
+                    conditions.append("c.published_ts > ?")
+                    params.append(since_ts)
+                if symbols:
+                    conditions.append(
+                        f"c.article_hash IN (SELECT article_hash FROM {self._link_table(table)} "
+                        f"WHERE symbol IN ({', '.join('?' * len(symbols))}))"
+                    )
+                    params.extend(s.upper() for s in symbols)
+                selects.append(
+                    f"SELECT c.raw_data, bm25({fts}, 5.0, 1.0) AS rank, "
+                    f"snippet({fts}, -1, '<b>', '</b>', '…', 16) AS snippet "
+                    f"FROM {fts} JOIN {table} c ON c.id = {fts}.rowid WHERE {' AND '.join(conditions)}"
+                )
+            
+            if not selects:
+                return []
+            
+            rows = conn.execute(
+                f"{' UNION ALL '.join(selects)} ORDER BY rank LIMIT ?", (*params, limit)
+            ).fetchall()
+            
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Full-text search failed for {query!r}: {e}")
+            return []
+        finally:
+            conn.close()
+        
+        results = []
+        for raw_data, rank, snippet in rows:
+            try:
+                results.append({"article": decode_article(raw_data), "rank": rank, "snippet": snippet})
+            except ValueError:
+                continue
+        
+        return results
+    
+    def get_top_news(self, since_ts: int, min_score: Optional[float] = None, limit: int = 20,
+                     cursor: Optional[Tuple[float, int, str]] = None) -> List[Dict[str, Any]]:
+        """
+        跨所有股票按評分從高到低返回發布時間在 since_ts 之後的文章
+        cursor 為上一頁最後一條的 (score, published_ts, article_hash)，按鍵集分頁
+        
+        Returns:
+            [{"article": 原始文章, "score": 評分, "published_ts": 發布時間戳, "article_id": 文章ID}]
+        """
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            buckets = self._list_buckets(conn)
+            # 分桶內的文章都在下一個分桶開始前寫入，發布時間更早；整桶早於窗口的不用查
+            buckets = [
+                table for i, table in enumerate(buckets)
+                if i + 1 == len(buckets) or self._bucket_start(buckets[i + 1]) > since_ts
+            ]
+            
+            selects = []
+            params: List[Any] = []
+            for table in buckets:
+                conditions = ["score IS NOT NULL", "published_ts > ?"]
+                params.append(since_ts)
+                if min_score is not None:
+                    conditions.append("score >= ?")
+                    params.append(min_score)
+                if cursor is not None:
+                    conditions.append("(score, published_ts, article_hash) < (?, ?, ?)")
+                    params.extend(cursor)
+                selects.append(
+                    f"SELECT raw_data, score, published_ts, article_hash FROM {table} WHERE {' AND '.join(conditions)}"
+                )
+            
+            if not selects:
+                return []
+            
+            rows = conn.execute(f"""
+                {' UNION ALL '.join(selects)}
+                ORDER BY score DESC, published_ts DESC, article_hash DESC
+                LIMIT ?
+            """, (*params, limit)).fetchall()
+            
+        except sqlite3.Error as e:
+            logger.error(f"❌ Error retrieving top news: {e}")
+            return []
+        finally:
+            conn.close()
+        
+        results = []
+        for raw_data, score, published_ts, article_hash in rows:
+            try:
+                results.append({
+                    "article": decode_article(raw_data),
+                    "score": score,
+                    "published_ts": published_ts,
+                    "article_id": article_hash
+                })
+            except ValueError:
+                continue
+        
+        return results
+    
+    def has_fresh_cache(self, symbol: str, max_age_seconds: int = 3600) -> bool:
+        """
+        检查某股票是否有1小时内的缓存：以該股票本身最近一次完整抓取的時間為準，
+        只因其他股票的文章帶有它的標籤而寫入的關聯不算（那只是結果的一部分）
+        """
+        age = self.get_fetch_age(symbol)
+        return age is not None and age <= max_age_seconds
+    
+    def mark_fetched(self, symbol: str, fetched_at: Optional[float] = None):
+        """記錄股票本身的完整結果已在 fetched_at 寫入緩存"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("""
+                INSERT INTO symbol_status (symbol, fetched_at) VALUES (?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET fetched_at = excluded.fetched_at
+            """, (symbol.upper(), fetched_at))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_fetch_age(self, symbol: str) -> Optional[float]:
+        """股票本身最近一次完整抓取距今的秒數，從未以它本身抓取過時返回 None"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # 删除1小时前的新闻缓存
-        cursor.execute("""
-            DELETE FROM news_cache 
-            WHERE created_at < datetime('now', '-1 hour')
-        """)
+        cursor.execute("SELECT fetched_at FROM symbol_status WHERE symbol = ?", (symbol.upper(),))
+        row = cursor.fetchone()
+        
+        conn.close()
         
-        deleted_news = cursor.rowcount
+        return max(0.0, time.time() - row[0]) if row and row[0] is not None else None
+    
+    def get_cache_age(self, symbol: str) -> Optional[float]:
+        """某股票最新一次緩存距今的秒數，沒有任何緩存時返回 None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
         
-        # 但是保留昨天有相同ticker的新闻
         cursor.execute("""
-            DELETE FROM news_cache 
-            WHERE created_at < datetime('now', '-1 day')
-            AND symbol IN (
-                SELECT DISTINCT symbol FROM news_cache 
-                WHERE created_at > datetime('now', '-1 day')
-            )
-        """)
+            SELECT (julianday('now') - julianday(MAX(created_at))) * 86400 
+            FROM news_cache WHERE symbol = ?
+        """, (symbol.upper(),))
+        row = cursor.fetchone()
+        
+        conn.close()
+        
+        return max(0.0, row[0]) if row and row[0] is not None else None
+    
+    def mark_covered(self, symbols: List[str], covered_at: Optional[float] = None):
+        """記錄這些股票的新聞已由批量抓取完整覆蓋到 covered_at"""
+        if not symbols:
+            return
+        covered_at = time.time() if covered_at is None else covered_at
+        
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.executemany("""
+                INSERT INTO symbol_status (symbol, covered_at) VALUES (?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET covered_at = excluded.covered_at
+            """, [(symbol.upper(), covered_at) for symbol in symbols])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_coverage_age(self, symbol: str) -> Optional[float]:
+        """股票最近一次被批量抓取覆蓋距今的秒數，從未覆蓋時返回 None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT covered_at FROM symbol_status WHERE symbol = ?", (symbol.upper(),))
+        row = cursor.fetchone()
         
-        conn.commit()
         conn.close()
         
-        if deleted_news > 0:
-            print(f"🗑️ Cleaned up {deleted_news} old cached articles")
+        return max(0.0, time.time() - row[0]) if row and row[0] is not None else None
+    
+    def set_negative(self, symbol: str, reason: str, ttl: float):
+        """記錄股票在 ttl 秒內沒有新聞（reason: empty 上游無結果 / stale 10天內無文章）"""
+        if ttl <= 0:
+            return
+        now = time.time()
+        
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("""
+                INSERT INTO symbol_status (symbol, negative_at, negative_until, negative_reason) VALUES (?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    negative_at = excluded.negative_at,
+                    negative_until = excluded.negative_until,
+                    negative_reason = excluded.negative_reason
+            """, (symbol.upper(), now, now + ttl, reason))
+            
+            # 全局上限：拼錯的股票代碼不能無限佔用
+            active = conn.execute("SELECT COUNT(*) FROM symbol_status WHERE negative_until > ?", (now,)).fetchone()[0]
+            if active > self.max_negative_entries:
+                conn.execute("""
+                    UPDATE symbol_status SET negative_until = NULL, negative_reason = NULL
+                    WHERE symbol IN (
+                        SELECT symbol FROM symbol_status WHERE negative_until > ?
+                        ORDER BY negative_until LIMIT ?
+                    )
+                """, (now, active - self.max_negative_entries))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_negative(self, symbol: str) -> Optional[Tuple[str, float]]:
+        """生效中的負緩存 (reason, 距今秒數)，沒有時返回 None"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "SELECT negative_reason, negative_at FROM symbol_status WHERE symbol = ? AND negative_until > ?",
+            (symbol.upper(), time.time())
+        )
+        row = cursor.fetchone()
+        
+        conn.close()
+        
+        return (row[0], max(0.0, time.time() - row[1])) if row else None
+    
+    def _clear_negative(self, cursor: sqlite3.Cursor, symbols: List[str]):
+        """股票有了新文章，清除負緩存"""
+        cursor.executemany(
+            "UPDATE symbol_status SET negative_until = NULL, negative_reason = NULL "
+            "WHERE symbol = ? AND negative_until IS NOT NULL",
+            [(symbol,) for symbol in symbols]
+        )
+    
+    def record_query_result(self, symbol: str, shape: str, returned: int, useful: int):
+        """累加一次上游查詢的結果"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("""
+                INSERT INTO query_stats (symbol, shape, attempts, nonempty, returned, useful, updated_at)
+                VALUES (?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT(symbol, shape) DO UPDATE SET
+                    attempts = attempts + 1,
+                    nonempty = nonempty + excluded.nonempty,
+                    returned = returned + excluded.returned,
+                    useful = useful + excluded.useful,
+                    updated_at = excluded.updated_at
+            """, (symbol.upper(), shape, 1 if returned else 0, returned, useful, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_query_stats(self, symbol: str) -> Dict[str, Dict[str, int]]:
+        """股票各查詢方式的累計結果 {shape: {"attempts", "nonempty", "returned", "useful"}}"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "SELECT shape, attempts, nonempty, returned, useful FROM query_stats WHERE symbol = ?",
+            (symbol.upper(),)
+        )
+        rows = cursor.fetchall()
+        
+        conn.close()
+        
+        return {
+            shape: {"attempts": attempts, "nonempty": nonempty, "returned": returned, "useful": useful}
+            for shape, attempts, nonempty, returned, useful in rows
+        }
+    
+    def get_article_timestamp(self, article_hash: str) -> Optional[int]:
+        """根据文章ID获取发布时间戳"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT published_ts FROM news_cache WHERE article_hash = ? LIMIT 1", (article_hash,))
+        row = cursor.fetchone()
+        
+        conn.close()
+        
+        return row[0] if row and row[0] else None
+    
+    def cleanup_old_cache(self) -> int:
+        """
+        整表刪除超過保留期的分桶，並預先建立下一個分桶（由後台維護定期調用）
+        超過1小時的緩存不再作為新鮮數據返回，但保留 stale_retention_hours 供上游不可用時降級使用
+        
+        Returns:
+            刪除的分桶數
+        """
+        now = time.time()
+        self._ensure_bucket(self._bucket_table(now + self.bucket_hours * 3600))
+        
+        # 分桶結束時間早於保留期起點才刪除，即起始時間早於保留期起點所在的分桶
+        cutoff = self._bucket_table(now - self.stale_retention_hours * 3600)
+        
+        conn = self._connect_ddl()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = [t for t in self._list_buckets(conn) if t < cutoff]
+            for table in expired:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"DROP TABLE IF EXISTS {self._link_table(table)}")
+                conn.execute(f"DROP TABLE IF EXISTS {self._fts_table(table)}")
+            if expired:
+                self._rebuild_view(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        
+        self._known_buckets.difference_update(expired)
+        if expired:
+            logger.info(f"🗑️ Dropped {len(expired)} expired cache buckets")
+        
+        return len(expired)
+    
+    # ---------- 容量淘汰 ----------
+    
+    def record_access(self, symbol: str):
+        """記錄一次股票緩存訪問（只寫內存）"""
+        symbol = symbol.upper()
+        now = time.time()
+        with self._access_lock:
+            entry = self._pending_access.get(symbol)
+            if entry is None:
+                self._pending_access[symbol] = [1, now]
+            else:
+                entry[0] += 1
+                entry[1] = now
+    
+    def flush_access_stats(self) -> int:
+        """把內存中的訪問統計合併寫入 symbol_status，返回寫入的股票數"""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return 0
+        
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.executemany("""
+                INSERT INTO symbol_status (symbol, hit_count, last_access) VALUES (?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    hit_count = COALESCE(hit_count, 0) + excluded.hit_count,
+                    last_access = MAX(COALESCE(last_access, 0), excluded.last_access)
+            """, [(symbol, hits, last) for symbol, (hits, last) in pending.items()])
+            conn.commit()
+        except Exception:
+            # 寫入失敗時放回內存，下次再試
+            with self._access_lock:
+                for symbol, (hits, last) in pending.items():
+                    entry = self._pending_access.setdefault(symbol, [0, last])
+                    entry[0] += hits
+                    entry[1] = max(entry[1], last)
+            raise
+        finally:
+            conn.close()
+        
+        return len(pending)
+    
+    def get_cache_usage(self) -> Dict[str, Any]:
+        """緩存佔用：文章行數（各分桶合計）、新聞數據（分桶、股票關聯、全文索引）佔用和數據庫已用空間"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                       for table in self._list_buckets(conn))
+            news_bytes = self._news_bytes(conn)
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            used_pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        finally:
+            conn.close()
+        
+        return {
+            "rows": rows,
+            "news_mb": round(news_bytes / 1048576, 2),
+            "used_mb": round(used_pages * page_size / 1048576, 2),
+        }
+    
+    def _news_bytes(self, conn: sqlite3.Connection) -> int:
+        """
+        新聞數據佔用的字節數：所有分桶表、股票關聯表、全文索引（含影子表）及其索引的頁面
+        容量上限只針對這部分，token、狀態、翻譯記憶等其他表不計入
+        SQLite 未編譯 dbstat 時退回按分桶各欄位長度估算
+        """
+        try:
+            return conn.execute("""
+                SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN (
+                    SELECT name FROM sqlite_master
+                    WHERE tbl_name GLOB ? OR tbl_name GLOB ? OR tbl_name GLOB ?
+                )
+            """, (f"{NEWS_BUCKET_PREFIX}[0-9]*", f"{NEWS_LINK_PREFIX}[0-9]*", f"{NEWS_FTS_PREFIX}[0-9]*")).fetchone()[0]
+        except sqlite3.OperationalError:
+            return sum(conn.execute(f"""
+                SELECT COALESCE(SUM(LENGTH(article_hash) + COALESCE(LENGTH(title), 0) + COALESCE(LENGTH(url), 0)
+                    + COALESCE(LENGTH(content), 0) + COALESCE(LENGTH(raw_data), 0)), 0)
+                FROM {table}
+            """).fetchone()[0] for table in self._list_buckets(conn))
+    
+    def _over_budget(self, usage: Dict[str, Any]) -> bool:
+        return bool((self.max_rows and usage["rows"] > self.max_rows) or
+                    (self.max_mb and usage["news_mb"] > self.max_mb))
+    
+    def _symbol_values(self, conn: sqlite3.Connection) -> List[Tuple[str, float]]:
+        """
+        各股票的保留價值：訪問次數按半衰期隨閒置時間衰減（LFU + LRU），
+        從未被查詢過的股票（只因文章標籤帶入）價值為 0
+        """
+        now = time.time()
+        values = []
+        for symbol, hits, last_access in conn.execute(
+            "SELECT symbol, COALESCE(hit_count, 0), last_access FROM symbol_status WHERE hit_count > 0"
+        ):
+            idle = max(0.0, now - (last_access or 0))
+            values.append((symbol, hits * 0.5 ** (idle / self.access_half_life)))
+        return values
+    
+    def _eviction_candidates(self, conn: sqlite3.Connection, buckets: List[str], count: int) -> List[Tuple[str, str]]:
+        """
+        保留價值最低的 count 篇文章 [(分桶, 文章ID)]
+        文章的價值取它關聯的股票中最高的一個，熱門股票的文章即使同時帶有冷門標籤也不會被淘汰；
+        價值相同時先淘汰發布時間較早的
+        """
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS eviction_values (symbol TEXT PRIMARY KEY, value REAL)")
+        conn.execute("DELETE FROM eviction_values")
+        conn.executemany("INSERT INTO eviction_values (symbol, value) VALUES (?, ?)", self._symbol_values(conn))
+        
+        union_sql = " UNION ALL ".join(f"""
+            SELECT '{table}' AS bucket, l.article_hash, MAX(COALESCE(v.value, 0)) AS value, MAX(l.published_ts) AS published_ts
+            FROM {self._link_table(table)} l LEFT JOIN eviction_values v ON v.symbol = l.symbol
+            GROUP BY l.article_hash
+        """ for table in buckets)
+        
+        return conn.execute(f"""
+            SELECT bucket, article_hash FROM ({union_sql})
+            ORDER BY value, published_ts
+            LIMIT ?
+        """, (count,)).fetchall()
+    
+    def evict_to_budget(self, batch_size: int = 500, max_batches: int = 10) -> int:
+        """
+        超出容量時淘汰保留價值最低的文章（連同股票關聯和全文索引），回到預算的 90% 以下
+        每批一個短事務，每次最多 max_batches 批（由後台維護反覆調用，逐步回到預算內）；
+        調用前應先 flush_access_stats，排序才會用到最新的訪問統計
+        
+        Returns:
+            淘汰的文章數
+        """
+        if not self.max_rows and not self.max_mb:
+            return 0
+        
+        usage = self.get_cache_usage()
+        if not self._over_budget(usage):
+            return 0
+        
+        # 留 10% 餘量，避免每次維護都在邊界上反覆淘汰
+        target_rows = int(self.max_rows * 0.9) if self.max_rows else None
+        target_mb = self.max_mb * 0.9 if self.max_mb else None
+        excess = 0
+        if target_rows is not None:
+            excess = max(excess, usage["rows"] - target_rows)
+        if target_mb is not None and usage["news_mb"] > target_mb:
+            # 每篇佔用差別很大，不按篇數估算：按價值順序逐批淘汰，每批後重新測量
+            excess = usage["rows"]
+        excess = min(excess, batch_size * max_batches)
+        
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        evicted = 0
+        
+        try:
+            candidates = self._eviction_candidates(conn, self._list_buckets(conn), excess)
+            
+            for i in range(0, len(candidates), batch_size):
+                by_bucket: Dict[str, List[str]] = {}
+                for table, article_hash in candidates[i:i + batch_size]:
+                    by_bucket.setdefault(table, []).append(article_hash)
+                
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for table, hashes in by_bucket.items():
+                        params = [(h,) for h in hashes]
+                        conn.executemany(f"DELETE FROM {self._link_table(table)} WHERE article_hash = ?", params)
+                        conn.executemany(f"DELETE FROM {table} WHERE article_hash = ?", params)
+                        if target_mb is not None:
+                            # FTS5 刪除只寫入墓碑，合併段後才真正釋放空間
+                            fts = self._fts_table(table)
+                            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+                    conn.execute("COMMIT")
+                except Exception:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+                
+                evicted += sum(len(h) for h in by_bucket.values())
+                
+                # 新聞數據已回到預算內就停止，不按估算的篇數多刪
+                if target_mb is not None and (target_rows is None or usage["rows"] - evicted <= target_rows) \
+                        and self._news_bytes(conn) / 1048576 <= target_mb:
+                    break
+            
+            # 增量 VACUUM 歸還空閒頁，數據庫文件保持在預算附近
+            conn.execute("PRAGMA incremental_vacuum(2000)").fetchall()
+        finally:
+            conn.close()
+        
+        if evicted:
+            usage = self.get_cache_usage()
+            logger.info(f"🧹 Evicted {evicted} cold cached articles ({usage['rows']} rows, {usage['news_mb']} MB of news left)")
+        
+        return evicted
     
     def save_jwt_token(self, access_token: str, refresh_token: str = None, expires_in: int = 86400):
         """保存JWT token"""
@@ -231,7 +1139,7 @@ class SQLiteCacheManager:
         conn.commit()
         conn.close()
         
-        print("🔑 JWT token saved to cache")
+        logger.info("🔑 JWT token saved to cache")
     
     def get_jwt_token(self) -> Optional[Dict[str, Any]]:
         """获取有效的JWT token"""
@@ -298,10 +1206,10 @@ class SQLiteCacheManager:
         cursor = conn.cursor()
         
         # 总计数据
-        cursor.execute("SELECT COUNT(*) FROM news_cache")
+        cursor.execute("SELECT COUNT(DISTINCT article_hash) FROM news_cache")
         total_articles = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM news_cache WHERE created_at > datetime('now', '-1 hour')")
+        cursor.execute("SELECT COUNT(DISTINCT article_hash) FROM news_cache WHERE created_at > datetime('now', '-1 hour')")
         recent_articles = cursor.fetchone()[0]
         
         cursor.execute("SELECT COUNT(*) FROM jwt_tokens WHERE is_active = 1")
@@ -0,0 +1,204 @@
+"""
+翻譯任務隊列（SQLite持久化）
+任務按文章hash去重，Worker 以租約方式領取，重啟或崩潰後未完成的任務會被重新領取；
+多次失敗的任務移入 translation_failures 單獨記錄
+"""
+
+import json
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+
+
+class TranslationJobStore:
+    """基於 SQLite 的翻譯任務隊列"""
+
+    def __init__(self, db_path: str = "cache.db", lease_seconds: float = 120):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开连接（autocommit 模式，由调用方显式 BEGIN IMMEDIATE）"""
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def init_database(self):
+        """初始化任務表和失敗記錄表"""
+        conn = self._connect()
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_jobs (
+                article_hash TEXT PRIMARY KEY,
+                symbol TEXT,
+                title TEXT,
+                summary TEXT,
+                raw_data TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                locked_until REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_translation_jobs_due ON translation_jobs(status, next_attempt_at)")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_failures (
+                article_hash TEXT PRIMARY KEY,
+                symbol TEXT,
+                title TEXT,
+                raw_data TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                failed_at REAL NOT NULL
+            )
+        """)
+
+        conn.close()
+
+    def enqueue(self, article_hash: str, original: Dict[str, Any], title: str, summary: str,
+                symbol: str = "") -> bool:
+        """加入任務，已有相同文章的任務或已記錄為失敗時返回 False"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO translation_jobs
+                (article_hash, symbol, title, summary, raw_data, status, next_attempt_at, created_at)
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM translation_failures WHERE article_hash = ?)
+            """, (article_hash, symbol, title, summary, json.dumps(original, ensure_ascii=False),
+                  PENDING, time.time(), time.time(), article_hash))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """領取一個到期的任務（租約過期的 running 任務視為 Worker 已崩潰，可重新領取）"""
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            row = conn.execute("""
+                SELECT article_hash, symbol, title, summary, raw_data, attempts FROM translation_jobs
+                WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND locked_until < ?)
+                ORDER BY next_attempt_at
+                LIMIT 1
+            """, (PENDING, now, RUNNING, now)).fetchone()
+
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+
+            conn.execute("""
+                UPDATE translation_jobs SET status = ?, locked_until = ? WHERE article_hash = ?
+            """, (RUNNING, now + self.lease_seconds, row[0]))
+            conn.execute("COMMIT")
+
+            return {
+                "article_hash": row[0],
+                "symbol": row[1],
+                "title": row[2],
+                "summary": row[3],
+                "original": json.loads(row[4]),
+                "attempts": row[5]
+            }
+
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, article_hash: str):
+        """任務完成，從隊列刪除"""
+        conn = self._connect()
+        conn.execute("DELETE FROM translation_jobs WHERE article_hash = ?", (article_hash,))
+        conn.close()
+
+    def retry(self, article_hash: str, error: str, delay: float):
+        """任務失敗，delay 秒後重試"""
+        conn = self._connect()
+        conn.execute("""
+            UPDATE translation_jobs
+            SET status = ?, attempts = attempts + 1, next_attempt_at = ?, locked_until = 0, last_error = ?
+            WHERE article_hash = ?
+        """, (PENDING, time.time() + delay, error[:500], article_hash))
+        conn.close()
+
+    def release(self, article_hash: str, delay: float = 0):
+        """放回隊列但不計失敗次數（例如被限流或Worker停止）"""
+        conn = self._connect()
+        conn.execute("""
+            UPDATE translation_jobs SET status = ?, next_attempt_at = ?, locked_until = 0
+            WHERE article_hash = ?
+        """, (PENDING, time.time() + delay, article_hash))
+        conn.close()
+
+    def fail(self, article_hash: str, error: str):
+        """超過重試次數，移入失敗記錄表"""
+        conn = self._connect()
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT OR REPLACE INTO translation_failures
+                (article_hash, symbol, title, raw_data, attempts, last_error, failed_at)
+                SELECT article_hash, symbol, title, raw_data, attempts + 1, ?, ?
+                FROM translation_jobs WHERE article_hash = ?
+            """, (error[:500], time.time(), article_hash))
+            conn.execute("DELETE FROM translation_jobs WHERE article_hash = ?", (article_hash,))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def is_pending(self, article_hash: str) -> bool:
+        """文章是否已有未完成的翻譯任務"""
+        conn = self._connect()
+        row = conn.execute("SELECT 1 FROM translation_jobs WHERE article_hash = ?", (article_hash,)).fetchone()
+        conn.close()
+
+        return row is not None
+
+    def get_failures(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的失敗記錄"""
+        conn = self._connect()
+        rows = conn.execute("""
+            SELECT article_hash, symbol, title, attempts, last_error, failed_at
+            FROM translation_failures ORDER BY failed_at DESC LIMIT ?
+        """, (limit,)).fetchall()
+        conn.close()
+
+        return [
+            {"article_hash": r[0], "symbol": r[1], "title": r[2], "attempts": r[3], "last_error": r[4], "failed_at": r[5]}
+            for r in rows
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """任務隊列統計"""
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM translation_jobs GROUP BY status").fetchall())
+        failed = conn.execute("SELECT COUNT(*) FROM translation_failures").fetchone()[0]
+        conn.close()
+
+        return {
+            "pending": counts.get(PENDING, 0),
+            "running": counts.get(RUNNING, 0),
+            "failed": failed
+        }
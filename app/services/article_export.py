@@ -0,0 +1,172 @@
+"""
+文章批量導出
+從 MongoDB 服務端游標逐批讀取文章，附上翻譯、評分和關鍵字，
+以 NDJSON 或 Arrow / Parquet 批次流式輸出，內存佔用與導出總量無關
+"""
+
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.database.mongodb_manager import MongoDBManager
+from app.utils.news_analyzer import NewsAnalyzer
+from app.utils.date_parser import get_published
+from app.utils.tickers import get_tickers
+from app.utils.response_cache import dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 導出格式 -> (Content-Type, 文件擴展名)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _export_schema():
+    """Arrow / Parquet 的列定義"""
+    return pa.schema([
+        ("article_id", pa.string()),
+        ("symbols", pa.list_(pa.string())),
+        ("title", pa.string()),
+        ("title_cn", pa.string()),
+        ("summary", pa.string()),
+        ("summary_cn", pa.string()),
+        ("published_at", pa.timestamp("s", tz="UTC")),
+        ("original_time", pa.string()),
+        ("source", pa.string()),
+        ("link", pa.string()),
+        ("score", pa.float64()),
+        ("keywords", pa.list_(pa.string())),
+    ])
+
+
+class _ChunkSink:
+    """只追加的內存文件，寫入器每寫完一個批次就取走已寫的字節"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ArticleExporter:
+    """按股票和時間範圍導出文章"""
+
+    def __init__(self, mongodb: MongoDBManager, analyzer: Optional[NewsAnalyzer] = None, batch_size: int = 1000):
+        self.mongodb = mongodb
+        self.analyzer = analyzer or NewsAnalyzer()
+        self.batch_size = batch_size
+        self.exported = 0
+
+    def iter_records(self, symbols: Optional[List[str]] = None, from_ts: Optional[int] = None,
+                     to_ts: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """逐條產生扁平的導出記錄（與接口返回的字段一致，時間為秒級時間戳）"""
+        for row in self.mongodb.iter_articles(symbols, from_ts, to_ts, batch_size=self.batch_size):
+            article = row["article"]
+            # 入庫時已計算的評分和關鍵字（舊數據在此補算）
+            analyzed_result = self.analyzer.analyze_article(article)
+            source_info = article.get("source", {})
+
+            self.exported += 1
+            yield {
+                "article_id": row["article_id"],
+                "symbols": get_tickers({"symbols": row["symbols"]}),
+                "title": article.get("title", ""),
+                "title_cn": article.get("title_cn"),
+                "summary": article.get("description", "") or article.get("content", ""),
+                "summary_cn": article.get("summary_cn"),
+                "published_at": row["published_ts"],
+                "original_time": get_published(article),
+                "source": source_info.get("name", "Unknown") if isinstance(source_info, dict) else str(source_info),
+                "link": article.get("url", ""),
+                "score": float(analyzed_result["score"]),
+                "keywords": analyzed_result["keywords"],
+            }
+
+    def export(self, fmt: str, symbols: Optional[List[str]] = None, from_ts: Optional[int] = None,
+               to_ts: Optional[int] = None) -> Iterator[bytes]:
+        """
+        按格式逐塊產生導出字節
+
+        Raises:
+            ValueError: 未知格式，或 Arrow / Parquet 格式但未安裝 pyarrow
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt != "ndjson" and not PYARROW_AVAILABLE:
+            raise ValueError(f"Export format {fmt} requires pyarrow")
+
+        records = self.iter_records(symbols, from_ts, to_ts)
+        if fmt == "ndjson":
+            return self._export_ndjson(records)
+        return self._export_columnar(fmt, records)
+
+    def _export_ndjson(self, records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+        """每行一篇，每 batch_size 行輸出一塊"""
+        lines = []
+        try:
+            for record in records:
+                lines.append(dumps(record))
+                if len(lines) >= self.batch_size:
+                    yield b"\n".join(lines) + b"\n"
+                    lines = []
+        finally:
+            records.close()
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    def _export_columnar(self, fmt: str, records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+        """每 batch_size 條寫一個 RecordBatch（Parquet 為一個 row group），寫完即輸出"""
+        schema = _export_schema()
+        sink = _ChunkSink()
+        stream = pa.PythonFile(sink, mode="w")
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(stream, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_stream(stream, schema)
+
+        try:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                    batch = []
+                    yield sink.drain()
+
+            if batch:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        finally:
+            # 提前中止（客戶端斷開）時也關閉寫入器和 MongoDB 游標
+            writer.close()
+            records.close()
+
+        yield sink.drain()
@@ -0,0 +1,200 @@
+"""
+歷史文章批量導入
+讀取 JSONL 文章轉儲（上游原始文章，或 /export 導出的 NDJSON / Arrow / Parquet），
+在進程池中解析發布時間、計算文章ID和關鍵字評分，主進程以無序 bulk upsert 寫入 MongoDB、
+以大事務寫入 SQLite 緩存；不調用上游和 OpenAI
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.database.mongodb_manager import MongoDBManager
+from app.database.sqlite_cache import SQLiteCacheManager
+from app.utils.article_id import ensure_article_id
+from app.utils.date_parser import get_published, parse_timestamp
+from app.utils.news_analyzer import NewsAnalyzer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 工作進程內的分析器（每個進程初始化一次）
+_analyzer: Optional[NewsAnalyzer] = None
+
+
+def _from_export_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """/export 導出的扁平記錄還原為原始文章格式"""
+    article = {
+        "title": record.get("title", ""),
+        "description": record.get("summary", ""),
+        "url": record.get("link", ""),
+        "publishedAt": record.get("original_time", ""),
+        "source": {"name": record.get("source", "Unknown")},
+        "symbols": record.get("symbols") or [],
+        "article_id": record.get("article_id"),
+        "score": record.get("score"),
+        "keywords": record.get("keywords"),
+    }
+    if record.get("title_cn"):
+        article["title_cn"] = record["title_cn"]
+    if record.get("summary_cn"):
+        article["summary_cn"] = record["summary_cn"]
+    return article
+
+
+def _prepare_chunk(items: List[Union[str, Dict[str, Any]]], default_symbol: Optional[str] = None
+                   ) -> Tuple[List[Dict[str, Any]], List[int], int]:
+    """
+    在工作進程中處理一批記錄：解析 JSON、還原格式、計算ID、評分和發布時間戳
+
+    Returns:
+        (文章列表, 發布時間戳列表, 無法解析的行數)
+    """
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = NewsAnalyzer()
+
+    articles: List[Dict[str, Any]] = []
+    timestamps: List[int] = []
+    errors = 0
+
+    for item in items:
+        try:
+            record = json.loads(item) if isinstance(item, str) else item
+        except json.JSONDecodeError:
+            errors += 1
+            continue
+        if not isinstance(record, dict):
+            errors += 1
+            continue
+
+        # 上游響應整包轉儲：{"articles": [...]}
+        records = record["articles"] if isinstance(record.get("articles"), list) else [record]
+        for record in records:
+            if not isinstance(record, dict) or "next_cursor" in record:
+                continue
+            article = _from_export_record(record) if "link" in record and "url" not in record else record
+            if default_symbol and not article.get("symbols"):
+                article["symbols"] = [default_symbol]
+
+            ensure_article_id(article)
+            _analyzer.analyze_article(article)
+            articles.append(article)
+            timestamps.append(parse_timestamp(get_published(article)))
+
+    return articles, timestamps, errors
+
+
+def read_dump(path: str, chunk_size: int = 2000) -> Iterator[List[Union[str, Dict[str, Any]]]]:
+    """
+    逐塊讀取轉儲文件（.jsonl / .ndjson / .json，可 gzip 壓縮；.parquet / .arrows 需要 pyarrow）
+    JSON 行原樣交給工作進程解析，主進程只負責讀文件
+    """
+    if path.endswith((".parquet", ".arrow", ".arrows")):
+        if not PYARROW_AVAILABLE:
+            raise ValueError(f"Reading {path} requires pyarrow")
+        if path.endswith(".parquet"):
+            batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        else:
+            batches = pa.ipc.open_stream(pa.OSFile(path))
+        for batch in batches:
+            # 發布時間以 original_time 為準，列式格式中的 published_at 不需要傳給工作進程
+            yield [{k: v for k, v in row.items() if k != "published_at"} for row in batch.to_pylist()]
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        chunk: List[Union[str, Dict[str, Any]]] = []
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class ArticleImporter:
+    """歷史文章導入：進程池預處理，主進程批量寫入"""
+
+    def __init__(self, mongodb: Optional[MongoDBManager], sqlite_cache: Optional[SQLiteCacheManager],
+                 workers: Optional[int] = None, chunk_size: int = 2000, sqlite_hours: Optional[float] = None,
+                 default_symbol: Optional[str] = None):
+        self.mongodb = mongodb
+        self.sqlite_cache = sqlite_cache
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        # SQLite 是近期緩存，只寫入發布時間在保留期內的文章；更舊的文章只進 MongoDB
+        if sqlite_hours is None and sqlite_cache is not None:
+            sqlite_hours = sqlite_cache.stale_retention_hours
+        self.sqlite_hours = sqlite_hours
+        self.default_symbol = default_symbol.upper() if default_symbol else None
+
+        self.stats = {"read": 0, "errors": 0, "mongodb_saved": 0, "sqlite_saved": 0}
+
+    def run(self, paths: List[str], progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            progress_interval: float = 5.0) -> Dict[str, Any]:
+        """
+        導入文件；預處理在進程池中並行，同時最多有 2 * workers 批在處理，內存佔用與文件大小無關
+
+        Returns:
+            統計 {"read", "errors", "mongodb_saved", "sqlite_saved", "elapsed_seconds", "rate"}
+        """
+        start = time.time()
+        last_report = start
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for path in paths:
+                logger.info(f"📥 Importing {path}")
+                for chunk in read_dump(path, self.chunk_size):
+                    pending.append(pool.submit(_prepare_chunk, chunk, self.default_symbol))
+                    if len(pending) >= self.workers * 2:
+                        self._write(*pending.popleft().result())
+                    if progress and time.time() - last_report >= progress_interval:
+                        last_report = time.time()
+                        progress(self._progress(start))
+
+            while pending:
+                self._write(*pending.popleft().result())
+
+        result = self._progress(start)
+        if progress:
+            progress(result)
+        return result
+
+    def _write(self, articles: List[Dict[str, Any]], timestamps: List[int], errors: int):
+        """一批文章寫入 MongoDB（一次 bulk_write）和 SQLite（一個事務）"""
+        self.stats["read"] += len(articles)
+        self.stats["errors"] += errors
+
+        if self.mongodb:
+            self.stats["mongodb_saved"] += self.mongodb.bulk_save_articles(articles, timestamps)
+
+        if self.sqlite_cache and self.sqlite_hours:
+            cutoff = time.time() - self.sqlite_hours * 3600
+            recent = [i for i, ts in enumerate(timestamps) if ts >= cutoff]
+            if recent:
+                self.stats["sqlite_saved"] += self.sqlite_cache.bulk_save_news(
+                    [articles[i] for i in recent], [timestamps[i] for i in recent]
+                )
+
+    def _progress(self, start: float) -> Dict[str, Any]:
+        elapsed = time.time() - start
+        return {
+            **self.stats,
+            "elapsed_seconds": round(elapsed, 1),
+            "rate": round(self.stats["read"] / elapsed) if elapsed > 0 else 0
+        }
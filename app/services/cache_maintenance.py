@@ -0,0 +1,85 @@
+"""
+後台緩存維護
+定期整表刪除過期的 SQLite 緩存分桶並預建下一個分桶，寫入訪問統計，
+超出容量時逐批淘汰冷門股票的文章，清理過舊的翻譯記憶；請求路徑上不做任何清理。MongoDB 的過期由 TTL 索引自行處理
+"""
+
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from app.database.sqlite_cache import SQLiteCacheManager
+from app.utils.translation_memory import TranslationMemory
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMaintenance:
+    """緩存維護線程"""
+
+    def __init__(self, sqlite_cache: SQLiteCacheManager, interval: Optional[float] = None,
+                 translation_memory: Optional[TranslationMemory] = None):
+        self.sqlite_cache = sqlite_cache
+        self.translation_memory = translation_memory
+        self.interval = interval if interval is not None else float(
+            os.getenv("CACHE_MAINTENANCE_INTERVAL_SECONDS", "300")
+        )
+        self.last_run: Optional[float] = None
+        self.buckets_dropped = 0
+        self.articles_evicted = 0
+        self.memory_pruned = 0
+        self.last_usage: Dict[str, Any] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self):
+        """執行一次維護（多進程同時執行也安全，刪表在 BEGIN IMMEDIATE 內）"""
+        try:
+            self.buckets_dropped += self.sqlite_cache.cleanup_old_cache()
+            self.sqlite_cache.flush_access_stats()
+            self.articles_evicted += self.sqlite_cache.evict_to_budget()
+            self.last_usage = self.sqlite_cache.get_cache_usage()
+            if self.translation_memory:
+                self.memory_pruned += self.translation_memory.prune()
+        except Exception as e:
+            logger.warning(f"⚠️ Cache maintenance failed: {e}")
+        self.last_run = time.time()
+
+    def start(self):
+        """啟動後台維護線程"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                self.run_once()
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=_loop, name="cache-maintenance", daemon=True)
+        self._thread.start()
+        logger.info(f"🧹 Cache maintenance started (every {self.interval:.0f}s)")
+
+    def stop(self):
+        """停止後台維護線程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """維護統計"""
+        return {
+            "interval_seconds": self.interval,
+            "last_run": self.last_run,
+            "buckets_dropped": self.buckets_dropped,
+            "articles_evicted": self.articles_evicted,
+            "translation_memory_pruned": self.memory_pruned,
+            "usage": self.last_usage,
+            "max_rows": self.sqlite_cache.max_rows,
+            "max_mb": self.sqlite_cache.max_mb
+        }
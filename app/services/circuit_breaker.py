@@ -0,0 +1,216 @@
+"""
+上游熔斷器
+按錯誤類型（認證、429、5xx、超時）分別熔斷，指數退避 + 抖動的半開探測，
+狀態保存在內存中，狀態變化時寫入 SQLite 並定期同步給其他進程
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional
+
+from app.database.sqlite_cache import SQLiteCacheManager
+
+logger = logging.getLogger(__name__)
+
+AUTH = "auth"
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+
+# 上游數據請求本身的錯誤類型（認證由登錄流程單獨把關）
+UPSTREAM_KINDS = (RATE_LIMIT, SERVER_ERROR, TIMEOUT)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitState:
+    state: str = CLOSED
+    failures: int = 0          # 連續失敗次數
+    trips: int = 0             # 連續熔斷次數，決定退避時長
+    open_until: float = 0.0
+    last_failure_at: float = 0.0
+    changed_at: float = 0.0    # 用於跨進程同步時判斷哪邊較新
+    probe_started_at: float = 0.0
+
+
+class CircuitBreaker:
+    """按錯誤類型分別熔斷的上游熔斷器"""
+
+    # 觸發熔斷需要的連續失敗次數：登錄失敗和429一次就退避，5xx/超時允許偶發
+    FAILURE_THRESHOLDS = {AUTH: 1, RATE_LIMIT: 1, SERVER_ERROR: 3, TIMEOUT: 3}
+
+    def __init__(self, cache_manager: Optional[SQLiteCacheManager] = None,
+                 base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                 sync_interval: float = 2.0, probe_timeout: float = 60.0):
+        self.cache_manager = cache_manager or SQLiteCacheManager()
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("CIRCUIT_BASE_DELAY_SECONDS", "5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("CIRCUIT_MAX_DELAY_SECONDS", "300"))
+        self.sync_interval = sync_interval
+        self.probe_timeout = probe_timeout
+
+        self._states: Dict[str, CircuitState] = {kind: CircuitState() for kind in self.FAILURE_THRESHOLDS}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+
+    # ---------- 狀態查詢（請求路徑，只讀內存） ----------
+
+    def is_open(self, *kinds: str) -> bool:
+        """是否處於熔斷期（不佔用半開探測名額），不傳類型時檢查全部"""
+        self._maybe_sync()
+        now = time.time()
+        kinds = kinds or tuple(self._states)
+        return any(
+            self._states[k].state != CLOSED and now < self._states[k].open_until
+            for k in kinds
+        )
+
+    def retry_after(self, *kinds: str) -> float:
+        """距離下一次允許探測還有多少秒"""
+        now = time.time()
+        kinds = kinds or tuple(self._states)
+        return max([max(0.0, self._states[k].open_until - now) for k in kinds if self._states[k].state != CLOSED] or [0.0])
+
+    def allow_request(self, *kinds: str) -> bool:
+        """
+        是否允許發出請求
+        熔斷期結束後進入半開狀態，只放行一個探測請求，其結果決定關閉還是再次熔斷
+        """
+        self._maybe_sync()
+        now = time.time()
+        kinds = kinds or tuple(self._states)
+
+        with self._lock:
+            for k in kinds:
+                st = self._states[k]
+                if st.state == CLOSED:
+                    continue
+                if now < st.open_until:
+                    return False
+                # 已有探測在進行中（超時的探測視為丟失）
+                if st.state == HALF_OPEN and now - st.probe_started_at < self.probe_timeout:
+                    return False
+
+            probing = []
+            for k in kinds:
+                st = self._states[k]
+                if st.state != CLOSED:
+                    st.state = HALF_OPEN
+                    st.probe_started_at = now
+                    st.changed_at = now
+                    probing.append(k)
+                    logger.info(f"🔎 Circuit {k} half-open, sending probe")
+
+        # 讓其他進程知道已有探測在進行
+        for k in probing:
+            self._persist(k)
+
+        return True
+
+    # ---------- 記錄結果 ----------
+
+    def record_success(self, *kinds: str):
+        """記錄成功：不傳類型時表示一次成功的上游調用，所有錯誤類型都已恢復"""
+        kinds = kinds or tuple(self._states)
+        changed = []
+
+        with self._lock:
+            for k in kinds:
+                st = self._states[k]
+                if st.state != CLOSED or st.failures:
+                    if st.state != CLOSED:
+                        logger.info(f"✅ Circuit {k} closed")
+                    self._states[k] = CircuitState(changed_at=time.time())
+                    changed.append(k)
+
+        for k in changed:
+            self._persist(k)
+
+    def record_failure(self, kind: str):
+        """記錄一次失敗，達到閾值或半開探測失敗時熔斷"""
+        now = time.time()
+
+        with self._lock:
+            st = self._states[kind]
+            st.failures += 1
+            st.last_failure_at = now
+
+            if st.state == HALF_OPEN or st.failures >= self.FAILURE_THRESHOLDS[kind]:
+                st.trips += 1
+                delay = min(self.max_delay, self.base_delay * (2 ** (st.trips - 1)))
+                # 抖動，避免多個進程同時探測
+                delay *= random.uniform(0.75, 1.25)
+                st.state = OPEN
+                st.open_until = now + delay
+                logger.warning(f"⛔ Circuit {kind} open for {delay:.1f}s (trip #{st.trips})")
+
+            st.changed_at = now
+
+        self._persist(kind)
+
+    def reset(self, *kinds: str):
+        """手動關閉熔斷（管理員操作或重啟）"""
+        kinds = kinds or tuple(self._states)
+
+        with self._lock:
+            for k in kinds:
+                self._states[k] = CircuitState(changed_at=time.time())
+
+        for k in kinds:
+            self._persist(k)
+
+    def last_failure_time(self, kind: str) -> Optional[float]:
+        """最近一次失敗時間"""
+        return self._states[kind].last_failure_at or None
+
+    # ---------- 跨進程同步 ----------
+
+    def _persist(self, kind: str):
+        """把狀態寫入 SQLite，供其他進程同步"""
+        try:
+            self.cache_manager.set_system_status(f"circuit:{kind}", json.dumps(asdict(self._states[kind])))
+        except Exception as e:
+            logger.warning(f"⚠️ Error persisting circuit state: {e}")
+
+    def _maybe_sync(self):
+        """每 sync_interval 秒最多讀一次 SQLite，採用較新的狀態"""
+        now = time.time()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        for kind in self._states:
+            try:
+                raw = self.cache_manager.get_system_status(f"circuit:{kind}")
+                if not raw:
+                    continue
+                remote = CircuitState(**json.loads(raw))
+            except Exception:
+                continue
+
+            with self._lock:
+                if remote.changed_at > self._states[kind].changed_at:
+                    # 探測名額只屬於發出探測的進程
+                    if remote.state == HALF_OPEN:
+                        remote.probe_started_at = now
+                    self._states[kind] = remote
+
+    def get_status(self) -> Dict[str, Any]:
+        """獲取各類熔斷狀態"""
+        now = time.time()
+        return {
+            kind: {
+                "state": st.state,
+                "failures": st.failures,
+                "trips": st.trips,
+                "retry_after": round(max(0.0, st.open_until - now), 1) if st.state != CLOSED else 0
+            }
+            for kind, st in self._states.items()
+        }
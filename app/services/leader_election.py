@@ -0,0 +1,88 @@
+"""
+後台服務選主
+多個 uvicorn / gunicorn worker 進程各自執行 lifespan，翻譯 Worker 池、緩存維護和監控列表抓取
+只需要一個進程運行：各進程競爭共享鎖，取得鎖的進程啟動這些服務並定期續期，
+續期失敗（例如進程卡住超過 ttl）時停止服務，由其他進程接手
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+from app.database.shared_state import SharedStateManager
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """基於 SharedStateManager 鎖的跨進程選主"""
+
+    def __init__(self, shared_state: SharedStateManager,
+                 on_elected: Callable[[], Awaitable[None]],
+                 on_demoted: Callable[[], Awaitable[None]],
+                 name: str = "background_leader", ttl: Optional[float] = None):
+        """
+        Args:
+            on_elected: 成為主進程時調用（啟動後台服務）
+            on_demoted: 失去主進程身份或停止時調用（停止後台服務）
+        """
+        self.shared_state = shared_state
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.name = name
+        self.ttl = ttl if ttl is not None else float(os.getenv("LEADER_LOCK_TTL_SECONDS", "30"))
+
+        self.owner: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.owner is not None
+
+    def start(self):
+        """啟動選主循環（需要在事件循環中調用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止選主循環；是主進程時停止後台服務並釋放鎖，其他進程隨即接手"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self.owner:
+            owner, self.owner = self.owner, None
+            await self.on_demoted()
+            await asyncio.to_thread(self.shared_state.release_lock, self.name, owner)
+
+    async def _loop(self):
+        """每 ttl/3 秒續期或嘗試取得鎖"""
+        while True:
+            try:
+                await self._step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Leader election error: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    async def _step(self):
+        if self.owner:
+            if await asyncio.to_thread(self.shared_state.renew_lock, self.name, self.owner, self.ttl):
+                return
+            logger.warning("👑 Lost background leader lock, stopping background services")
+            self.owner = None
+            await self.on_demoted()
+            return
+
+        owner = await asyncio.to_thread(self.shared_state.try_lock, self.name, self.ttl)
+        if owner:
+            self.owner = owner
+            logger.info(f"👑 Elected background leader (pid {os.getpid()}), starting background services")
+            await self.on_elected()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """選主狀態"""
+        return {"is_leader": self.is_leader, "pid": os.getpid(), "lock_ttl_seconds": self.ttl}
@@ -7,31 +7,58 @@ import requests
 import json
 import time
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
 import os
+import re
 import sys
+import logging
 from dotenv import load_dotenv
 
 # 加載環境變量
 load_dotenv()
 
 from app.services.newsfilter_auth import NewsFilterAuth
+from app.services.translation_queue import BackgroundTranslationQueue
+from app.services.cache_maintenance import CacheMaintenance
+from app.services.watchlist_firehose import WatchlistFirehose
+from app.services.leader_election import LeaderElection
+from app.services.query_strategy import QueryStrategy, build_query
+from app.services.circuit_breaker import CircuitBreaker, AUTH, RATE_LIMIT, SERVER_ERROR, TIMEOUT, UPSTREAM_KINDS
 from app.database.sqlite_cache import SQLiteCacheManager
 from app.database.mongodb_manager import MongoDBManager
+from app.database.shared_state import SharedStateManager
 from app.utils.news_analyzer import NewsAnalyzer
-from app.utils.chatgpt_translator import ChatGPTTranslator
+from app.utils.chatgpt_translator import ChatGPTTranslator, TranslationError
+from app.utils.date_parser import parse_timestamp, parse_time_value, get_published
+from app.utils.article_id import ensure_article_id
+from app.utils.tickers import get_tickers
+from app.utils.near_duplicate import group_near_duplicates
+from app.utils.response_cache import ResponseCache
+from app.utils.cancellation import RequestCancelled, check_cancelled, is_cancelled, time_left
+
+logger = logging.getLogger(__name__)
+
+# 接口返回的翻頁游標 "時間戳:文章ID"
+_POSITION_CURSOR = re.compile(r'^(\d+):([0-9a-f]{16,64})$')
 
 
 class SuperFastNewsService:
     """超高速NewsFilter服務"""
     
-    def __init__(self):
+    def __init__(self, response_cache: Optional[ResponseCache] = None):
         self.api_url = os.getenv("NEWSFILTER_API_URL", "https://api.newsfilter.io/actions")
         
         # 初始化各個組件
-        self.auth = NewsFilterAuth()
         self.sqlite_cache = SQLiteCacheManager()
+        # API 層已序列化的響應，文章或翻譯寫入後按股票失效
+        self.response_cache = response_cache
+        # 按股票選擇上游查詢方式
+        self.query_strategy = QueryStrategy(self.sqlite_cache)
+        # 熔斷器由認證和上游請求共用
+        self.circuit_breaker = CircuitBreaker(self.sqlite_cache)
+        self.auth = NewsFilterAuth(circuit_breaker=self.circuit_breaker)
+        self.shared_state = SharedStateManager()
         
         # MongoDB連接（帶錯誤處理）
         self.mongodb = None
@@ -40,26 +67,54 @@ class SuperFastNewsService:
         # ChatGPT翻譯器
         self.translator = ChatGPTTranslator()
         
+        # 後台整表刪除過期緩存分桶，清理翻譯記憶
+        self.cache_maintenance = CacheMaintenance(self.sqlite_cache, translation_memory=self.translator.memory)
+        
         # 新聞分析器
         self.news_analyzer = NewsAnalyzer()
         
+        # 翻譯任務隊列（SQLite持久化 + 帶 RPM/TPM 預算的 Worker 池）
+        self.translation_queue = BackgroundTranslationQueue(
+            self.translator,
+            self._save_translation,
+            shared_state=self.shared_state,
+            worker_count=int(os.getenv("TRANSLATION_WORKERS", "2"))
+        )
+        
         self.request_timeout = 30
         
-        print("🚀 SuperFast NewsFilter Service initialized")
+        # 負緩存：上游沒有結果 / 10天內沒有文章的股票，在此期間直接返回空列表
+        self.negative_empty_ttl = float(os.getenv("NEGATIVE_CACHE_EMPTY_SECONDS", "300"))
+        self.negative_stale_ttl = float(os.getenv("NEGATIVE_CACHE_STALE_SECONDS", "1800"))
+        
+        # 監控列表批量抓取（WATCHLIST_SYMBOLS 為空時不啟用）
+        self.firehose = WatchlistFirehose(self)
+        
+        # 翻譯 Worker 池、緩存維護和監控列表抓取只在選出的一個進程中運行
+        self.leader = LeaderElection(self.shared_state, self._start_background_services,
+                                     self._stop_background_services)
+        
+        # 上游令牌桶（跨進程共享）：默認每秒2次，相當於原來的500ms間隔
+        self.upstream_rate = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "2"))
+        self.upstream_burst = float(os.getenv("UPSTREAM_BURST", "2"))
+        
+        logger.info("🚀 SuperFast NewsFilter Service initialized")
     
     def _init_mongodb(self):
         """初始化MongoDB連接，帶錯誤處理"""
         try:
             self.mongodb = MongoDBManager()
             if self.mongodb.client is None:
-                print("⚠️ MongoDB connection failed, running without database persistence")
+                logger.warning("⚠️ MongoDB connection failed, running without database persistence")
                 self.mongodb = None
         except Exception as e:
-            print(f"⚠️ MongoDB initialization error: {e}")
-            print("⚠️ Running without MongoDB - data will only be cached locally")
+            logger.warning(f"⚠️ MongoDB initialization error: {e}")
+            logger.warning("⚠️ Running without MongoDB - data will only be cached locally")
             self.mongodb = None
     
-    async def get_symbol_news(self, symbol: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_symbol_news(self, symbol: str, limit: int = 10, since: Optional[str] = None,
+                              meta: Optional[Dict[str, Any]] = None,
+                              translate_async: bool = False) -> List[Dict[str, Any]]:
         """
         獲取指定股票的新聞
         
@@ -67,172 +122,356 @@ class SuperFastNewsService:
         1. SQLite緩存（1小時內）
         2. MongoDB數據庫
         3. NewsFilter API
+        4. 上游不可用時降級：返回已過期的SQLite緩存
+        
+        since: 只返回比該游標更新的文章（"時間戳:文章ID"、時間戳或文章ID），在存儲查詢層過濾；
+               有游標時返回游標之後最早的 limit 篇（從舊到新），翻頁不會跳過文章
+        meta: 可選，填入數據來源和新鮮度（source / freshness / age）和下一個游標（cursor），供接口寫入響應頭
+        translate_async: 不等待翻譯，缺少翻譯的文章 title_cn/summary_cn 為 None 並標記 translation_pending，
+                         翻譯放入後台隊列，完成後寫回緩存
+        
+        當前請求的取消令牌（cancel_token_var）被取消或超時後，停止上游請求和翻譯
         
         如果有錯誤，返回 [{"msg": "error message"}]
         """
         
+        if meta is None:
+            meta = {}
+        
         try:
             symbol = symbol.upper()
             
-            # 檢查是否處於登錄失敗狀態（同步 SQLite 狀態，避免 in-memory flag 未初始化）
-            self.auth._check_login_failure_status()
-            if self.auth.is_login_failed:
-                remaining_time = self.auth.get_remaining_sleep_time()
-                if remaining_time > 0:
-                    return [{"msg": "NewsFilter Fail"}]
-            
             # 1. 先檢查SQLite緩存
-            print(f"🔍 Checking cache for {symbol}...")
-            cached_articles = self.sqlite_cache.get_news_cache(symbol, limit)
+            logger.debug("🔍 Checking cache for %s...", symbol)
+            since_ts, since_id = self._resolve_cursor(since) or (None, None)
+            
+            # 負緩存：最近確認過沒有（近期）新聞的股票不再查詢任何存儲和上游
+            negative = self.sqlite_cache.get_negative(symbol)
+            if negative is not None:
+                logger.debug("🚫 Negative cache hit for %s (%s)", symbol, negative[0])
+                self._set_freshness(meta, "cache", "empty", negative[1])
+                return []
             
-            if cached_articles:
-                print(f"✅ Found {len(cached_articles)} articles in cache")
-                return await self._process_articles(cached_articles, symbol)
+            cached_articles = self.sqlite_cache.get_news_cache(symbol, limit, since_ts=since_ts, since_id=since_id)
             
-            # 2. 檢查MongoDB
-            if self.mongodb:
-                print(f"🔍 Checking MongoDB for {symbol}...")
-                db_articles = self.mongodb.get_news_articles(symbol, limit)
+            # 緩存是否新鮮以該股票本身最近一次完整抓取為準：只因其他股票的文章帶有它的標籤
+            # 而寫入的關聯只是額外的行，不代表它的新聞已經抓取過
+            # 有 since 時，即使沒有更新的文章，只要緩存仍然新鮮就直接返回空增量
+            if (cached_articles or since_ts is not None) and self.sqlite_cache.has_fresh_cache(symbol):
+                logger.debug("✅ Found %d articles in cache", len(cached_articles))
+                self._set_freshness(meta, "cache", "fresh", self.sqlite_cache.get_fetch_age(symbol))
+                return await self._process_articles(cached_articles, symbol, translate_async, meta)
+            
+            # 監控列表中的股票由批量抓取覆蓋，覆蓋期內只讀本地存儲，不單獨查詢上游
+            coverage_age = self.sqlite_cache.get_coverage_age(symbol)
+            if coverage_age is not None and coverage_age <= self.firehose.coverage_seconds:
+                covered_articles = await self._serve_covered(symbol, limit, since_ts, since_id, meta, coverage_age,
+                                                             translate_async)
+                if covered_articles is not None:
+                    return covered_articles
+            
+            # 2. 檢查MongoDB（只有以該股票本身抓取過的股票；否則 MongoDB 中只有其他股票帶入的零星文章）
+            if self.mongodb and self.sqlite_cache.get_fetch_age(symbol) is not None:
+                logger.debug("🔍 Checking MongoDB for %s...", symbol)
+                db_articles = self.mongodb.get_news_articles(symbol, limit, since_ts=since_ts, since_id=since_id)
                 
                 if db_articles:
-                    print(f"✅ Found {len(db_articles)} articles in MongoDB")
-                    # 保存到緩存
-                    self.sqlite_cache.save_news_cache(symbol, db_articles)
-                    return await self._process_articles(db_articles, symbol)
+                    logger.debug("✅ Found %d articles in MongoDB", len(db_articles))
+                    # 保存到緩存（增量結果不完整，不寫入緩存）
+                    if since_ts is None:
+                        self._ingest_articles(db_articles)
+                        self.sqlite_cache.save_news_cache(symbol, db_articles)
+                        self._invalidate_responses(symbol, db_articles)
+                        self.sqlite_cache.mark_fetched(symbol)
+                        if not self._has_recent(db_articles):
+                            self.sqlite_cache.set_negative(symbol, "stale", self.negative_stale_ttl)
+                    self._set_freshness(meta, "mongodb", "historical")
+                    return await self._process_articles(db_articles, symbol, translate_async, meta)
+            
+            # 熔斷中不打上游，直接降級（只讀內存狀態，熔斷期結束後由探測請求決定是否恢復）
+            if self.circuit_breaker.is_open(AUTH) or self.circuit_breaker.is_open(*UPSTREAM_KINDS):
+                return await self._serve_degraded(symbol, limit, since_ts, since_id, meta,
+                                                  [{"msg": "NewsFilter Fail"}], translate_async)
             
-            # 3. 從NewsFilter API獲取
-            print(f"🔍 Fetching from NewsFilter API for {symbol}...")
-            api_articles = await self._fetch_from_api(symbol, limit)
+            # 3. 從NewsFilter API獲取（跨進程單飛：同一股票同時只有一個請求打上游）
+            lock_name = f"fetch:{symbol}"
+            # 鎖操作是 SQLite 寫事務（可能等待其他進程的寫鎖），放到線程中執行，不阻塞事件循環
+            owner = await asyncio.to_thread(self.shared_state.try_lock, lock_name, self.request_timeout * 2)
+            if owner is None:
+                peer_articles = await self._wait_for_peer_fetch(lock_name, symbol, limit, since_ts, since_id)
+                if peer_articles is not None:
+                    return await self._process_articles(peer_articles, symbol, translate_async, meta)
+                owner = await asyncio.to_thread(self.shared_state.try_lock, lock_name, self.request_timeout * 2)
             
+            try:
+                logger.info(f"🔍 Fetching from NewsFilter API for {symbol}...")
+                api_articles = await self._fetch_from_api(symbol, limit)
+                
+                # None 表示上游出錯（429/5xx/超時）；錯誤訊息（例如 auth failure）不應存入緩存
+                upstream_ok = api_articles is not None and not (len(api_articles) == 1 and "msg" in api_articles[0])
+                
+                if upstream_ok and api_articles:
+                    # 入庫時計算一次文章ID和評分，之後各存儲和翻譯隊列都沿用
+                    self._ingest_articles(api_articles)
+                    
+                    # 保存到緩存和數據庫
+                    self.sqlite_cache.save_news_cache(symbol, api_articles)
+                    self._invalidate_responses(symbol, api_articles)
+                    if self.mongodb:
+                        self.mongodb.save_news_articles(symbol, api_articles)
+                if upstream_ok:
+                    self.sqlite_cache.mark_fetched(symbol)
+            finally:
+                if owner:
+                    await asyncio.to_thread(self.shared_state.release_lock, lock_name, owner)
+            
+            if not upstream_ok:
+                return await self._serve_degraded(symbol, limit, since_ts, since_id, meta, api_articles or [],
+                                                  translate_async)
+            
+            self._set_freshness(meta, "api", "fresh", 0)
             if not api_articles:
-                print(f"📭 No articles found for {symbol}")
+                logger.info(f"📭 No articles found for {symbol}")
+                self.sqlite_cache.set_negative(symbol, "empty", self.negative_empty_ttl)
                 return []
             
-            # 檢查是否為錯誤訊息（例如 auth failure），不應存入緩存
-            if len(api_articles) == 1 and "msg" in api_articles[0]:
-                return api_articles
+            if not self._has_recent(api_articles):
+                # 只有10天外的舊文章，處理後必然為空
+                self.sqlite_cache.set_negative(symbol, "stale", self.negative_stale_ttl)
             
-            # 保存到緩存和數據庫
-            self.sqlite_cache.save_news_cache(symbol, api_articles)
-            if self.mongodb:
-                self.mongodb.save_news_articles(symbol, api_articles)
+            # API 不支持按時間過濾，在處理（翻譯）之前先取游標之後最早的 limit 篇，與存儲查詢一致
+            if since_ts is not None:
+                # 只有時間戳的游標：同一秒發布的文章不算在游標之後
+                after = (since_ts, since_id or "\uffff")
+                api_articles = sorted(
+                    (a for a in api_articles if self._article_position(a) > after),
+                    key=self._article_position
+                )[:limit]
             
             # 處理並返回
-            return await self._process_articles(api_articles, symbol)
+            return await self._process_articles(api_articles, symbol, translate_async, meta)
             
+        except RequestCancelled as e:
+            logger.info(f"🚫 Request for {symbol} abandoned ({e}), stopping work")
+            return [{"msg": "Request cancelled"}]
         except Exception as e:
-            print(f"❌ Error in get_symbol_news: {e}")
+            logger.exception(f"❌ Error in get_symbol_news: {e}")
             return [{"msg": f"Error: {str(e)}"}]
     
-    async def _fetch_from_api(self, symbol: str, limit: int) -> List[Dict[str, Any]]:
-        """从NewsFilter API获取新闻 (异步非阻塞版本)"""
+    async def _serve_degraded(self, symbol: str, limit: int, since_ts: Optional[int], since_id: Optional[str],
+                              meta: Dict[str, Any], fallback: List[Dict[str, Any]],
+                              translate_async: bool = False) -> List[Dict[str, Any]]:
+        """
+        上游不可用時的降級：返回已過期但仍保留的SQLite緩存，並標記為 stale
+        本地沒有任何數據時返回 fallback（錯誤訊息或空列表）
+        """
+        stale_articles = self.sqlite_cache.get_news_cache(symbol, limit, since_ts=since_ts, max_age_seconds=None,
+                                                          since_id=since_id)
+        age = self.sqlite_cache.get_cache_age(symbol)
         
-        # 将阻塞的requests调用放入线程池执行
-        import asyncio
-        loop = asyncio.get_running_loop()
+        if not stale_articles and (since_ts is None or age is None):
+            return fallback
+        
+        logger.warning(f"🩹 Upstream unavailable, serving {len(stale_articles)} stale cached articles for {symbol}")
+        self._set_freshness(meta, "cache", "stale", age)
+        return await self._process_articles(stale_articles, symbol, translate_async, meta)
+    
+    async def _serve_covered(self, symbol: str, limit: int, since_ts: Optional[int], since_id: Optional[str],
+                             meta: Dict[str, Any], coverage_age: float,
+                             translate_async: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        批量抓取覆蓋期內的股票：本地緩存（含已過新鮮期的）→ MongoDB
+        覆蓋期內沒有新文章寫入，說明上游確實沒有更新的新聞；本地完全沒有該股票的文章時
+        （監控開始前的舊新聞）返回 None，由調用方按正常流程查詢一次
+        """
+        articles = self.sqlite_cache.get_news_cache(symbol, limit, since_ts=since_ts, max_age_seconds=None,
+                                                    since_id=since_id)
+        if not articles and self.mongodb:
+            articles = self.mongodb.get_news_articles(symbol, limit, since_ts=since_ts, since_id=since_id)
+        
+        # 增量請求沒有更新的文章即為空增量；全量請求本地沒有任何文章時交回正常流程
+        if not articles and since_ts is None:
+            return None
+        
+        self._set_freshness(meta, "cache", "fresh", coverage_age)
+        return await self._process_articles(articles, symbol, translate_async, meta)
+    
+    @staticmethod
+    def _set_freshness(meta: Dict[str, Any], source: str, freshness: str, age: Optional[float] = None):
+        """記錄數據來源和新鮮度"""
+        meta["source"] = source
+        meta["freshness"] = freshness
+        meta["age"] = int(age) if age is not None else None
+    
+    async def _wait_for_peer_fetch(self, lock_name: str, symbol: str, limit: int, since_ts: Optional[int],
+                                   since_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        等待持有鎖的 Worker/進程完成抓取，然後從緩存讀取它寫入的結果
+        對方沒有寫入任何數據（空結果或錯誤）時返回 None，由調用方自己抓取
+        """
+        logger.debug("⏳ Waiting for in-flight fetch of %s", symbol)
+        deadline = time.monotonic() + self.request_timeout
+        
+        while await asyncio.to_thread(self.shared_state.is_locked, lock_name) and time.monotonic() < deadline:
+            check_cancelled()
+            await asyncio.sleep(0.25)
+        
+        cached_articles = self.sqlite_cache.get_news_cache(symbol, limit, since_ts=since_ts, since_id=since_id)
+        if cached_articles or self.sqlite_cache.has_fresh_cache(symbol):
+            return cached_articles
         
+        return None
+    
+    def _wait_for_upstream_slot(self) -> bool:
+        """從跨進程令牌桶取得一次上游調用額度（取代固定 sleep，避免429）"""
+        return self.shared_state.acquire_token(
+            "newsfilter_api",
+            rate=self.upstream_rate,
+            capacity=self.upstream_burst,
+            timeout=time_left(self.request_timeout)
+        )
+    
+    async def _fetch_from_api(self, symbol: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """从NewsFilter API获取新闻 (异步非阻塞版本)，上游出錯時返回 None"""
+        
+        # 将阻塞的requests调用放入线程池执行
         def _sync_request():
             """在线程中执行的同步请求逻辑"""
-            headers = self.auth.get_auth_headers()
-            if not headers:
-                print(f"❌ Auth failed for {symbol}, no valid token")
-                return [{"msg": "NewsFilter Fail"}]
+            # 按該股票以往的結果選擇查詢方式；沒有統計時先寬查詢（标题、描述或代码），為空再只查代碼
+            for shape in self.query_strategy.plan(symbol):
+                articles = self._query_upstream(build_query(shape, symbol), label=symbol)
+                
+                if articles is None or (len(articles) == 1 and "msg" in articles[0]):
+                    return articles
+                
+                self.query_strategy.record(symbol, shape, articles)
+                if articles:
+                    logger.info(f"✅ API returned {len(articles)} articles for {symbol} ({shape} query)")
+                    # 截取用户需要的数量
+                    return articles[:limit] if limit < len(articles) else articles
+                
+                logger.info(f"📭 API returned no articles for {symbol} ({shape} query)")
             
-            # 使用更广泛的查询字符串，匹配标题、描述或代码
-            search_query = f'title:"{symbol}" OR description:"{symbol}" OR symbols:"{symbol}"'
+            return []
+
+        # asyncio.to_thread 會複製 contextvars，線程內的日誌保留請求ID
+        return await asyncio.to_thread(_sync_request)
+    
+    def _post_upstream(self, headers: Dict[str, str], payload: Dict[str, Any]) -> requests.Response:
+        """發送一次 filterArticles 請求（同步）"""
+        check_cancelled()
+        return requests.post(
+            self.api_url,
+            headers=headers,
+            json=payload,
+            timeout=time_left(self.request_timeout)
+        )
+    
+    def _handle_upstream_response(self, response: requests.Response) -> Optional[List[Dict[str, Any]]]:
+        """按狀態碼處理上游響應（401 以外），並記錄到熔斷器"""
+        if response.status_code == 200:
+            self.circuit_breaker.record_success(*UPSTREAM_KINDS)
+            return response.json().get("articles", [])
+        
+        if response.status_code == 429:
+            logger.warning("⏳ Rate limited by API")
+            self.circuit_breaker.record_failure(RATE_LIMIT)
+            return None
+        
+        logger.error(f"❌ API error: {response.status_code} - {response.text[:500]}")
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure(SERVER_ERROR)
+        return None
+    
+    def _query_upstream(self, query_string: str, size: int = 50, offset: int = 0,
+                        label: str = "") -> Optional[List[Dict[str, Any]]]:
+        """
+        向上游發送一次 filterArticles 查詢（同步，在線程中調用）
+        
+        Returns:
+            文章列表；上游出錯（429/5xx/超時/額度用盡）時返回 None；
+            認證失敗或熔斷時返回 [{"msg": "NewsFilter Fail"}]
+        """
+        # 429/5xx/超時熔斷期間不打上游，熔斷期結束後只放行一個探測請求
+        if not self.circuit_breaker.allow_request(*UPSTREAM_KINDS):
+            logger.warning(f"⛔ Upstream circuit open, skipping fetch for {label}")
+            return [{"msg": "NewsFilter Fail"}]
+        
+        headers = self.auth.get_auth_headers()
+        if not headers:
+            logger.error(f"❌ Auth failed for {label}, no valid token")
+            return [{"msg": "NewsFilter Fail"}]
+        
+        payload = {
+            "type": "filterArticles",
+            "isPublic": False,
+            "queryString": query_string,
+            "from": offset,
+            "size": size  # 恢复固定50个，如用户提供的示例
+        }
+        
+        try:
+            # Rate limiting（所有進程共用的令牌桶）
+            check_cancelled()
+            if not self._wait_for_upstream_slot():
+                logger.warning(f"⏳ Upstream budget exhausted, skipping fetch for {label}")
+                return None
             
-            payload = {
-                "type": "filterArticles",
-                "isPublic": False,
-                "queryString": search_query,
-                "from": 0,
-                "size": 50  # 恢复固定50个，如用户提供的示例
-            }
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Payload for %s: %s", label, json.dumps(payload))
             
-            try:
-                # Rate limiting
-                time.sleep(0.5)  # 500ms延迟避免429错误
-                
-                print(f"DEBUG: Payload for {symbol}: {json.dumps(payload)}")
-                # print(f"DEBUG: Headers: {str(headers)[:50]}...")
-                
-                response = requests.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.request_timeout
+            response = self._post_upstream(headers, payload)
+            
+            if response.status_code == 401:
+                logger.warning("🔑 Token rejected (401), attempting re-login...")
+                check_cancelled()
+                # 登錄失敗由登錄流程自己記錄到熔斷器，這裡不重複記錄
+                new_token = self.auth._login_and_get_token(
+                    rejected_token=headers["Authorization"].replace("Bearer ", "", 1)
                 )
+                new_headers = self.auth.get_auth_headers() if new_token else None
+                if not new_headers:
+                    logger.error("❌ Re-login failed after 401")
+                    return [{"msg": "NewsFilter Fail"}]
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    # print(f"DEBUG: Response data keys: {data.keys()}")
-                    articles = data.get("articles", [])
-                    
-                    if articles:
-                        print(f"✅ API returned {len(articles)} articles for {symbol}")
-                        # 截取用户需要的数量
-                        return articles[:limit] if limit < len(articles) else articles
-                    else:
-                        print(f"📭 API returned no articles for {symbol}")
-                        # 尝试降级查询：仅查询symbol
-                        if 'OR' in search_query:
-                            print(f"⚠️ Retrying with simple symbol query for {symbol}...")
-                            time.sleep(1)
-                            simple_payload = payload.copy()
-                            simple_payload['queryString'] = symbol
-                            retry_response = requests.post(
-                                self.api_url,
-                                headers=headers,
-                                json=simple_payload,
-                                timeout=self.request_timeout
-                            )
-                            if retry_response.status_code == 200:
-                                retry_data = retry_response.json()
-                                return retry_data.get("articles", [])
-                        return []
-                        
-                elif response.status_code == 429:
-                    print("⏳ Rate limited by API")
-                    return []
-                    
-                elif response.status_code == 401:
-                    print("🔑 Token rejected (401), attempting re-login...")
-                    new_token = self.auth._login_and_get_token()
-                    if new_token:
-                        # 重新組建 headers 並重試一次
-                        new_headers = self.auth.get_auth_headers()
-                        if new_headers:
-                            retry_response = requests.post(
-                                self.api_url,
-                                headers=new_headers,
-                                json=payload,
-                                timeout=self.request_timeout
-                            )
-                            if retry_response.status_code == 200:
-                                return retry_response.json().get("articles", [])
-                    print("❌ Re-login failed after 401, marking auth as failed")
+                # 用新 token 重試一次，結果按同樣的狀態碼分類
+                response = self._post_upstream(new_headers, payload)
+                if response.status_code == 401:
+                    logger.error("❌ Fresh token rejected (401), marking auth as failed")
                     self.auth._set_login_failure()
                     return [{"msg": "NewsFilter Fail"}]
-                else:
-                    print(f"❌ API error: {response.status_code} - {response.text}")
-                    return []
-                    
-            except Exception as e:
-                print(f"❌ API request exception: {e}")
-                import traceback
-                print(traceback.format_exc())
-                return []
-
-        # 使用run_in_executor执行同步函数
-        return await loop.run_in_executor(None, _sync_request)
+            
+            return self._handle_upstream_response(response)
+                
+        except requests.Timeout:
+            logger.error(f"❌ API request timed out for {label}")
+            self.circuit_breaker.record_failure(TIMEOUT)
+            return None
+        except requests.ConnectionError as e:
+            logger.error(f"❌ API connection error: {e}")
+            self.circuit_breaker.record_failure(SERVER_ERROR)
+            return None
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.exception(f"❌ API request exception: {e}")
+            return None
     
-    async def _process_articles(self, articles: List[Dict[str, Any]], symbol: str) -> List[Dict[str, Any]]:
+    async def _process_articles(self, articles: List[Dict[str, Any]], symbol: str,
+                                translate_async: bool = False,
+                                meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         處理文章，使用ChatGPT翻譯，保持與原API相同的格式
         先過濾10天外的文章，再翻譯（避免浪費API調用）
+        近似重複的轉載只翻譯和評分一次，其他文章沿用結果
+        translate_async 時不等待翻譯，放入後台隊列
+        meta: 填入本頁的下一個游標（按過濾前的文章計算，整頁被過濾時游標仍然前進）
         """
-        processed_articles = []
-        loop = asyncio.get_running_loop()
+        if meta is not None:
+            positions = [self._article_position(a) for a in articles]
+            positions = [p for p in positions if p[0] > 0]
+            if positions:
+                meta["cursor"] = "%d:%s" % max(positions)
         
         # ====== 第一步：先過濾10天外的文章 ======
         valid_articles = []
@@ -241,29 +480,45 @@ class SuperFastNewsService:
                 item = self._convert_to_legacy_format(article, symbol)
                 timestamp = item.get("timestamp", 0)
                 if not self._is_within_days(timestamp, 10):
-                    print(f"⏰ Skipping article older than 10 days: {item.get('title', 'N/A')[:50]}...")
+                    logger.debug("⏰ Skipping article older than 10 days: %.50s...", item.get('title', 'N/A'))
                     continue
                 valid_articles.append((article, item))
             except Exception as e:
-                print(f"⚠️ Error converting article: {e}")
+                logger.warning(f"⚠️ Error converting article: {e}")
                 continue
         
         if not valid_articles:
-            print(f"📭 No articles within 10 days for {symbol}")
+            logger.info(f"📭 No articles within 10 days for {symbol}")
             return []
         
-        print(f"📰 {len(valid_articles)} articles within 10 days (filtered from {len(articles)})")
+        logger.debug("📰 %d articles within 10 days (filtered from %d)", len(valid_articles), len(articles))
         
-        # ====== 第二步：翻譯有效文章 ======
+        # ====== 第二步：近似重複分組，每組只翻譯和評分一次 ======
+        groups = group_near_duplicates([f"{item['title']} {item['summary']}" for _, item in valid_articles])
+        if len(groups) < len(valid_articles):
+            logger.debug("🧬 %d articles collapsed into %d near-duplicate groups", len(valid_articles), len(groups))
+        
+        # ====== 第三步：翻譯有效文章 ======
         articles_needing_update = []  # 記錄需要更新到DB的文章
+        results: Dict[int, Dict[str, Any]] = {}  # 按原始順序輸出
+        cancelled = False
         
-        for original_article, item in valid_articles:
+        for group in groups:
+            # 調用方已離開：不再發起新的翻譯，已完成的翻譯仍然寫回
+            if is_cancelled():
+                cancelled = True
+                break
+            
+            # 代表文章：優先選已有翻譯的一篇
+            rep_index = next(
+                (i for i in group if valid_articles[i][1].get("title_cn") and valid_articles[i][1].get("summary_cn")),
+                group[0]
+            )
+            original_article, item = valid_articles[rep_index]
+            
             try:
-                # 使用本地分析器進行關鍵字分析
-                analyzed_result = self.news_analyzer.analyze(
-                    item.get("title", ""), 
-                    item.get("summary", "")
-                )
+                # 入庫時已計算的評分和關鍵字（舊數據在此補算）
+                analyzed_result = self.news_analyzer.analyze_article(original_article)
                 
                 title = item.get("title", "")
                 summary = item.get("summary", "")
@@ -274,30 +529,62 @@ class SuperFastNewsService:
                 need_translate = not (existing_title_cn and existing_title_cn.strip() and existing_title_cn != title
                                      and existing_summary_cn and existing_summary_cn.strip() and existing_summary_cn != summary)
                 
-                if need_translate:
-                    # 需要翻譯，調用ChatGPT
-                    title_cn, summary_cn = await loop.run_in_executor(
-                        None, 
-                        self.translator.translate_news, 
-                        title, 
-                        summary,
-                        existing_title_cn,
-                        existing_summary_cn
+                translation_pending = False
+                translated = False  # 是否得到了真正的翻譯（可以寫回給組內其他文章）
+                
+                if need_translate and not self.translator.enabled:
+                    # 翻譯未啟用：響應沿用原文，但不寫回（避免把英文當作翻譯保存）
+                    title_cn = existing_title_cn or title
+                    summary_cn = existing_summary_cn or summary
+                elif need_translate and translate_async:
+                    # 不等待翻譯：先返回英文原文，翻譯任務由 Worker 池完成後寫回緩存供下次請求使用
+                    article_hash = ensure_article_id(original_article)
+                    translation_pending = (
+                        self.translation_queue.enqueue(article_hash, original_article, title, summary, symbol)
+                        or self.translation_queue.is_pending(article_hash)
                     )
-                    # 記錄需要更新到DB的文章（帶翻譯結果）
-                    articles_needing_update.append({
-                        "original": original_article,
-                        "title_cn": title_cn,
-                        "summary_cn": summary_cn
-                    })
+                    if translation_pending:
+                        title_cn = None
+                        summary_cn = None
+                    else:
+                        # 已記錄為翻譯失敗，沿用原文
+                        title_cn = existing_title_cn or title
+                        summary_cn = existing_summary_cn or summary
+                elif need_translate:
+                    # 需要翻譯，調用ChatGPT（與 Worker 池共用 RPM/TPM 預算）
+                    try:
+                        title_cn, summary_cn = await asyncio.to_thread(
+                            self.translation_queue.translate_now,
+                            title,
+                            summary,
+                            existing_title_cn,
+                            existing_summary_cn,
+                            time_left(self.request_timeout)
+                        )
+                        # 記錄需要更新到DB的文章（帶翻譯結果）
+                        articles_needing_update.append({
+                            "original": original_article,
+                            "title_cn": title_cn,
+                            "summary_cn": summary_cn
+                        })
+                        translated = True
+                    except TranslationError as e:
+                        # 翻譯失敗：本次響應沿用原文，交給任務隊列重試，不把原文寫回
+                        logger.warning(f"⚠️ Translation failed, queued for retry: {e}")
+                        article_hash = ensure_article_id(original_article)
+                        self.translation_queue.enqueue(article_hash, original_article, title, summary, symbol)
+                        title_cn = existing_title_cn or title
+                        summary_cn = existing_summary_cn or summary
                 else:
                     # 已有翻譯，直接使用
                     title_cn = existing_title_cn
                     summary_cn = existing_summary_cn
-                    print(f"✅ Skip translation (already exists): {title[:40]}...")
+                    translated = True
+                    logger.debug("✅ Skip translation (already exists): %.40s...", title)
                 
                 # 構建響應格式
                 news_item = {
+                    "article_id": item["article_id"],
                     "title": title,
                     "title_cn": title_cn,
                     "summary": summary,
@@ -308,53 +595,98 @@ class SuperFastNewsService:
                     "link": item.get("link", ""),
                     "tickers": item.get("tickers", [symbol]),
                     "type": item.get("type", "news"),
-                    "score": analyzed_result.get("score", 0),
-                    "keywords": analyzed_result.get("important_keywords", [])
+                    "score": analyzed_result["score"],
+                    "keywords": analyzed_result["keywords"]
                 }
+                if translate_async:
+                    news_item["translation_pending"] = translation_pending
                 
-                processed_articles.append(news_item)
+                results[rep_index] = news_item
                 
+                # 組內其他轉載沿用代表文章的翻譯和評分
+                for i in group:
+                    if i == rep_index:
+                        continue
+                    member_original, member_item = valid_articles[i]
+                    results[i] = {
+                        **news_item,
+                        "article_id": member_item["article_id"],
+                        "title": member_item.get("title", ""),
+                        "summary": member_item.get("summary", ""),
+                        "timestamp": member_item.get("timestamp", 0),
+                        "original_time": member_item.get("original_time", ""),
+                        "source": member_item.get("source", ""),
+                        "link": member_item.get("link", ""),
+                        "tickers": member_item.get("tickers", [symbol])
+                    }
+                    if translated and not (member_item.get("title_cn") and member_item.get("summary_cn")):
+                        articles_needing_update.append({
+                            "original": member_original,
+                            "title_cn": title_cn,
+                            "summary_cn": summary_cn
+                        })
+                
+            except RequestCancelled:
+                # 發起翻譯前已沒有剩餘時間：停止翻譯，已完成的翻譯仍然寫回
+                cancelled = True
+                break
             except Exception as e:
-                print(f"⚠️ Error processing article: {e}")
+                logger.warning(f"⚠️ Error processing article: {e}")
                 continue
         
-        # ====== 第三步：把翻譯結果寫回MongoDB和SQLite緩存 ======
+        processed_articles = [results[i] for i in sorted(results)]
+        
+        # ====== 第四步：把翻譯結果寫回MongoDB和SQLite緩存 ======
         if articles_needing_update:
             for update_item in articles_needing_update:
-                original = update_item["original"]
-                title_cn = update_item["title_cn"]
-                summary_cn = update_item["summary_cn"]
-                
-                # 更新原始資料
-                original["title_cn"] = title_cn
-                original["summary_cn"] = summary_cn
-                
-                # 更新SQLite緩存
-                try:
-                    article_hash = self.sqlite_cache._generate_article_hash(original)
-                    self.sqlite_cache.update_article_translation(article_hash, title_cn, summary_cn)
-                except Exception as e:
-                    print(f"⚠️ Error updating SQLite cache: {e}")
-                
-                # 更新MongoDB
-                if self.mongodb:
-                    try:
-                        article_hash = self.mongodb._generate_article_hash(original)
-                        self.mongodb.collection.update_one(
-                            {"article_hash": article_hash},
-                            {"$set": {
-                                "raw_data.title_cn": title_cn,
-                                "raw_data.summary_cn": summary_cn,
-                                "updated_at": datetime.utcnow()
-                            }}
-                        )
-                    except Exception as e:
-                        print(f"⚠️ Error updating MongoDB: {e}")
+                self._save_translation(update_item["original"], update_item["title_cn"], update_item["summary_cn"])
             
-            print(f"💾 Updated {len(articles_needing_update)} translations to cache/DB")
+            logger.info(f"💾 Updated {len(articles_needing_update)} translations to cache/DB")
+        
+        if cancelled:
+            check_cancelled()
         
         return processed_articles
     
+    def _save_translation(self, original: Dict[str, Any], title_cn: str, summary_cn: str):
+        """把翻譯結果寫回原始資料、SQLite緩存和MongoDB"""
+        # 更新原始資料
+        original["title_cn"] = title_cn
+        original["summary_cn"] = summary_cn
+        
+        article_hash = ensure_article_id(original)
+        
+        # 更新SQLite緩存，文章關聯股票的已緩存響應失效（下次請求帶上翻譯）
+        try:
+            symbols = self.sqlite_cache.update_article_translation(article_hash, title_cn, summary_cn)
+            if self.response_cache is not None:
+                self.response_cache.invalidate(symbols)
+        except Exception as e:
+            logger.warning(f"⚠️ Error updating SQLite cache: {e}")
+        
+        # 更新MongoDB
+        if self.mongodb:
+            try:
+                self.mongodb.collection.update_one(
+                    {"article_hash": article_hash},
+                    {"$set": {
+                        "raw_data.title_cn": title_cn,
+                        "raw_data.summary_cn": summary_cn,
+                        "updated_at": datetime.utcnow()
+                    }}
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Error updating MongoDB: {e}")
+    
+    def _invalidate_responses(self, symbol: Optional[str], articles: List[Dict[str, Any]]):
+        """文章寫入緩存後，清除它們關聯的所有股票已緩存的響應"""
+        if self.response_cache is None:
+            return
+        symbols = {symbol.upper()} if symbol else set()
+        for article in articles:
+            symbols.update(get_tickers(article))
+        self.response_cache.invalidate(symbols)
+    
     def _convert_to_legacy_format(self, article: Dict[str, Any], symbol: str) -> Dict[str, Any]:
         """
         将新API格式转换为旧格式，以兼容现有的news_handler
@@ -362,7 +694,7 @@ class SuperFastNewsService:
         """
         
         # 提取时间戳
-        published = article.get("publishedAt", "") or article.get("published", "")
+        published = get_published(article)
         timestamp = self._parse_timestamp(published)
         
         # 提取来源信息
@@ -370,13 +702,14 @@ class SuperFastNewsService:
         source_name = source_info.get("name", "Unknown") if isinstance(source_info, dict) else str(source_info)
         
         result = {
+            "article_id": ensure_article_id(article),
             "title": article.get("title", ""),
             "summary": article.get("description", "") or article.get("content", ""),
             "timestamp": timestamp,
             "original_time": published,
             "source": source_name,
             "link": article.get("url", ""),
-            "tickers": [symbol],  # 使用查询的symbol
+            "tickers": get_tickers(article, symbol),  # 文章關聯的所有股票，查詢的股票排在最前
             "type": "news"
         }
         
@@ -388,6 +721,10 @@ class SuperFastNewsService:
         
         return result
     
+    def _has_recent(self, articles: List[Dict[str, Any]], days: int = 10) -> bool:
+        """是否有 days 天內的文章（沒有時處理後必然為空）"""
+        return any(self._is_within_days(self._parse_timestamp(get_published(a)), days) for a in articles)
+    
     def _is_within_days(self, timestamp: int, days: int = 10) -> bool:
         """检查时间戳是否在指定天数内"""
         if timestamp <= 0:
@@ -400,59 +737,165 @@ class SuperFastNewsService:
             
             return days_diff <= days
         except Exception as e:
-            print(f"⚠️ Error checking date: {e}")
+            logger.warning(f"⚠️ Error checking date: {e}")
             return False
     
     def _parse_timestamp(self, date_str: str) -> int:
         """解析时间字符串为时间戳，無法解析時返回0（會被10天過濾器過濾掉）"""
-        if not date_str:
-            return 0  # 沒有日期 → 過濾掉
+        timestamp = parse_timestamp(date_str)
+        if date_str and not timestamp:
+            logger.debug("⚠️ Cannot parse date: %s", date_str)
+        return timestamp
+    
+    def _article_position(self, article: Dict[str, Any]) -> Tuple[int, str]:
+        """文章在游標順序中的位置 (發布時間戳, 文章ID)"""
+        return self._parse_timestamp(get_published(article)), ensure_article_id(article)
+    
+    def _resolve_cursor(self, since: Optional[str]) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        把 since 游標解析為 (時間戳, 文章ID)
+        支持接口返回的 "時間戳:文章ID"、Unix 時間戳（秒或毫秒）、ISO 日期字符串、或文章ID（article_id）；
+        只有時間戳時文章ID為 None（只返回發布時間更晚的文章）
+        無法識別的游標返回 None，即返回完整列表
+        """
+        if not since:
+            return None
         
-        try:
-            # 清理常見時區格式: +0000 → +00:00
-            clean_str = date_str.strip()
-            import re as _re
-            # 處理 +0000 或 -0500 等格式
-            tz_match = _re.search(r'([+-])(\d{2})(\d{2})$', clean_str)
-            if tz_match and ':' not in clean_str[-6:]:
-                clean_str = clean_str[:tz_match.start()] + f"{tz_match.group(1)}{tz_match.group(2)}:{tz_match.group(3)}"
-            
-            # 尝试多种日期格式
-            formats = [
-                "%Y-%m-%dT%H:%M:%S.%fZ",
-                "%Y-%m-%dT%H:%M:%SZ", 
-                "%Y-%m-%d %H:%M:%S",
-                "%Y-%m-%d",
-                "%a, %d %b %Y %H:%M:%S %Z",
-                "%a, %d %b %Y %H:%M:%S %z",
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(clean_str, fmt)
-                    return int(dt.timestamp())
-                except ValueError:
-                    continue
-            
-            # 嘗試 ISO 格式（帶時區）
-            try:
-                dt = datetime.fromisoformat(clean_str.replace('Z', '+00:00'))
-                return int(dt.timestamp())
-            except (ValueError, AttributeError):
-                pass
-            
-            print(f"⚠️ Cannot parse date: {date_str}")
-            return 0  # 無法解析 → 過濾掉
-            
-        except Exception:
-            return 0  # 異常 → 過濾掉
+        since = since.strip()
+        match = _POSITION_CURSOR.match(since)
+        if match:
+            return int(match.group(1)), match.group(2)
+        
+        timestamp = parse_time_value(since)
+        if timestamp is not None:
+            return timestamp, None
+        
+        # 當作文章ID，查找它的發布時間
+        timestamp = self.sqlite_cache.get_article_timestamp(since)
+        if timestamp is None and self.mongodb:
+            timestamp = self.mongodb.get_article_timestamp(since)
+        
+        if timestamp is None:
+            logger.info(f"⚠️ Unknown since cursor: {since}")
+            return None
+        return timestamp, since
+    
+    def _resolve_since(self, since: Optional[str]) -> Optional[int]:
+        """把 since 游標解析為時間戳，無法識別的游標返回 None"""
+        position = self._resolve_cursor(since)
+        return position[0] if position else None
+    
+    def search_news(self, query: str, symbols: Optional[List[str]] = None, since: Optional[str] = None,
+                    limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        本地全文搜索（SQLite FTS5），不調用上游、不佔用上游額度，也不翻譯：
+        只返回已有的中文翻譯，缺少時 title_cn/summary_cn 為 None
+        """
+        since_ts = self._resolve_since(since)
+        results = self.sqlite_cache.search_news(query, symbols, since_ts, limit)
+        
+        return [
+            {
+                **self._local_item(result["article"], symbols[0] if symbols else None),
+                "rank": round(result["rank"], 4),
+                "snippet": result["snippet"]
+            }
+            for result in results
+        ]
+    
+    def get_top_news(self, window_seconds: int, min_score: Optional[float] = None, limit: int = 20,
+                     cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        跨所有股票的高分新聞（讀入庫時計算的評分索引，不調用上游、不翻譯）
+        窗口在 SQLite 緩存保留期內時查本地緩存，更長的窗口查 MongoDB
+        
+        cursor: 上一頁返回的游標 "score:timestamp:article_id"，格式錯誤時拋出 ValueError
+        
+        Returns:
+            (文章列表, 下一頁游標；沒有更多時為 None)
+        """
+        position = None
+        if cursor:
+            score, published_ts, article_id = cursor.split(":", 2)
+            position = (float(score), int(published_ts), article_id)
+        
+        since_ts = int(time.time()) - window_seconds
+        if window_seconds > self.sqlite_cache.stale_retention_hours * 3600 and self.mongodb:
+            results = self.mongodb.get_top_articles(since_ts, min_score, limit, position)
+        else:
+            results = self.sqlite_cache.get_top_news(since_ts, min_score, limit, position)
+        
+        items = [self._local_item(result["article"]) for result in results]
+        
+        next_cursor = None
+        if len(results) == limit:
+            last = results[-1]
+            next_cursor = f"{last['score']:g}:{last['published_ts']}:{last['article_id']}"
+        
+        return items, next_cursor
+    
+    def symbol_history(self, symbol: str, from_ts: Optional[int] = None, to_ts: Optional[int] = None,
+                       cursor: Optional[str] = None, limit: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        某股票在時間範圍 [from_ts, to_ts) 內的歷史文章（MongoDB，從新到舊，不翻譯）
+        返回逐條產生的迭代器，內存佔用與範圍大小無關；返回滿 limit 條時最後產生 {"next_cursor": ...}
+        
+        cursor: 上一頁的游標 "timestamp:article_id"，格式錯誤時拋出 ValueError
+        """
+        after = None
+        if cursor:
+            published_ts, article_id = cursor.split(":", 1)
+            after = (int(published_ts), article_id)
+        
+        return self._iter_history(symbol.upper(), from_ts, to_ts, after, limit)
+    
+    def _iter_history(self, symbol: str, from_ts: Optional[int], to_ts: Optional[int],
+                      after: Optional[Tuple[int, str]], limit: int) -> Iterator[Dict[str, Any]]:
+        count = 0
+        last = None
+        for row in self.mongodb.iter_articles([symbol], from_ts, to_ts, after, limit):
+            count += 1
+            last = row
+            yield self._local_item(row["article"], symbol)
+        
+        if last is not None and count == limit:
+            yield {"next_cursor": f"{last['published_ts']}:{last['article_id']}"}
+    
+    def _local_item(self, article: Dict[str, Any], symbol: Optional[str] = None) -> Dict[str, Any]:
+        """本地存儲中的文章轉為響應格式（沿用已有翻譯和評分，不翻譯）"""
+        item = self._convert_to_legacy_format(article, symbol)
+        analyzed_result = self.news_analyzer.analyze_article(article)
+        return {
+            **item,
+            "title_cn": item.get("title_cn"),
+            "summary_cn": item.get("summary_cn"),
+            "score": analyzed_result["score"],
+            "keywords": analyzed_result["keywords"]
+        }
+    
+    def _ingest_articles(self, articles: List[Dict[str, Any]]):
+        """入庫前為每篇文章計算一次ID和評分，之後各存儲和請求直接沿用"""
+        for article in articles:
+            ensure_article_id(article)
+            self.news_analyzer.analyze_article(article)
+    
+    async def _start_background_services(self):
+        """成為主進程時啟動後台服務"""
+        self.translation_queue.start()
+        self.cache_maintenance.start()
+        self.firehose.start()
+    
+    async def _stop_background_services(self):
+        """失去主進程身份或關閉時停止後台服務"""
+        await self.translation_queue.stop()
+        await asyncio.to_thread(self.cache_maintenance.stop)
+        await asyncio.to_thread(self.firehose.stop)
     
     def cleanup_cache(self):
-        """清理緩存和舊數據"""
-        print("🧹 Cleaning up cache...")
-        self.sqlite_cache.cleanup_old_cache()
-        if self.mongodb:
-            self.mongodb.cleanup_old_articles(days=30)
+        """清理過期緩存分桶（MongoDB 由 TTL 索引自動過期）"""
+        logger.info("🧹 Cleaning up cache...")
+
+        self.cache_maintenance.run_once()
         
     def get_service_stats(self) -> Dict[str, Any]:
         """獲取服務統計信息"""
@@ -465,6 +908,12 @@ class SuperFastNewsService:
         else:
             db_stats = {"status": "disconnected", "total_articles": 0, "symbol_stats": []}
         
+        cache_stats["translation_queue"] = self.translation_queue.get_stats()
+        cache_stats["maintenance"] = self.cache_maintenance.get_stats()
+        cache_stats["watchlist"] = self.firehose.get_stats()
+        cache_stats["query_strategy"] = self.query_strategy.get_stats()
+        cache_stats["leader"] = self.leader.get_stats()
+        
         return {
             "auth": auth_status,
             "cache": cache_stats,
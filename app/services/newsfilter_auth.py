@@ -4,22 +4,27 @@ NewsFilter JWT认证管理器
 """
 
 import requests
-import json
 import time
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
 import os
+import logging
 from dotenv import load_dotenv
 from app.database.sqlite_cache import SQLiteCacheManager
+from app.database.shared_state import SharedStateManager
+from app.services.circuit_breaker import CircuitBreaker, AUTH
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class NewsFilterAuth:
     """NewsFilter JWT认证管理器"""
     
-    def __init__(self):
+    def __init__(self, circuit_breaker: Optional[CircuitBreaker] = None):
         self.auth_url = os.getenv("NEWSFILTER_AUTH_URL", "https://login.newsfilter.io/co/authenticate")
         self.token_url = os.getenv("NEWSFILTER_TOKEN_URL", "https://api.newsfilter.io/public/actions")
         
@@ -31,92 +36,193 @@ class NewsFilterAuth:
             raise ValueError("Missing NewsFilter credentials in environment variables")
         
         self.cache_manager = SQLiteCacheManager()
+        self.shared_state = SharedStateManager()
         
-        # 系统状态
-        self.is_login_failed = False
-        self.last_failure_time = None
-        self.failure_sleep_duration = 30 * 60  # 30分钟
+        # 登录失败由熔断器管理（指數退避 + 半開探測，取代固定30分鐘冷卻）
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(self.cache_manager)
         
-        print("🔐 NewsFilter Auth Manager initialized")
-    
-    def _check_login_failure_status(self) -> bool:
-        """检查是否处于登录失败睡眠期"""
-        failure_status = self.cache_manager.get_system_status("login_failure")
+        # 內存中的token，避免每次上游調用都查 SQLite
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
         
-        if failure_status:
-            failure_time = datetime.fromisoformat(failure_status)
-            if datetime.now() - failure_time < timedelta(seconds=self.failure_sleep_duration):
-                self.is_login_failed = True
-                self.last_failure_time = failure_time
-                return True
+        # 後台刷新：過期前 refresh_margin 秒就重新登錄，請求路徑不用等登錄
+        self.refresh_margin = int(os.getenv("JWT_REFRESH_MARGIN_SECONDS", "600"))
+        self._refresh_in_progress = False
+        self._refresh_stop = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
         
-        self.is_login_failed = False
-        return False
+        logger.info("🔐 NewsFilter Auth Manager initialized")
+    
+    @property
+    def is_login_failed(self) -> bool:
+        """是否处于登录失败熔斷期（只讀內存）"""
+        return self.circuit_breaker.is_open(AUTH)
+    
+    @property
+    def last_failure_time(self) -> Optional[datetime]:
+        """最近一次登录失败时间"""
+        failed_at = self.circuit_breaker.last_failure_time(AUTH)
+        return datetime.fromtimestamp(failed_at) if failed_at else None
+    
+    def _check_login_failure_status(self) -> bool:
+        """检查是否处于登录失败熔斷期"""
+        return self.is_login_failed
     
     def _set_login_failure(self):
-        """设置登录失败状态"""
-        self.is_login_failed = True
-        self.last_failure_time = datetime.now()
-        self.cache_manager.set_system_status("login_failure", self.last_failure_time.isoformat())
-        print("❌ Login failed, entering 30-minute sleep mode")
+        """记录登录失败（熔斷並指數退避）"""
+        self.circuit_breaker.record_failure(AUTH)
+        logger.error(f"❌ Login failed, auth circuit open for {self.get_remaining_sleep_time()}s")
     
     def _clear_login_failure(self):
         """清除登录失败状态"""
-        self.is_login_failed = False
-        self.last_failure_time = None  
-        self.cache_manager.set_system_status("login_failure", "")
-        print("✅ Login failure status cleared")
+        self.circuit_breaker.reset(AUTH)
+        logger.info("✅ Login failure status cleared")
     
     def get_remaining_sleep_time(self) -> int:
-        """获取剩余睡眠时间（秒）"""
-        if not self.is_login_failed or not self.last_failure_time:
-            return 0
-        
-        elapsed = datetime.now() - self.last_failure_time
-        remaining = self.failure_sleep_duration - elapsed.total_seconds()
-        
-        return max(0, int(remaining))
+        """获取剩余熔斷时间（秒）"""
+        return int(self.circuit_breaker.retry_after(AUTH))
     
-    def is_token_valid(self) -> bool:
-        """检查当前token是否有效"""
-        # 不再检查登录失败状态，只要token有效就使用
-        # if self._check_login_failure_status():
-        #     return False
-        
+    def _remember_token(self, access_token: str, expires_at: float):
+        """更新內存中的token"""
+        with self._token_lock:
+            self._token = access_token
+            self._token_expires_at = expires_at
+    
+    def _load_token_from_store(self) -> bool:
+        """从SQLite重新加载token（其他进程可能已刷新），返回是否有效"""
         token_info = self.cache_manager.get_jwt_token()
         if not token_info:
             return False
         
         try:
-            expires_at = datetime.fromisoformat(token_info["expires_at"])
-            # 提前1分钟过期，避免频繁重新登录
-            return datetime.now() < expires_at - timedelta(minutes=1)
-        except:
+            expires_at = datetime.fromisoformat(token_info["expires_at"]).timestamp()
+        except (TypeError, ValueError):
             return False
+        
+        self._remember_token(token_info["access_token"], expires_at)
+        return self._token_remaining() > 60
+    
+    def _token_remaining(self) -> float:
+        """內存token剩餘有效秒數"""
+        if not self._token:
+            return 0
+        return self._token_expires_at - time.time()
+    
+    def is_token_valid(self) -> bool:
+        """检查当前token是否有效（先查內存，失效時才讀 SQLite）"""
+        # 提前1分钟过期，避免频繁重新登录
+        if self._token_remaining() > 60:
+            return True
+        return self._load_token_from_store()
     
     def get_valid_token(self) -> Optional[str]:
         """获取有效的access token"""
         # 首先检查现有token是否有效
         if self.is_token_valid():
-            token_info = self.cache_manager.get_jwt_token()
-            return token_info["access_token"] if token_info else None
+            # 快過期了：交給後台刷新，當前請求繼續用舊token
+            if self._token_remaining() < self.refresh_margin:
+                self._trigger_background_refresh()
+            return self._token
             
         # Token 無效或過期，先確認是否在冷卻期
         if self._check_login_failure_status():
             # 在冷卻期內：嘗試用舊 token 作最後手段，否則返回 None
             token_info = self.cache_manager.get_jwt_token()
             if token_info:
-                print("⚠️ In failure cooldown, attempting with cached (possibly expired) token as last resort")
+                logger.warning("⚠️ In failure cooldown, attempting with cached (possibly expired) token as last resort")
                 return token_info["access_token"]
             return None
         
         # 不在冷卻期，嘗試重新登錄
-        print("🔄 Token expired or missing, attempting re-login...")
+        logger.info("🔄 Token expired or missing, attempting re-login...")
         return self._login_and_get_token()
     
-    def _login_and_get_token(self) -> Optional[str]:
-        """执行登录并获取token"""
-        print("🔑 Attempting NewsFilter login...")
+    def _login_and_get_token(self, rejected_token: Optional[str] = None, force: bool = False,
+                             min_valid_for: float = 60) -> Optional[str]:
+        """
+        执行登录并获取token（跨進程單飛，同一時間只有一個進程登錄）
+        
+        等鎖期間其他進程可能已經登錄成功，拿到鎖後先檢查 SQLite 中的 token，
+        只要它還能用 min_valid_for 秒且不是剛被上游拒絕的那個（rejected_token），就直接使用
+        """
+        with self.shared_state.lock("auth_login", ttl=120, timeout=90) as acquired:
+            if not acquired:
+                logger.warning("⏳ Timed out waiting for another process to finish logging in")
+                return None
+            
+            if not force and self._load_token_from_store():
+                if self._token != rejected_token and self._token_remaining() > min_valid_for:
+                    logger.info("🔑 Using token refreshed by another worker")
+                    return self._token
+            
+            # 熔斷期內不登錄；熔斷期結束後這次登錄就是半開探測
+            if not force and not self.circuit_breaker.allow_request(AUTH):
+                logger.warning(f"⛔ Auth circuit open, skipping login ({self.get_remaining_sleep_time()}s left)")
+                return None
+            
+            return self._perform_login()
+    
+    def _claim_refresh(self) -> bool:
+        """標記刷新開始，已有刷新在進行時返回 False"""
+        with self._token_lock:
+            if self._refresh_in_progress:
+                return False
+            self._refresh_in_progress = True
+            return True
+    
+    def _trigger_background_refresh(self):
+        """在後台線程刷新token（同一時間最多一個）"""
+        if not self._claim_refresh():
+            return
+        
+        threading.Thread(target=self._refresh_token_once, name="jwt-refresh", daemon=True).start()
+    
+    def _refresh_token_once(self):
+        """刷新一次token，只在內存token即將過期時才真正登錄"""
+        try:
+            if self._check_login_failure_status():
+                return
+            if self._token_remaining() >= self.refresh_margin:
+                return
+            
+            logger.info("🔄 Proactively refreshing JWT token before expiry...")
+            self._login_and_get_token(min_valid_for=self.refresh_margin)
+        except Exception as e:
+            logger.error(f"❌ Background token refresh error: {e}")
+        finally:
+            with self._token_lock:
+                self._refresh_in_progress = False
+    
+    def start_background_refresh(self):
+        """啟動定時檢查token的後台線程"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        
+        self._refresh_stop.clear()
+        
+        def _loop():
+            # 啟動時先確保有token，之後定期檢查
+            interval = max(10, min(60, self.refresh_margin // 2))
+            while not self._refresh_stop.is_set():
+                if self._token_remaining() < self.refresh_margin and self._claim_refresh():
+                    self._refresh_token_once()
+                self._refresh_stop.wait(interval)
+        
+        self._refresh_thread = threading.Thread(target=_loop, name="jwt-refresh-loop", daemon=True)
+        self._refresh_thread.start()
+        logger.info("🔄 JWT background refresh started")
+    
+    def stop_background_refresh(self):
+        """停止後台刷新線程"""
+        self._refresh_stop.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+    
+    def _perform_login(self) -> Optional[str]:
+        """执行登录流程"""
+        logger.info("🔑 Attempting NewsFilter login...")
         
         try:
             # 使用 Session 讓 step1 的 cookies (auth0, did 等) 自動帶入 step2
@@ -136,14 +242,14 @@ class NewsFilterAuth:
             # 第二步：获取token (如果需要额外步骤)
             token = self._get_token_from_auth(auth_result, session)
             if token:
-                self._clear_login_failure()
+                self.circuit_breaker.record_success(AUTH)
                 return token
             else:
                 self._set_login_failure()
                 return None
                 
         except Exception as e:
-            print(f"❌ Login error: {e}")
+            logger.error(f"❌ Login error: {e}")
             self._set_login_failure()
             return None
     
@@ -168,13 +274,13 @@ class NewsFilterAuth:
         
         if response.status_code == 200:
             data = response.json()
-            print("✅ User authentication successful")
+            logger.info("✅ User authentication successful")
             return {
                 "success": True,
                 "data": data
             }
         else:
-            print(f"❌ Authentication failed: {response.status_code} - {response.text}")
+            logger.error(f"❌ Authentication failed: {response.status_code} - {response.text}")
             return {
                 "success": False,
                 "error": response.text
@@ -191,14 +297,15 @@ class NewsFilterAuth:
             expires_in = auth_data.get("expires_in", 86400)
             
             self.cache_manager.save_jwt_token(access_token, refresh_token, expires_in)
-            print("🔑 JWT token obtained and saved")
+            self._remember_token(access_token, time.time() + expires_in)
+            logger.info("🔑 JWT token obtained and saved")
             return access_token
         
         # 如果需要通过public API获取token
         elif "login_ticket" in auth_data:
             return self._exchange_ticket_for_token(auth_data, session)
         
-        print("❌ No token or ticket found in auth response")
+        logger.error("❌ No token or ticket found in auth response")
         return None
     
     def _exchange_ticket_for_token(self, auth_data: Dict[str, Any], session: requests.Session) -> Optional[str]:
@@ -235,10 +342,10 @@ class NewsFilterAuth:
             auth_code = qs.get("code", [None])[0]
             
             if not auth_code:
-                print(f"❌ /authorize did not return code. Status: {r_auth.status_code}, Location: {location[:200]}")
+                logger.error(f"❌ /authorize did not return code. Status: {r_auth.status_code}, Location: {location[:200]}")
                 return None
             
-            print(f"✅ Got authorization code ({len(auth_code)} chars)")
+            logger.info(f"✅ Got authorization code ({len(auth_code)} chars)")
             
             # ── Step 3: getTokens with authorization code ──
             r_tok = session.post(
@@ -258,43 +365,42 @@ class NewsFilterAuth:
             )
             
             if r_tok.status_code != 200:
-                print(f"❌ getTokens failed: HTTP {r_tok.status_code} - {r_tok.text[:200]}")
+                logger.error(f"❌ getTokens failed: HTTP {r_tok.status_code} - {r_tok.text[:200]}")
                 return None
             
             token_data = r_tok.json()
             
             if not isinstance(token_data, dict) or "accessToken" not in token_data:
-                print(f"❌ getTokens returned unexpected data: {str(token_data)[:200]}")
+                logger.error(f"❌ getTokens returned unexpected data: {str(token_data)[:200]}")
                 return None
             
             access_token = token_data["accessToken"]
             expires_in = token_data.get("expiresIn", 86400)
             
             self.cache_manager.save_jwt_token(access_token, None, expires_in)
-            print(f"🔑 JWT token obtained and saved (expires in {expires_in}s)")
+            self._remember_token(access_token, time.time() + expires_in)
+            logger.info(f"🔑 JWT token obtained and saved (expires in {expires_in}s)")
             return access_token
             
         except Exception as e:
-            print(f"❌ Token exchange error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ Token exchange error: {e}")
             return None
     
     def force_refresh_token(self) -> bool:
         """强制刷新token"""
-        print("🔄 Forcing token refresh...")
+        logger.info("🔄 Forcing token refresh...")
         
         # 清除现有token
         self.cache_manager.set_system_status("force_refresh", "true")
         
         # 尝试获取新token
-        new_token = self._login_and_get_token()
+        new_token = self._login_and_get_token(force=True)
         
         if new_token:
-            print("✅ Token refresh successful")
+            logger.info("✅ Token refresh successful")
             return True
         else:
-            print("❌ Token refresh failed")
+            logger.error("❌ Token refresh failed")
             return False
     
     def get_auth_headers(self) -> Optional[Dict[str, str]]:
@@ -320,5 +426,7 @@ class NewsFilterAuth:
             "is_login_failed": self.is_login_failed,
             "remaining_sleep_time": self.get_remaining_sleep_time(),
             "has_valid_token": self.is_token_valid(),
-            "last_failure_time": self.last_failure_time.isoformat() if self.last_failure_time else None
+            "token_expires_in": max(0, int(self._token_remaining())),
+            "last_failure_time": self.last_failure_time.isoformat() if self.last_failure_time else None,
+            "circuits": self.circuit_breaker.get_status()
         }
\ No newline at end of file
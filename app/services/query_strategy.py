@@ -0,0 +1,104 @@
+"""
+按股票自適應的上游查詢方式
+記錄每隻股票每種查詢方式的結果（返回數、帶該股票標籤的有效文章數），保存在 SQLite，多進程共享；
+之後直接使用對該股票最有效的查詢方式，省去寬查詢為空或全是噪音時的第二次調用
+"""
+
+import os
+import logging
+from typing import Any, Dict, List
+
+from app.database.sqlite_cache import SQLiteCacheManager
+from app.utils.tickers import get_tickers
+
+logger = logging.getLogger(__name__)
+
+BROAD = "broad"
+TAGGED = "tagged"
+PLAIN = "plain"
+
+# 查詢方式 -> 查詢字符串模板
+QUERY_SHAPES = {
+    # 標題、描述或股票標籤（默認）；短代碼（如 ON、IT）容易匹配到無關文章
+    BROAD: 'title:"{symbol}" OR description:"{symbol}" OR symbols:"{symbol}"',
+    # 只按股票標籤，沒有噪音
+    TAGGED: 'symbols:"{symbol}"',
+    # 只查代碼本身（原來的降級查詢）
+    PLAIN: '{symbol}',
+}
+
+# 沒有足夠統計時的查詢順序（原來的行為）
+DEFAULT_PLAN = [BROAD, PLAIN]
+
+
+def build_query(shape: str, symbol: str) -> str:
+    """查詢方式對應的查詢字符串"""
+    return QUERY_SHAPES[shape].format(symbol=symbol)
+
+
+class QueryStrategy:
+    """按股票選擇查詢方式"""
+
+    def __init__(self, sqlite_cache: SQLiteCacheManager):
+        self.sqlite_cache = sqlite_cache
+        # 每種方式至少試過幾次才參與選擇
+        self.min_attempts = int(os.getenv("QUERY_STRATEGY_MIN_ATTEMPTS", "3"))
+        # 每隔多少次抓取按默認順序重新試探一次，跟上股票新聞情況的變化
+        self.explore_every = int(os.getenv("QUERY_STRATEGY_EXPLORE_EVERY", "20"))
+        # 有效文章比例低於此值的寬查詢視為噪音，改試只按標籤查詢
+        self.noise_threshold = 0.5
+        # 最佳方式的命中率高於此值時不再準備第二種方式
+        self.confident_hit_rate = 0.8
+
+        self.stats = {"planned": 0, "adaptive": 0, "single_call": 0}
+
+    def plan(self, symbol: str) -> List[str]:
+        """
+        本次抓取依次嘗試的查詢方式（前一種沒有結果時才嘗試下一種）
+        """
+        self.stats["planned"] += 1
+        stats = self.sqlite_cache.get_query_stats(symbol)
+        total = sum(s["attempts"] for s in stats.values())
+
+        if not stats or (self.explore_every and total % self.explore_every == 0):
+            return list(DEFAULT_PLAN)
+
+        established = {shape: s for shape, s in stats.items() if s["attempts"] >= self.min_attempts}
+        broad = established.get(BROAD)
+
+        # 寬查詢有結果但多數文章不帶該股票標籤：試只按標籤查詢
+        if broad and broad["returned"] and broad["useful"] / broad["returned"] < self.noise_threshold \
+                and stats.get(TAGGED, {}).get("attempts", 0) < self.min_attempts:
+            self.stats["adaptive"] += 1
+            return [TAGGED, BROAD]
+
+        if not established:
+            return list(DEFAULT_PLAN)
+
+        # 按平均每次調用得到的有效文章數排序
+        ranked = sorted(established, key=lambda shape: established[shape]["useful"] / established[shape]["attempts"],
+                        reverse=True)
+        best = established[ranked[0]]
+        self.stats["adaptive"] += 1
+
+        if best["nonempty"] / best["attempts"] >= self.confident_hit_rate or best["useful"] == 0:
+            # 最佳方式幾乎總有結果，或所有方式都沒有有效結果（由負緩存處理）：只調用一次
+            self.stats["single_call"] += 1
+            return [ranked[0]]
+
+        fallback = next((shape for shape in ranked[1:] if established[shape]["useful"] > 0), None)
+        if fallback is None:
+            fallback = next((shape for shape in DEFAULT_PLAN if shape not in established), None)
+        return [ranked[0], fallback] if fallback else [ranked[0]]
+
+    def record(self, symbol: str, shape: str, articles: List[Dict[str, Any]]):
+        """記錄一次查詢結果；有效文章為帶有該股票標籤的文章"""
+        useful = sum(1 for article in articles if symbol in get_tickers(article))
+        try:
+            self.sqlite_cache.record_query_result(symbol, shape, len(articles), useful)
+        except Exception as e:
+            logger.warning(f"⚠️ Error recording query stats for {symbol}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """選擇統計"""
+        return dict(self.stats)
@@ -0,0 +1,207 @@
+"""
+後台翻譯隊列
+翻譯任務持久化在 SQLite（TranslationJobStore），由專用的 Worker 池處理：
+- 所有進程共用 OpenAI 的每分鐘請求數（RPM）和 token 數（TPM）預算
+- 按文章hash去重，失敗按指數退避重試，超過次數移入失敗記錄
+- 翻譯失敗時不會把英文原文當作翻譯寫回
+"""
+
+import asyncio
+import os
+import random
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.database.translation_jobs import TranslationJobStore
+from app.database.shared_state import SharedStateManager
+from app.utils.chatgpt_translator import ChatGPTTranslator, TranslationError
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTranslationQueue:
+    """持久化翻譯任務隊列 + 帶預算的 Worker 池"""
+
+    def __init__(self, translator: ChatGPTTranslator,
+                 save_func: Callable[[Dict[str, Any], str, str], None],
+                 job_store: Optional[TranslationJobStore] = None,
+                 shared_state: Optional[SharedStateManager] = None,
+                 worker_count: int = 2, poll_interval: float = 2.0):
+        """
+        Args:
+            translator: 翻譯器（使用 translate_news_strict，失敗時拋出異常）
+            save_func: 同步寫回函數 (原始文章, title_cn, summary_cn)
+        """
+        self.translator = translator
+        self.save_func = save_func
+        self.job_store = job_store or TranslationJobStore()
+        self.shared_state = shared_state or SharedStateManager()
+        self.worker_count = worker_count
+        self.poll_interval = poll_interval
+
+        # OpenAI 預算（跨進程共享的令牌桶）
+        self.rpm = float(os.getenv("OPENAI_RPM", "500"))
+        self.tpm = float(os.getenv("OPENAI_TPM", "200000"))
+        self.max_attempts = int(os.getenv("TRANSLATION_MAX_ATTEMPTS", "5"))
+        self.retry_base = float(os.getenv("TRANSLATION_RETRY_BASE_SECONDS", "10"))
+
+        self.workers = []
+        self._wake: Optional[asyncio.Event] = None
+        self.completed = 0
+
+    def start(self):
+        """啟動後台 Worker（需要在事件循環中調用）；翻譯器未啟用時不啟動"""
+        if self.workers or not self.translator.enabled:
+            return
+        self._wake = asyncio.Event()
+        for i in range(self.worker_count):
+            self.workers.append(asyncio.create_task(self._worker_loop(i)))
+        logger.info(f"🈯 Translation worker pool started with {self.worker_count} workers "
+                    f"(budget {self.rpm:.0f} RPM / {self.tpm:.0f} TPM)")
+
+    async def stop(self):
+        """停止 Worker；進行中的任務租約過期後會被重新領取"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def is_pending(self, article_hash: str) -> bool:
+        """文章是否已有未完成的翻譯任務"""
+        return self.job_store.is_pending(article_hash)
+
+    def enqueue(self, article_hash: str, original: Dict[str, Any], title: str, summary: str,
+                symbol: str = "") -> bool:
+        """加入翻譯任務（按文章hash去重），已有任務時返回 False"""
+        try:
+            added = self.job_store.enqueue(article_hash, original, title, summary, symbol)
+        except Exception as e:
+            logger.warning(f"⚠️ Error enqueueing translation job: {e}")
+            return False
+
+        if added and self._wake is not None:
+            self._wake.set()
+        return added
+
+    # ---------- 預算 ----------
+
+    def _acquire_budget(self, tokens: int, timeout: Optional[float]) -> bool:
+        """取得一次請求和 tokens 個 token 的額度（在線程中調用），超時返回 False"""
+        # 桶容量為10秒的額度，允許小幅突發
+        rpm_rate, rpm_capacity = self.rpm / 60, max(1.0, self.rpm / 6)
+        if not self.shared_state.acquire_token("openai_rpm", rate=rpm_rate, capacity=rpm_capacity, timeout=timeout):
+            return False
+        if self.shared_state.acquire_token(
+            "openai_tpm", rate=self.tpm / 60, capacity=max(float(tokens), self.tpm / 6),
+            timeout=timeout, amount=tokens
+        ):
+            return True
+        # TPM 不夠時不發請求，歸還已取得的請求額度，不佔用其他進程的 RPM
+        self.shared_state.release_token("openai_rpm", rate=rpm_rate, capacity=rpm_capacity)
+        return False
+
+    def translate_now(self, title: str, summary: str, title_cn: Optional[str] = None,
+                      summary_cn: Optional[str] = None, timeout: Optional[float] = None) -> Tuple[str, str]:
+        """
+        同步翻譯（請求內調用，在線程中執行），與 Worker 池共用預算
+        預算等待超時或翻譯失敗時拋出 TranslationError
+        """
+        tokens = self.translator.estimate_tokens(title, summary)
+        if not self._acquire_budget(tokens, timeout):
+            raise TranslationError("translation budget exhausted", rate_limited=True)
+        return self.translator.translate_news_strict(title, summary, title_cn, summary_cn)
+
+    # ---------- Worker ----------
+
+    async def _worker_loop(self, worker_id: int):
+        """領取到期的任務並處理，沒有任務時等待喚醒或輪詢"""
+        while True:
+            try:
+                job = await asyncio.to_thread(self.job_store.claim)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Translation worker-{worker_id} failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 非翻譯錯誤（存儲出錯、數據損壞等）也不能讓 Worker 退出，任務按失敗處理
+                logger.warning(f"⚠️ Translation worker-{worker_id} error on job {job.get('article_hash')}: {e}")
+                try:
+                    await self._record_failure(job, f"worker error: {e}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 連狀態都寫不進去：任務保持租約，過期後由其他 Worker 重新領取
+                    logger.warning(f"⚠️ Translation worker-{worker_id} could not reschedule job: {e}")
+
+    async def _run_job(self, job: Dict[str, Any]):
+        """執行一個翻譯任務：成功寫回，失敗退避重試或記錄失敗"""
+        article_hash = job["article_hash"]
+        original = job["original"]
+        title, summary = job["title"], job["summary"]
+
+        tokens = self.translator.estimate_tokens(title, summary)
+        if not await asyncio.to_thread(self._acquire_budget, tokens, self.job_store.lease_seconds / 2):
+            # 預算用完不算失敗，稍後再試
+            await asyncio.to_thread(self.job_store.release, article_hash, self.poll_interval)
+            return
+
+        try:
+            title_cn, summary_cn = await asyncio.to_thread(
+                self.translator.translate_news_strict, title, summary,
+                original.get("title_cn"), original.get("summary_cn")
+            )
+        except TranslationError as e:
+            await self._record_failure(job, str(e), e.retry_after)
+            return
+
+        try:
+            await asyncio.to_thread(self.save_func, original, title_cn, summary_cn)
+        except Exception as e:
+            await asyncio.to_thread(self.job_store.retry, article_hash, f"save failed: {e}", self.retry_base)
+            logger.warning(f"⚠️ Error saving translation: {e}")
+            return
+
+        await asyncio.to_thread(self.job_store.complete, article_hash)
+        self.completed += 1
+        logger.debug("🈯 Background translation done: %.40s...", title)
+
+    async def _record_failure(self, job: Dict[str, Any], error: str, retry_after: Optional[float] = None):
+        """任務失敗：按指數退避重試，超過次數移入失敗記錄"""
+        article_hash = job["article_hash"]
+        attempts = job.get("attempts", 0) + 1
+        if attempts >= self.max_attempts:
+            await asyncio.to_thread(self.job_store.fail, article_hash, error)
+            logger.warning(f"⚠️ Translation failed after {attempts} attempts, recorded: {error}")
+        else:
+            delay = retry_after or self.retry_base * (2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
+            await asyncio.to_thread(self.job_store.retry, article_hash, error, delay)
+            logger.debug("🔁 Translation retry %d in %.1fs: %s", attempts, delay, error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取隊列統計"""
+        try:
+            stats = self.job_store.get_stats()
+        except Exception as e:
+            stats = {"error": str(e)}
+
+        stats.update({
+            "completed": self.completed,
+            "workers": len(self.workers),
+            "rpm": self.rpm,
+            "tpm": self.tpm
+        })
+        return stats
@@ -0,0 +1,204 @@
+"""
+監控列表批量抓取
+定期用合併的 symbols:(A OR B ...) 查詢（或不按股票過濾的最新文章流）分頁拉取整個監控列表的最新文章，
+按文章帶的股票標籤分發到各股票的緩存；上游調用次數取決於新聞量，而不是監控列表的長度。
+一輪完整抓取後把監控列表標記為已覆蓋，覆蓋期內這些股票的請求只讀本地存儲，不再單獨查詢上游
+"""
+
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.utils.article_id import ensure_article_id
+from app.utils.date_parser import get_published, parse_timestamp
+from app.utils.tickers import get_tickers
+
+logger = logging.getLogger(__name__)
+
+# 上游索引有延遲，每輪從上次最新文章之前 overlap 秒開始，重疊部分由文章ID去重
+_OVERLAP_SECONDS = 300
+_HIGH_WATER_KEY = "firehose:high_water"
+
+
+class WatchlistFirehose:
+    """監控列表批量抓取線程（多進程部署時由共享鎖保證同一時間只有一個進程在抓）"""
+
+    def __init__(self, news_service, symbols: Optional[List[str]] = None):
+        self.news_service = news_service
+        if symbols is None:
+            symbols = os.getenv("WATCHLIST_SYMBOLS", "").split(",")
+        self.symbols = sorted({s.strip().upper() for s in symbols if s and s.strip()})
+
+        # symbols：按股票合併查詢；all：不按股票過濾的最新文章流（監控列表很長時更省）
+        self.mode = os.getenv("WATCHLIST_QUERY_MODE", "symbols").lower()
+        self.interval = float(os.getenv("WATCHLIST_POLL_SECONDS", "60"))
+        self.page_size = int(os.getenv("WATCHLIST_PAGE_SIZE", "50"))
+        self.max_pages = int(os.getenv("WATCHLIST_MAX_PAGES", "20"))
+        # 每個查詢最多合併的股票數，避免查詢字符串過長
+        self.clause_size = int(os.getenv("WATCHLIST_CLAUSE_SIZE", "100"))
+        # 最近一輪完整抓取後多久內，監控列表中的股票不再單獨查詢上游
+        self.coverage_seconds = float(os.getenv("WATCHLIST_COVERAGE_SECONDS", str(self.interval * 3)))
+
+        self.stats = {"polls": 0, "upstream_calls": 0, "articles": 0, "routed": 0, "failures": 0}
+        self.last_poll: Optional[float] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.symbols)
+
+    def build_queries(self, since_ts: Optional[int] = None) -> List[str]:
+        """本輪的上游查詢字符串；since_ts 為發布時間下限（按天，上游只支持日期範圍）"""
+        date_clause = ""
+        if since_ts:
+            day = datetime.fromtimestamp(since_ts, tz=timezone.utc).strftime("%Y-%m-%d")
+            date_clause = f"publishedAt:[{day} TO *]"
+
+        if self.mode == "all":
+            return [date_clause or "*"]
+
+        queries = []
+        for i in range(0, len(self.symbols), self.clause_size):
+            chunk = self.symbols[i:i + self.clause_size]
+            query = "symbols:(" + " OR ".join(f'"{s}"' for s in chunk) + ")"
+            queries.append(f"{query} AND {date_clause}" if date_clause else query)
+        return queries
+
+    def poll_once(self) -> bool:
+        """
+        執行一輪抓取（同步，在線程中調用）
+
+        Returns:
+            本輪是否完整（所有查詢都翻到上次的位置或已無更多文章），完整時把監控列表標記為已覆蓋
+        """
+        if not self.enabled:
+            return False
+
+        service = self.news_service
+        raw = service.sqlite_cache.get_system_status(_HIGH_WATER_KEY)
+        high_water = int(raw) if raw else None
+        since_ts = high_water - _OVERLAP_SECONDS if high_water else None
+
+        collected: Dict[str, Dict[str, Any]] = {}
+        upstream_ok = True
+        truncated = False
+
+        for query in self.build_queries(since_ts):
+            for page in range(self.max_pages):
+                articles = service._query_upstream(query, size=self.page_size, offset=page * self.page_size,
+                                                   label="watchlist")
+                self.stats["upstream_calls"] += 1
+                if articles is None or (len(articles) == 1 and "msg" in articles[0]):
+                    upstream_ok = False
+                    break
+
+                oldest = None
+                for article in articles:
+                    published_ts = parse_timestamp(get_published(article))
+                    oldest = published_ts if oldest is None else min(oldest, published_ts)
+                    if since_ts is None or published_ts >= since_ts:
+                        collected.setdefault(ensure_article_id(article), article)
+
+                # 最新在前：翻到上次的位置或最後一頁即停止
+                if len(articles) < self.page_size or (since_ts is not None and oldest is not None and oldest < since_ts):
+                    break
+            else:
+                # 翻滿 max_pages 仍未到上次的位置，本輪可能漏了文章（首輪只取最新的一段，不算遺漏）
+                truncated = since_ts is not None
+
+        routed = self._route(list(collected.values()))
+
+        self.stats["polls"] += 1
+        self.stats["articles"] += len(collected)
+        self.stats["routed"] += routed
+        self.last_poll = time.time()
+
+        if not upstream_ok:
+            # 上游出錯：保留上次的位置，下一輪重新抓取
+            self.stats["failures"] += 1
+            logger.warning(f"⚠️ Watchlist poll failed upstream, {len(collected)} articles routed")
+            return False
+
+        newest = max((parse_timestamp(get_published(a)) for a in collected.values()), default=0)
+        if newest > (high_water or 0):
+            service.sqlite_cache.set_system_status(_HIGH_WATER_KEY, str(newest))
+
+        if truncated:
+            # 新聞量超過 max_pages：從最新位置繼續，但本輪不算完整覆蓋
+            self.stats["failures"] += 1
+            logger.warning(f"⚠️ Watchlist poll hit {self.max_pages} pages, raise WATCHLIST_MAX_PAGES")
+            return False
+
+        service.sqlite_cache.mark_covered(self.symbols, self.last_poll)
+
+        if collected:
+            logger.info(f"🚰 Watchlist poll: {len(collected)} new articles for {len(self.symbols)} symbols")
+        return True
+
+    def _route(self, articles: List[Dict[str, Any]]) -> int:
+        """按股票標籤把文章寫入各股票的緩存；MongoDB 一次批量寫入（文章自帶所有股票）"""
+        if not articles:
+            return 0
+
+        service = self.news_service
+        service._ingest_articles(articles)
+
+        watched = set(self.symbols)
+        by_symbol: Dict[str, List[Dict[str, Any]]] = {}
+        for article in articles:
+            for ticker in get_tickers(article):
+                if ticker in watched:
+                    by_symbol.setdefault(ticker, []).append(article)
+
+        # 不在監控列表中的股票不佔用本地緩存；同一篇文章的其他股票關聯由緩存自動補充
+        for symbol, symbol_articles in by_symbol.items():
+            service.sqlite_cache.save_news_cache(symbol, symbol_articles)
+        if service.mongodb:
+            service.mongodb.bulk_save_articles(articles)
+        service._invalidate_responses(None, articles)
+
+        return sum(len(a) for a in by_symbol.values())
+
+    def start(self):
+        """啟動後台抓取線程"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+
+        self._stop.clear()
+
+        def _loop():
+            while not self._stop.is_set():
+                # 多進程部署時每個間隔只有一個進程抓取（不主動釋放，鎖在間隔結束時過期）
+                if self.news_service.shared_state.try_lock("watchlist_firehose", ttl=self.interval * 0.9):
+                    try:
+                        self.poll_once()
+                    except Exception as e:
+                        self.stats["failures"] += 1
+                        logger.warning(f"⚠️ Watchlist poll failed: {e}")
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=_loop, name="watchlist-firehose", daemon=True)
+        self._thread.start()
+        logger.info(f"🚰 Watchlist firehose started ({len(self.symbols)} symbols, every {self.interval:.0f}s)")
+
+    def stop(self):
+        """停止後台抓取線程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """抓取統計"""
+        return {
+            "symbols": len(self.symbols),
+            "mode": self.mode,
+            "interval_seconds": self.interval,
+            "last_poll": self.last_poll,
+            **self.stats
+        }
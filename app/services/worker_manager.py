@@ -1,10 +1,13 @@
 import asyncio
 import logging
+import os
 import uuid
 import time
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, field
-from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.logger import request_id_var
+from app.utils.cancellation import CancellationToken, cancel_token_var
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +16,21 @@ class NewsTask:
     id: str
     symbol: str
     limit: int
+    since: Optional[str] = None
+    # Return untranslated articles at once and translate in the background
+    translate_async: bool = False
+    # 數據來源和新鮮度，由 news_service 填寫
+    meta: Dict[str, Any] = field(default_factory=dict)
+    # Carries the request deadline; cancelled when the caller times out or disconnects
+    cancel_token: CancellationToken = field(default_factory=CancellationToken)
     future: asyncio.Future = field(default_factory=asyncio.Future)
     created_at: float = field(default_factory=time.time)
+    request_id: str = field(default_factory=request_id_var.get)
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Monotonic deadline of the request (None = no deadline)"""
+        return self.cancel_token.deadline
 
 class NewsWorkerSystem:
     """
@@ -26,10 +42,10 @@ class NewsWorkerSystem:
         self.news_service = news_service
         self.worker_count = worker_count
         self.queue = asyncio.Queue()
+        # How long a caller waits for its result before giving up (and cancelling the work)
+        self.request_timeout = float(os.getenv("REQUEST_DEADLINE_SECONDS", "45"))
         self.workers = []
         self.is_running = False
-        # Thread pool for running blocking code (requests, sqlite, etc.)
-        self.executor = ThreadPoolExecutor(max_workers=worker_count) 
         
     async def start(self):
         """Start the worker system"""
@@ -47,7 +63,6 @@ class NewsWorkerSystem:
         """Stop the worker system"""
         logger.info("🛑 Stopping NewsWorkerSystem...")
         self.is_running = False
-        self.executor.shutdown(wait=False)
         
         # Cancel all workers
         for worker in self.workers:
@@ -61,12 +76,20 @@ class NewsWorkerSystem:
             
         self.workers = []
         
-    async def process_news_request(self, symbol: str, limit: int = 10) -> Any:
+    async def process_news_request(self, symbol: str, limit: int = 10, since: Optional[str] = None,
+                                   meta: Optional[Dict[str, Any]] = None,
+                                   cancel_token: Optional[CancellationToken] = None,
+                                   translate_async: bool = False) -> Any:
         """
         Public interface: Submit a request and wait for the result.
+        If `meta` is given it is filled with the data source and freshness.
+        `cancel_token` lets the caller abandon the request (e.g. client disconnect);
+        one with the default deadline is created when omitted.
         """
         task_id = str(uuid.uuid4())
-        task = NewsTask(id=task_id, symbol=symbol, limit=limit)
+        task = NewsTask(id=task_id, symbol=symbol, limit=limit, since=since, translate_async=translate_async,
+                        meta=meta if meta is not None else {},
+                        cancel_token=cancel_token or CancellationToken(self.request_timeout))
         
         # Add to queue
         await self.queue.put(task)
@@ -74,11 +97,16 @@ class NewsWorkerSystem:
         
         try:
             # Wait for the result with a timeout
-            result = await asyncio.wait_for(task.future, timeout=45.0)
+            result = await asyncio.wait_for(task.future, timeout=self.request_timeout)
             return result
         except asyncio.TimeoutError:
             logger.error(f"❌ Task {task_id} for {symbol} timed out")
+            task.cancel_token.cancel("caller timed out")
             return [{"msg": "Request timed out, server busy"}]
+        except asyncio.CancelledError:
+            # The request handler itself was cancelled
+            task.cancel_token.cancel("caller cancelled")
+            raise
             
     async def worker_loop(self, worker_id: int):
         """A single worker that processes tasks from the queue"""
@@ -88,61 +116,29 @@ class NewsWorkerSystem:
             try:
                 # Get task from queue
                 task = await self.queue.get()
+                request_id_var.set(task.request_id)
+                cancel_token_var.set(task.cancel_token)
                 
+                # Caller already gave up while the task was queued: free the worker for live traffic
+                if task.cancel_token.cancelled:
+                    logger.info(f"🚫 Worker-{worker_id} skipping abandoned task for {task.symbol} ({task.cancel_token.reason})")
+                    if not task.future.done():
+                        task.future.set_result([{"msg": "Request cancelled"}])
+                    self.queue.task_done()
+                    continue
+
                 logger.info(f"👷 Worker-{worker_id} processing {task.symbol}")
                 
                 try:
-                    # Run the blocking get_symbol_news logic in a separate thread
-                    # We wrap the async call in a sync wrapper because current implementation might lack full async support
-                    # or mixes async/sync. However, since get_symbol_news IS async but blocks, 
-                    # we need to be careful.
-                    
-                    # Refined approach:
-                    # Since get_symbol_news is `async def` but contains blocking code (`requests`, `time.sleep`),
-                    # we should ideally refactor it. But to fix it quickly without rewriting the service:
-                    # We will run the inner sync logic in executor if we can isolate it, 
-                    # OR we just run the existing async method but ensure other tasks can yield.
-                    # BUT `async def` with blocking code blocks the loop.
-                    
-                    # The best quick fix: Run the 'heavy' part in a thread. 
-                    # Since `news_service` methods are `async`, we can't easily pass them to `run_in_executor`.
-                    # 
-                    # Workaround: We will run the logic directly here. Since we are in a worker task,
-                    # if we block, we block THIS worker. BUT if we block the event loop, we block EVERYONE.
-                    # So we MUST run the blocking parts in a thread.
-                    
-                    # Let's use run_in_executor to run a synchronous wrapper that calls the logic.
-                    # But the logic is async. This is tricky without refactoring `news_service.py`.
+                    # get_symbol_news runs its blocking upstream/SQLite calls in threads itself
+                    result = await self.news_service.get_symbol_news(
+                        task.symbol, task.limit, since=task.since, meta=task.meta,
+                        translate_async=task.translate_async
+                    )
                     
-                    # OPTION A: Refactor `news_service.py` to be truly async (hard, requires aiohttp).
-                    # OPTION B: Wrap the blocking calls in `news_service.py` with `run_in_executor`.
-                    # OPTION C: Run it here.
-                    
-                    # Let's try to run the fetch in a thread.
-                    loop = asyncio.get_running_loop()
-                    
-                    # We need a sync function to pass to run_in_executor
-                    def sync_fetch_wrapper():
-                        # This is a hack because the underlying service is mixed.
-                        # We need to create a new event loop for this thread if we want to run async code synchronously?
-                        # No, that's messy.
-                        
-                        # Better approach: 
-                        # The `news_service.get_symbol_news` is `async def`. It awaits `_fetch_from_api`.
-                        # `_fetch_from_api` calls `requests.post` (BLOCKING).
-                        # We should patch `_fetch_from_api` to run its blocking part in a thread.
-                        pass
-
-                    # To properly fix "Freezing", we MUST allow the event loop to continue.
-                    # The best way is to offload the `get_symbol_news` execution to a thread.
-                    # Since `get_symbol_news` is async, we can't just `executor.submit(get_symbol_news)`.
-                    
-                    # We will execute the task directly, but we rely on the implementation below to be fixed 
-                    # to use `run_in_executor` for the request part.
-                    
-                    result = await self.news_service.get_symbol_news(task.symbol, task.limit)
-                    
-                    task.future.set_result(result)
+                    # The future is already cancelled if the caller timed out
+                    if not task.future.done():
+                        task.future.set_result(result)
                     
                 except Exception as e:
                     logger.error(f"❌ Worker-{worker_id} error processing {task.symbol}: {e}")
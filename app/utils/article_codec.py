@@ -0,0 +1,198 @@
+"""
+文章緊湊存儲格式
+上游文章只有少數欄位會被用到（標題、摘要、鏈接、時間、來源、股票、評分、翻譯），
+其餘欄位（正文、圖片、行業分類等）佔了大部分體積。存儲時把文章拆成兩部分：
+  核心欄位：緊湊 JSON，讀取時直接解析，不需要解壓
+  其餘欄位：用預置字典壓縮（有 zstandard 時用 zstd，否則 zlib），只有需要完整原始文章時才解壓
+
+SQLite 的 raw_data 存 encode_article 的結果（BLOB），舊的 JSON 文本照常讀取；
+MongoDB 的 raw_data 存核心欄位（仍可按欄位查詢和更新），raw_extra 存 pack_extra 的結果
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# 流程中會讀取的欄位；content 只在沒有 description 時作為摘要使用
+CORE_FIELDS = (
+    "article_id", "title", "description", "url", "publishedAt", "published", "source", "symbols",
+    "score", "keywords", "title_cn", "summary_cn",
+)
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# 緊湊格式標記 + 其餘欄位的壓縮方式 + 核心 JSON 長度
+_FORMAT_V1 = 1
+_HEADER = struct.Struct(">BBI")
+
+# 預置字典：上游文章常見的欄位名和取值片段。文章其餘欄位通常只有幾百字節，
+# 單獨壓縮時沒有可引用的上文，預置字典讓它們也能壓縮到原來的幾分之一。
+# 已寫入的數據依賴字典內容，修改時必須換新的格式標記
+_PRESET_DICTIONARY = (
+    '"industries":[],"sectors":[],"topics":[],"tags":[],"authors":[],"categories":[],'
+    '"imageUrl":"https://","image":"https://","thumbnail":"https://","sourceUrl":"https://",'
+    '"content":"","body":"","text":"","language":"en","country":"us","sentiment":"neutral",'
+    '"source":{"id":"","name":""},"id":"","type":"article","updatedAt":"","crawledAt":"","author":"",'
+    '"Technology","Financial Services","Healthcare","Consumer Cyclical","Communication Services",'
+    '"Industrials","Energy","Real Estate","Utilities","Basic Materials","Consumer Defensive",'
+    '"Semiconductors","Software","Banks","Biotechnology","Internet Retail",'
+    '"Reuters","Bloomberg","Benzinga","Seeking Alpha","MarketWatch","CNBC","Yahoo Finance",'
+    '"Business Wire","PR Newswire","GlobeNewswire","The Motley Fool","Zacks","Barron\'s",'
+    ' shares of the company, according to the report, said in a statement, for the quarter ended'
+    ' million, compared with billion, earnings per share, revenue of $, year-over-year,'
+    ' analysts expected, price target, stock market, investors, announced today that the'
+    ' The company reported first quarter second quarter third quarter fourth quarter fiscal year'
+    ' Inc. (NASDAQ: Inc. (NYSE: Corp. Ltd. Holdings forward-looking statements'
+    ' https://www. .com/news/ .html .jpg .png ?width= 2025-01-01T00:00:00Z .000Z'
+).encode("utf-8")
+
+_local = threading.local()
+
+
+def _default_codec() -> int:
+    """ARTICLE_COMPRESSION：auto（有 zstandard 時用 zstd）、zstd、zlib、none"""
+    mode = os.getenv("ARTICLE_COMPRESSION", "auto").lower()
+    if mode == "none":
+        return CODEC_NONE
+    if mode == "zlib" or not ZSTD_AVAILABLE:
+        return CODEC_ZLIB
+    return CODEC_ZSTD
+
+
+def _zstd_dictionary():
+    if not hasattr(_local, "zstd_dictionary"):
+        _local.zstd_dictionary = zstandard.ZstdCompressionDict(
+            _PRESET_DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+        )
+    return _local.zstd_dictionary
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        # 壓縮器不能跨線程共用，每個線程一個
+        if not hasattr(_local, "zstd_compressor"):
+            _local.zstd_compressor = zstandard.ZstdCompressor(level=3, dict_data=_zstd_dictionary())
+        return _local.zstd_compressor.compress(data)
+    if codec == CODEC_ZLIB:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 15, 8, zlib.Z_DEFAULT_STRATEGY, _PRESET_DICTIONARY)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Article was compressed with zstd but zstandard is not installed")
+        if not hasattr(_local, "zstd_decompressor"):
+            _local.zstd_decompressor = zstandard.ZstdDecompressor(dict_data=_zstd_dictionary())
+        return _local.zstd_decompressor.decompress(data)
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj(15, _PRESET_DICTIONARY)
+        return decompressor.decompress(data) + decompressor.flush()
+    return data
+
+
+def _dumps(obj: Dict[str, Any]) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def split_article(article: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """拆分為 (核心欄位, 其餘欄位)"""
+    core: Dict[str, Any] = {}
+    extra: Dict[str, Any] = {}
+    for key, value in article.items():
+        if key in CORE_FIELDS or (key == "content" and not article.get("description")):
+            core[key] = value
+        else:
+            extra[key] = value
+    return core, extra
+
+
+def pack_extra(extra: Dict[str, Any], codec: Optional[int] = None) -> bytes:
+    """壓縮其餘欄位：1 字節壓縮方式 + 壓縮數據（沒有其餘欄位時只有 1 字節）"""
+    codec = _default_codec() if codec is None else codec
+    if not extra:
+        return bytes([CODEC_NONE])
+    return bytes([codec]) + _compress(codec, _dumps(extra))
+
+
+def unpack_extra(blob: Optional[bytes]) -> Dict[str, Any]:
+    """解壓其餘欄位"""
+    if not blob or len(blob) < 2:
+        return {}
+    blob = bytes(blob)
+    try:
+        data = _decompress(blob[0], blob[1:])
+    except ValueError:
+        raise
+    except Exception as e:
+        # zlib.error / zstandard.ZstdError
+        raise ValueError(f"Corrupt compressed article data: {e}") from e
+    return json.loads(data)
+
+
+def encode_article(article: Dict[str, Any], codec: Optional[int] = None) -> bytes:
+    """文章編碼為緊湊格式（SQLite raw_data）"""
+    core, extra = split_article(article)
+    return _encode(_dumps(core), pack_extra(extra, codec))
+
+
+def _encode(core_json: bytes, packed_extra: bytes) -> bytes:
+    return _HEADER.pack(_FORMAT_V1, packed_extra[0], len(core_json)) + core_json + packed_extra[1:]
+
+
+def _parse(value: bytes) -> Tuple[bytes, bytes]:
+    """緊湊格式拆為 (核心 JSON, pack_extra 格式的其餘欄位)"""
+    fmt, codec, core_length = _HEADER.unpack_from(value)
+    if fmt != _FORMAT_V1:
+        raise ValueError(f"Unknown article storage format {fmt}")
+    start = _HEADER.size
+    return value[start:start + core_length], bytes([codec]) + value[start + core_length:]
+
+
+def is_compact(value: Union[bytes, str, None]) -> bool:
+    """是否為緊湊格式（舊數據為 JSON 文本）"""
+    return isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= _HEADER.size \
+        and bytes(value[:1]) != b"{"
+
+
+def decode_article(value: Union[bytes, str], full: bool = False) -> Dict[str, Any]:
+    """
+    解碼存儲的文章；默認只解析核心欄位，full=True 時解壓並合併其餘欄位
+    兼容舊的 JSON 文本
+
+    Raises:
+        ValueError: 數據損壞或無法解壓（json.JSONDecodeError 也是 ValueError）
+    """
+    if not is_compact(value):
+        return json.loads(value)
+
+    core_json, packed_extra = _parse(bytes(value))
+    article = json.loads(core_json)
+    if full:
+        article = {**unpack_extra(packed_extra), **article}
+    return article
+
+
+def update_core(value: Union[bytes, str], updates: Dict[str, Any]) -> bytes:
+    """更新核心欄位（如翻譯），其餘欄位的壓縮數據原樣保留，不需要解壓"""
+    if not is_compact(value):
+        article = json.loads(value)
+        article.update(updates)
+        return encode_article(article)
+
+    core_json, packed_extra = _parse(bytes(value))
+    core = json.loads(core_json)
+    core.update(updates)
+    return _encode(_dumps(core), packed_extra)
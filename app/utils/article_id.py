@@ -0,0 +1,62 @@
+"""
+文章唯一ID
+對歸一化後的 URL、標題（沒有 URL 時用發布時間）計算 blake2b，
+入庫時計算一次並保存在文章的 article_id 欄位，之後各處直接沿用，
+SQLite 緩存、MongoDB 和翻譯任務隊列都以它作為鍵
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.utils.date_parser import get_published, parse_timestamp
+
+ARTICLE_ID_FIELD = "article_id"
+
+_WHITESPACE = re.compile(r'\s+')
+# 追蹤參數不影響文章內容
+_TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|src)$', re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """歸一化URL：scheme/域名小寫，去掉 fragment、追蹤參數和結尾斜杠"""
+    url = (url or '').strip()
+    if not url:
+        return ''
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url.lower()
+
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _TRACKING_PARAMS.match(k)))
+    netloc = parts.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return urlunsplit((parts.scheme.lower() or 'https', netloc, parts.path.rstrip('/'), query, ''))
+
+
+def normalize_title(title: str) -> str:
+    """歸一化標題：NFKC、忽略大小寫、合併空白"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', title or '').casefold()).strip()
+
+
+def compute_article_id(article: Dict[str, Any]) -> str:
+    """計算文章ID（32位十六進制）"""
+    url = normalize_url(article.get('url', ''))
+    # URL + 標題決定一篇文章；沒有 URL 時用發布時間區分同名標題
+    key = url if url else str(parse_timestamp(get_published(article)))
+    unique_string = f"{key}\x1f{normalize_title(article.get('title', ''))}"
+    return hashlib.blake2b(unique_string.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def ensure_article_id(article: Dict[str, Any]) -> str:
+    """返回文章已帶的ID，沒有時計算一次並寫入文章"""
+    article_id = article.get(ARTICLE_ID_FIELD)
+    if not article_id:
+        article_id = compute_article_id(article)
+        article[ARTICLE_ID_FIELD] = article_id
+    return article_id
@@ -0,0 +1,87 @@
+"""
+請求取消令牌
+每個請求帶一個截止時間和取消標記，調用方超時或客戶端斷開後，
+上游請求、翻譯和寫回都能及時停止，把Worker讓給仍在等待的請求
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RequestCancelled(Exception):
+    """請求已被取消或超過截止時間"""
+
+
+class CancellationToken:
+    """線程安全的取消令牌（threading.Event + 截止時間）"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        """取消請求（可重複調用，只保留第一次的原因）"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消或超過截止時間"""
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            return True
+        return False
+
+    def remaining(self) -> Optional[float]:
+        """距離截止時間還有多少秒，沒有截止時間時返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self):
+        """已取消時拋出 RequestCancelled"""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+# 當前請求的取消令牌；asyncio.to_thread 會複製上下文，線程內同樣可見
+cancel_token_var: ContextVar[Optional[CancellationToken]] = ContextVar("cancel_token", default=None)
+
+
+def check_cancelled():
+    """當前請求已取消時拋出 RequestCancelled，沒有令牌時不做任何事"""
+    token = cancel_token_var.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def is_cancelled() -> bool:
+    """當前請求是否已取消"""
+    token = cancel_token_var.get()
+    return token is not None and token.cancelled
+
+
+def time_left(default: float) -> float:
+    """
+    當前請求剩餘時間，不超過 default（用作上游請求的超時）
+    已取消或沒有剩餘時間時拋出 RequestCancelled：requests 不接受 0 或負數的超時，
+    這時也不應該再發出請求
+    """
+    token = cancel_token_var.get()
+    if token is None:
+        return default
+
+    token.raise_if_cancelled()
+    remaining = token.remaining()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        token.cancel("deadline exceeded")
+        raise RequestCancelled(token.reason)
+    return min(default, remaining)
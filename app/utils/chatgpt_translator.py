@@ -5,11 +5,16 @@ ChatGPT翻譯器 - 使用OpenAI API進行翻譯和分析
 import os
 import json
 import re
+import logging
 from typing import Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
+from app.utils.translation_memory import TranslationMemory
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # 檢查是否有openai庫，並偵測版本
 try:
     import openai
@@ -24,7 +29,30 @@ try:
 except ImportError:
     OPENAI_AVAILABLE = False
     OPENAI_V1 = False
-    print("⚠️ OpenAI library not installed. Translation will return original text.")
+    logger.warning("⚠️ OpenAI library not installed. Translation will return original text.")
+
+
+class TranslationError(Exception):
+    """翻譯失敗（API錯誤、限流或無法解析的回應）"""
+
+    def __init__(self, message: str, rate_limited: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_exception(cls, e: Exception) -> "TranslationError":
+        """從 OpenAI 異常構建，識別 429 限流（v0.x 和 v1.0+ 的異常類不同，按狀態碼和類名判斷）"""
+        status = getattr(e, "status_code", None) or getattr(e, "http_status", None)
+        rate_limited = status == 429 or "RateLimit" in type(e).__name__
+        retry_after = None
+        headers = getattr(getattr(e, "response", None), "headers", None) or getattr(e, "headers", None)
+        if headers:
+            try:
+                retry_after = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        return cls(f"{type(e).__name__}: {e}", rate_limited=rate_limited, retry_after=retry_after)
 
 
 class ChatGPTTranslator:
@@ -39,18 +67,47 @@ class ChatGPTTranslator:
             if self.openai_v1:
                 # OpenAI v1.0+ API客戶端
                 self.client = openai.OpenAI(api_key=self.api_key)
-                print("✅ ChatGPT Translator initialized (v1.0+ API)")
+                logger.info("✅ ChatGPT Translator initialized (v1.0+ API)")
             else:
                 # OpenAI v0.x: 直接設置 api_key
                 self.client = None
                 openai.api_key = self.api_key
-                print("✅ ChatGPT Translator initialized (v0.x legacy API)")
+                logger.info("✅ ChatGPT Translator initialized (v0.x legacy API)")
+            
+            # 模糊翻譯記憶：相同/相近的舊譯文重用或作為譯例
+            self.memory = self._init_memory()
         else:
             self.client = None
+            self.memory = None
             if not OPENAI_AVAILABLE:
-                print("⚠️ ChatGPT Translator disabled: openai library not installed")
+                logger.warning("⚠️ ChatGPT Translator disabled: openai library not installed")
             else:
-                print("⚠️ ChatGPT Translator disabled: OPENAI_API_KEY not set")
+                logger.warning("⚠️ ChatGPT Translator disabled: OPENAI_API_KEY not set")
+    
+    def _init_memory(self) -> Optional[TranslationMemory]:
+        """初始化翻譯記憶，可用 TRANSLATION_MEMORY_ENABLED=false 關閉"""
+        if os.getenv("TRANSLATION_MEMORY_ENABLED", "true").lower() != "true":
+            return None
+        try:
+            return TranslationMemory(
+                reuse_threshold=float(os.getenv("TRANSLATION_MEMORY_REUSE_THRESHOLD", "0.95")),
+                ttl_days=float(os.getenv("TRANSLATION_MEMORY_TTL_DAYS", "30")),
+                max_entries=int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "50000"))
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Translation memory disabled: {e}")
+            return None
+    
+    def _few_shot_examples(self, title: Optional[str], summary: Optional[str]) -> str:
+        """從翻譯記憶取相近的舊譯文作為譯例（只取需要翻譯的字段）"""
+        lines = []
+        if title:
+            for _, source, translated in self.memory.lookup("title", title, k=2):
+                lines.append(f"EN: {source}\n中: {translated}")
+        if summary:
+            for _, source, translated in self.memory.lookup("summary", summary, k=1):
+                lines.append(f"EN: {source}\n中: {translated}")
+        return "\n\n".join(lines)
     
     def _chat_completion(self, model: str, messages: list, max_tokens: int = 500, temperature: float = 0.3) -> str:
         """統一處理 v0.x 和 v1.0+ 的 API 呼叫，返回回應文字"""
@@ -90,58 +147,104 @@ class ChatGPTTranslator:
                 temperature=0.3
             )
         except Exception as e:
-            print(f"⚠️ Translation error: {e}")
+            logger.warning(f"⚠️ Translation error: {e}")
             return text
     
     def translate_news(self, title: str, summary: str, title_cn: str = None, summary_cn: str = None) -> Tuple[str, str]:
-        """翻譯新聞標題和摘要（如果已有中文翻譯則跳過）"""
+        """翻譯新聞標題和摘要（如果已有中文翻譯則跳過），失敗時返回原文"""
         if not self.enabled:
             return title, summary
         
+        try:
+            return self.translate_news_strict(title, summary, title_cn, summary_cn)
+        except TranslationError as e:
+            logger.warning(f"⚠️ News translation error: {e}")
+            return (title_cn if self._has_translation(title_cn, title) else title,
+                    summary_cn if self._has_translation(summary_cn, summary) else summary)
+    
+    @staticmethod
+    def _has_translation(text_cn: Optional[str], original: str) -> bool:
+        """是否已有有效的中文翻譯（不是空白也不是原文）"""
+        return bool(text_cn and text_cn.strip() and text_cn != original)
+    
+    @staticmethod
+    def estimate_tokens(title: str, summary: str) -> int:
+        """粗略估算一次翻譯消耗的 token（輸入 + 輸出 + 提示詞），用於 TPM 預算"""
+        chars = len(title or "") + len(summary or "")
+        return chars // 4 * 2 + 200
+    
+    def translate_news_strict(self, title: str, summary: str, title_cn: str = None,
+                              summary_cn: str = None) -> Tuple[str, str]:
+        """
+        翻譯新聞標題和摘要，失敗時拋出 TranslationError（不會把英文原文當作翻譯返回）
+        供翻譯任務隊列使用，由調用方決定重試或記錄失敗
+        """
+        if not self.enabled:
+            raise TranslationError("translator disabled")
+        
         # 檢查是否已有中文翻譯，如果有則跳過
-        if title_cn and title_cn.strip() and title_cn != title:
-            print(f"✅ Skip translation - title_cn already exists")
+        if self._has_translation(title_cn, title):
+            logger.debug("✅ Skip translation - title_cn already exists")
             existing_title_cn = title_cn
         else:
             existing_title_cn = None
             
-        if summary_cn and summary_cn.strip() and summary_cn != summary:
-            print(f"✅ Skip translation - summary_cn already exists")
+        if self._has_translation(summary_cn, summary):
+            logger.debug("✅ Skip translation - summary_cn already exists")
             existing_summary_cn = summary_cn
+        elif not (summary or "").strip():
+            # 沒有摘要：譯文就是空字符串，只需要翻譯標題
+            existing_summary_cn = ""
         else:
             existing_summary_cn = None
             
         # 如果兩個都已存在，直接返回
-        if existing_title_cn and existing_summary_cn:
+        if existing_title_cn and existing_summary_cn is not None:
             return existing_title_cn, existing_summary_cn
         
-        try:
-            # 只翻譯需要的部分
-            if existing_title_cn:
-                # 只翻譯摘要
-                content = f"摘要: {summary}"
-                system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文摘要翻譯成繁體中文。
+        # 翻譯記憶中幾乎相同的舊譯文直接重用
+        if self.memory:
+            if not existing_title_cn:
+                existing_title_cn = self.memory.find_reusable("title", title)
+            if existing_summary_cn is None:
+                existing_summary_cn = self.memory.find_reusable("summary", summary)
+            if existing_title_cn and existing_summary_cn is not None:
+                logger.debug("♻️ Reused translation from memory: %.40s...", title)
+                return existing_title_cn, existing_summary_cn
+        
+        # 只翻譯需要的部分
+        if existing_title_cn:
+            # 只翻譯摘要
+            content = f"摘要: {summary}"
+            system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文摘要翻譯成繁體中文。
 請以JSON格式輸出：{"summary_cn": "翻譯後摘要"}
 只輸出JSON，不要其他內容。"""
-                expected_key = "summary_cn"
-                fallback = (existing_title_cn, summary)
-            elif existing_summary_cn:
-                # 只翻譯標題
-                content = f"標題: {title}"
-                system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文標題翻譯成繁體中文。
+            expected_keys = ("summary_cn",)
+        elif existing_summary_cn is not None:
+            # 只翻譯標題
+            content = f"標題: {title}"
+            system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文標題翻譯成繁體中文。
 請以JSON格式輸出：{"title_cn": "翻譯後標題"}
 只輸出JSON，不要其他內容。"""
-                expected_key = "title_cn"
-                fallback = (title, existing_summary_cn)
-            else:
-                # 兩個都翻譯
-                content = f"標題: {title}\n\n摘要: {summary}"
-                system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文新聞翻譯成繁體中文。
+            expected_keys = ("title_cn",)
+        else:
+            # 兩個都翻譯
+            content = f"標題: {title}\n\n摘要: {summary}"
+            system_prompt = """你是一個專業金融新聞翻譯員。請將以下英文新聞翻譯成繁體中文。
 請以JSON格式輸出：{"title_cn": "翻譯後標題", "summary_cn": "翻譯後摘要"}
 只輸出JSON，不要其他內容。"""
-                expected_key = None
-                fallback = (title, summary)
-            
+            expected_keys = ("title_cn", "summary_cn")
+        
+        # 相近的舊譯文作為 few-shot 譯例
+        if self.memory:
+            examples = self._few_shot_examples(
+                None if existing_title_cn else title,
+                None if existing_summary_cn is not None else summary
+            )
+            if examples:
+                system_prompt += f"\n\n參考以往譯例，保持用詞一致：\n{examples}"
+        
+        try:
             result_text = self._chat_completion(
                 model="gpt-4o-mini",
                 messages=[
@@ -151,27 +254,26 @@ class ChatGPTTranslator:
                 max_tokens=1500,
                 temperature=0.3
             )
-            
-            # 嘗試解析JSON
-            try:
-                json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                    
-                    if expected_key == "title_cn":
-                        return result.get("title_cn", title), existing_summary_cn
-                    elif expected_key == "summary_cn":
-                        return existing_title_cn, result.get("summary_cn", summary)
-                    else:
-                        return result.get("title_cn", title), result.get("summary_cn", summary)
-            except json.JSONDecodeError:
-                pass
-            
-            return fallback
-            
         except Exception as e:
-            print(f"⚠️ News translation error: {e}")
-            return title, summary
+            raise TranslationError.from_exception(e) from e
+        
+        # 解析JSON，缺少任何一個字段都算失敗
+        json_match = re.search(r'\{.*\}', result_text or "", re.DOTALL)
+        try:
+            result = json.loads(json_match.group()) if json_match else None
+        except json.JSONDecodeError:
+            result = None
+        
+        if not isinstance(result, dict) or not all(result.get(k) for k in expected_keys):
+            raise TranslationError(f"unparseable translation response: {(result_text or '')[:100]}")
+        
+        if self.memory:
+            for key, source in (("title_cn", title), ("summary_cn", summary)):
+                if key in expected_keys:
+                    self.memory.add(key[:-3], source, result[key])
+        
+        return (result.get("title_cn") if "title_cn" in expected_keys else existing_title_cn,
+                result.get("summary_cn") if "summary_cn" in expected_keys else existing_summary_cn)
     
     def analyze_news(self, title: str, content: str) -> Dict[str, Any]:
         """使用ChatGPT分析新聞並返回評分和關鍵字"""
@@ -220,5 +322,5 @@ class ChatGPTTranslator:
             return {"score": 0, "keywords": [], "sentiment": 0, "summary_cn": ""}
             
         except Exception as e:
-            print(f"⚠️ News analysis error: {e}")
+            logger.warning(f"⚠️ News analysis error: {e}")
             return {"score": 0, "keywords": [], "sentiment": 0, "summary_cn": ""}
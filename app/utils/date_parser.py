@@ -0,0 +1,78 @@
+"""
+日期解析工具
+把 NewsFilter 返回的各種發布時間格式統一轉為 UTC 時間戳
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+# 沒有時區信息的格式一律按 UTC 處理
+_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%a, %d %b %Y %H:%M:%S %Z",
+    "%a, %d %b %Y %H:%M:%S %z",
+]
+
+_TZ_SUFFIX = re.compile(r'([+-])(\d{2})(\d{2})$')
+
+
+def parse_datetime(date_str: str) -> Optional[datetime]:
+    """解析时间字符串为带时区的 datetime，無法解析時返回 None"""
+    if not date_str or not isinstance(date_str, str):
+        return None
+
+    # 清理常見時區格式: +0000 → +00:00
+    clean_str = date_str.strip()
+    tz_match = _TZ_SUFFIX.search(clean_str)
+    if tz_match and ':' not in clean_str[-6:]:
+        clean_str = clean_str[:tz_match.start()] + f"{tz_match.group(1)}{tz_match.group(2)}:{tz_match.group(3)}"
+
+    for fmt in _FORMATS:
+        try:
+            dt = datetime.strptime(clean_str, fmt)
+            return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+
+    # 嘗試 ISO 格式（帶時區）
+    try:
+        dt = datetime.fromisoformat(clean_str.replace('Z', '+00:00'))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_timestamp(date_str: str) -> int:
+    """解析时间字符串为时间戳，無法解析時返回0"""
+    dt = parse_datetime(date_str)
+    return int(dt.timestamp()) if dt else 0
+
+
+def get_published(article: dict) -> str:
+    """取出文章的原始發布時間字符串"""
+    return article.get("publishedAt", "") or article.get("published", "")
+
+
+def parse_time_value(value: str) -> Optional[int]:
+    """解析查詢參數中的時間：Unix 時間戳（秒或毫秒）或日期字符串，無法解析時返回 None"""
+    value = (value or "").strip()
+    if value.isdigit():
+        number = int(value)
+        return number // 1000 if number > 10 ** 12 else number
+    return parse_timestamp(value) or None
+
+
+_DURATION = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$', re.IGNORECASE)
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> Optional[int]:
+    """把 90s / 30m / 6h / 2d 或純秒數解析為秒數，無法解析時返回 None"""
+    match = _DURATION.match(value or "")
+    if not match:
+        return None
+    return int(float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()])
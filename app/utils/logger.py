@@ -0,0 +1,171 @@
+"""
+結構化日誌配置
+熱路徑只把 LogRecord 放進隊列，格式化和 stdout I/O 全部交給背景監聽線程，
+避免 Docker json-file 驅動下的同步寫入阻塞事件循環
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# 當前請求ID（由HTTP中間件或Worker設置，跨線程時需要 copy_context / asyncio.to_thread）
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """在發出日誌的線程中記錄請求ID（監聽線程拿不到原本的 contextvar）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """按比例採樣 DEBUG 日誌，INFO 及以上全部保留"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """隊列滿時直接丟棄日誌，而不是阻塞調用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        只複製記錄，格式化交給監聽線程的 formatter
+        默認實現會在調用方線程格式化整條日誌並清掉 exc_info，JSON 中就沒有 exc 字段了；
+        這裡只把參數合併進消息（參數可能在之後被修改），保留 exc_info / exc_text
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """每條日誌輸出為一行JSON"""
+
+    # LogRecord 自帶的屬性，其餘的 (logger.info(..., extra={...})) 作為結構化字段輸出
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                payload[key] = value
+
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _parse_module_levels(spec: str) -> Dict[str, int]:
+    """解析 LOG_LEVELS，格式: "app.services.news_service=DEBUG,httpx=WARNING" """
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        level_no = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level_no, int):
+            levels[name.strip()] = level_no
+    return levels
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    配置全局日誌（可重複調用）
+
+    環境變量：
+        LOG_LEVEL              根日誌等級 (默認 INFO)
+        LOG_LEVELS             按模組設置等級，例如 "app.services.news_service=DEBUG"
+        LOG_FORMAT             json / text (默認 json)
+        LOG_DEBUG_SAMPLE_RATE  DEBUG 日誌採樣比例 0~1 (默認 0.1)
+        LOG_QUEUE_SIZE         日誌隊列上限，滿了就丟棄 (默認 10000)
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    root_level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+    if not isinstance(root_level, int):
+        root_level = logging.INFO
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+    else:
+        formatter = JSONFormatter()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter(float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(root_level)
+
+    for name, level in _parse_module_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    # uvicorn 默認自帶同步 StreamHandler，改為冒泡到根日誌走隊列
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    return _listener
+
+
+def shutdown_logging():
+    """停止監聽線程並輸出隊列中剩餘的日誌"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,116 @@
+"""
+近似重複新聞檢測
+同一篇新聞稿經多個渠道轉載，標題只有細微差別（來源前綴、dateline、標點）。
+對歸一化後的標題+摘要計算 64 位 SimHash，漢明距離小於閾值且數字一致的歸為一組
+"""
+
+import hashlib
+import re
+from typing import Any, Dict, List, Sequence
+
+SIMHASH_BITS = 64
+
+# 新聞稿常見的轉載痕跡：dateline、通訊社標記
+_DATELINE = re.compile(
+    r'^[A-Z][A-Za-z .,\'-]{1,40},\s+\w{3,9}\.?\s+\d{1,2},\s+\d{4}\s*(/[^/]+/)?\s*(--|—|-)?\s*'
+)
+_WIRE_TAGS = re.compile(r'/?\(?\b(prnewswire|globe newswire|business wire|accesswire|newsfile)\b\)?/?', re.IGNORECASE)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+_NUMBERS = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def normalize_text(text: str) -> str:
+    """歸一化：去掉 dateline 和通訊社標記，小寫，只保留字母數字"""
+    text = _DATELINE.sub('', (text or '').strip())
+    text = _WIRE_TAGS.sub(' ', text)
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def key_numbers(text: str) -> List[str]:
+    """
+    文本中的數字（去掉 dateline 和通訊社標記後）
+    只差一個數字的標題（Q3 / Q4、金額、百分比）SimHash 很接近但意思不同，不能視為同一篇或共用譯文
+    """
+    text = _WIRE_TAGS.sub(' ', _DATELINE.sub('', (text or '').strip()))
+    return _NUMBERS.findall(text)
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    """對歸一化文本的詞和相鄰詞對計算 64 位 SimHash"""
+    words = normalize_text(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = _token_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def group_near_duplicates(texts: Sequence[str], max_distance: int = 8) -> List[List[int]]:
+    """
+    把近似重複的文本分組
+
+    Returns:
+        按首次出現順序排列的分組，每組是 texts 的下標列表（第一個為代表）
+    """
+    hashes = [simhash(t) for t in texts]
+    numbers = [key_numbers(t) for t in texts]
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # 一頁最多幾十篇，兩兩比較即可
+    for i in range(len(hashes)):
+        if not hashes[i]:
+            continue
+        for j in range(i + 1, len(hashes)):
+            if hashes[j] and hamming_distance(hashes[i], hashes[j]) <= max_distance and numbers[i] == numbers[j]:
+                ri, rj = find(i), find(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+
+    return list(groups.values())
+
+
+def collapse_near_duplicates(items: List[Dict[str, Any]], max_distance: int = 8) -> List[Dict[str, Any]]:
+    """
+    把響應中的近似重複文章合併為一條，保留第一條（最新），
+    並在 sources 中列出組內所有來源
+    """
+    groups = group_near_duplicates([f"{a.get('title', '')} {a.get('summary', '')}" for a in items], max_distance)
+
+    collapsed = []
+    for group in groups:
+        item = dict(items[group[0]])
+        item["sources"] = [
+            {
+                "source": items[i].get("source", ""),
+                "link": items[i].get("link", ""),
+                "timestamp": items[i].get("timestamp", 0)
+            }
+            for i in group
+        ]
+        collapsed.append(item)
+
+    return collapsed
@@ -25,22 +25,41 @@ class NewsAnalyzer:
                 "Initiates", "Starts", "Begins", "Preliminary", "Early Stage", "Development", 
                 "Prospects", "Proposal", "Investor Meeting"]
         }
+        # 預編譯每個關鍵字的正則（批量導入時每篇文章都要匹配一遍）
+        self._patterns = [
+            (points, word, re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE))
+            for points, words in self.keywords.items()
+            for word in words
+        ]
     
     def analyze(self, title: str, content: str) -> Dict[str, Any]:
         """分析新聞文本並返回評分和關鍵字"""
         combined_text = f"{title} {content}"
         return self._analyze_text(combined_text)
     
+    def analyze_article(self, article: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        返回文章的評分和關鍵字；入庫時計算一次保存在文章中（score / keywords），
+        沒有時（舊數據）補算並寫入文章
+        """
+        if article.get("score") is None or not isinstance(article.get("keywords"), list):
+            result = self.analyze(
+                article.get("title", ""),
+                article.get("description", "") or article.get("content", "")
+            )
+            article["score"] = result.get("score", 0)
+            article["keywords"] = sorted(result.get("important_keywords", []))
+        return {"score": article["score"], "keywords": article["keywords"]}
+    
     def _analyze_text(self, content: str) -> Dict[str, Any]:
         """分析文本內容"""
         score = 0
         important_keywords: Set[str] = set()
         
-        for points, words in self.keywords.items():
-            for word in words:
-                if re.search(rf"\b{re.escape(word)}\b", content, re.IGNORECASE):
-                    score += points
-                    important_keywords.add(word)
+        for points, word, pattern in self._patterns:
+            if pattern.search(content):
+                score += points
+                important_keywords.add(word)
         
         return {
             "score": score,
@@ -0,0 +1,140 @@
+"""
+預序列化響應緩存
+按 (symbol, limit) 保存已序列化的響應字節和內容hash，
+重複輪詢直接返回字節或 304，不再重新驗證和序列化
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# orjson 可選，未安裝時退回標準庫 json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(content: Any) -> bytes:
+    """序列化為UTF-8 JSON字節"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ORJSONBytesResponse(Response):
+    """JSON響應，content 可以是已序列化的字節"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    created_at: float
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class ResponseCache:
+    """進程內的響應字節緩存（LRU + TTL）"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RESPONSE_CACHE_SECONDS", "30"))
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        # 翻譯 Worker 和監控列表抓取在其他線程中調用 invalidate
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        """獲取未過期的緩存響應"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.created_at > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    @staticmethod
+    def build(content: Any, headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        """序列化響應並計算ETag，不保存（用於內容很快會變化的響應）"""
+        body = dumps(content)
+        return CachedBody(
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            created_at=time.monotonic(),
+            headers=headers or {}
+        )
+
+    def put(self, key: Hashable, content: Any, headers: Optional[Dict[str, str]] = None) -> CachedBody:
+        """序列化並保存響應（連同額外的響應頭），返回緩存項"""
+        entry = self.build(content, headers)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def invalidate(self, symbols: Iterable[str]):
+        """清除這些股票的所有緩存響應（key 的第一項是 symbol），文章或翻譯寫入後調用"""
+        symbols = {s.upper() for s in symbols}
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k and k[0] in symbols]:
+                del self._entries[key]
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """檢查 If-None-Match 是否命中（支持多個值、弱校驗和 *）"""
+        if not if_none_match:
+            return False
+
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == "*" or candidate == etag:
+                return True
+
+        return False
+
+    def respond(self, request: Request, entry: CachedBody) -> Response:
+        """根據 If-None-Match 返回 304 或完整響應"""
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+
+        if self.etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+
+        return ORJSONBytesResponse(entry.body, headers=headers)
+
+    def get_stats(self) -> dict:
+        """獲取緩存統計"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl_seconds": self.ttl_seconds
+        }
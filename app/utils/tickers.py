@@ -0,0 +1,20 @@
+"""
+文章股票代碼
+NewsFilter 的文章帶有 symbols 列表（一篇文章可能同時關聯多隻股票）
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+def get_tickers(article: Dict[str, Any], symbol: Optional[str] = None) -> List[str]:
+    """文章關聯的所有股票代碼（大寫、去重），查詢的股票排在最前"""
+    tickers = [symbol.upper()] if symbol else []
+
+    for ticker in article.get("symbols") or []:
+        if not isinstance(ticker, str) or not ticker.strip():
+            continue
+        ticker = ticker.strip().upper()
+        if ticker not in tickers:
+            tickers.append(ticker)
+
+    return tickers
@@ -0,0 +1,217 @@
+"""
+模糊翻譯記憶
+保存已翻譯的英文標題/摘要，用字符 n-gram MinHash + LSH 查找相似的舊譯文：
+- 幾乎相同（且數字一致）的直接重用，不調用 OpenAI
+- 相近的作為 few-shot 譯例放入提示詞，保持用詞一致
+"""
+
+import hashlib
+import re
+import sqlite3
+import time
+import logging
+from typing import List, Optional, Set, Tuple
+
+from app.utils.near_duplicate import key_numbers
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(' ', (text or '').lower()).strip()
+
+
+def _shingles(text: str, n: int) -> Set[str]:
+    text = _normalize(text)
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TranslationMemory:
+    """基於 SQLite 的翻譯記憶，LSH 分桶保存在表中，多進程共享"""
+
+    def __init__(self, db_path: str = "cache.db", num_perm: int = 64, bands: int = 16, ngram: int = 4,
+                 reuse_threshold: float = 0.95, ttl_days: float = 30, max_entries: int = 50000):
+        self.db_path = db_path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.reuse_threshold = reuse_threshold
+        # 保留期和條數上限（0 不限），由後台維護調用 prune 清理
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+
+        # 固定種子的隨機排列 (a*x + b) mod p，保證不同進程的簽名一致
+        self._perms = []
+        for i in range(num_perm):
+            seed = hashlib.blake2b(f"perm-{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(seed[:8], 'big') % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(seed[8:], 'big') % _MERSENNE_PRIME
+            self._perms.append((a, b))
+
+        self.init_database()
+
+    def init_database(self):
+        """初始化翻譯記憶表和 LSH 分桶表"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE(kind, source_text)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory_lsh (
+                kind TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                memory_id INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tm_lsh_bucket ON translation_memory_lsh(kind, band, bucket)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tm_lsh_memory ON translation_memory_lsh(memory_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tm_created ON translation_memory(created_at)")
+
+        conn.commit()
+        conn.close()
+
+    def _signature(self, shingles: Set[str]) -> List[int]:
+        """MinHash 簽名"""
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def _buckets(self, signature: List[int]) -> List[str]:
+        """每個 band 的桶 key"""
+        return [
+            hashlib.blake2b(
+                ",".join(map(str, signature[band * self.rows:(band + 1) * self.rows])).encode(), digest_size=8
+            ).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def add(self, kind: str, source_text: str, translated_text: str):
+        """記錄一條譯文"""
+        shingles = _shingles(source_text, self.ngram)
+        if not shingles or not translated_text:
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT OR IGNORE INTO translation_memory (kind, source_text, translated_text, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (kind, source_text, translated_text, time.time()))
+
+            if cursor.rowcount:
+                memory_id = cursor.lastrowid
+                cursor.executemany(
+                    "INSERT INTO translation_memory_lsh (kind, band, bucket, memory_id) VALUES (?, ?, ?, ?)",
+                    [(kind, band, bucket, memory_id)
+                     for band, bucket in enumerate(self._buckets(self._signature(shingles)))]
+                )
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Error saving translation memory: {e}")
+        finally:
+            conn.close()
+
+    def lookup(self, kind: str, text: str, k: int = 3, min_similarity: float = 0.5) -> List[Tuple[float, str, str]]:
+        """
+        查找相似的舊譯文
+
+        Returns:
+            [(相似度, 英文原文, 譯文)]，按相似度從高到低
+        """
+        shingles = _shingles(text, self.ngram)
+        if not shingles:
+            return []
+
+        buckets = self._buckets(self._signature(shingles))
+        conn = sqlite3.connect(self.db_path)
+
+        try:
+            conditions = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+            params = [kind] + [v for band, bucket in enumerate(buckets) for v in (band, bucket)]
+            rows = conn.execute(f"""
+                SELECT source_text, translated_text FROM translation_memory
+                WHERE id IN (
+                    SELECT memory_id FROM translation_memory_lsh
+                    WHERE kind = ? AND ({conditions})
+                    LIMIT 200
+                )
+            """, params).fetchall()
+        except Exception as e:
+            logger.warning(f"⚠️ Error querying translation memory: {e}")
+            return []
+        finally:
+            conn.close()
+
+        # LSH 只給出候選，用真實 Jaccard 相似度排序
+        matches = [(_jaccard(shingles, _shingles(source, self.ngram)), source, translated) for source, translated in rows]
+        matches = [m for m in matches if m[0] >= min_similarity]
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches[:k]
+
+    def find_reusable(self, kind: str, text: str) -> Optional[str]:
+        """
+        幾乎相同的舊譯文可直接重用
+        數字不同（如 Q3 / Q4、金額）的標題意思不同，不重用
+        """
+        matches = self.lookup(kind, text, k=1, min_similarity=self.reuse_threshold)
+        if matches and key_numbers(matches[0][1]) == key_numbers(text):
+            return matches[0][2]
+        return None
+
+    def prune(self) -> int:
+        """
+        刪除超過保留期的譯文，以及超出條數上限時最早的譯文，連同它們的 LSH 分桶
+
+        Returns:
+            刪除的條數
+        """
+        if not self.ttl_seconds and not self.max_entries:
+            return 0
+
+        conditions, params = [], []
+        if self.ttl_seconds:
+            conditions.append("created_at < ?")
+            params.append(time.time() - self.ttl_seconds)
+        if self.max_entries:
+            conditions.append("id IN (SELECT id FROM translation_memory ORDER BY id DESC LIMIT -1 OFFSET ?)")
+            params.append(self.max_entries)
+        expired = f"SELECT id FROM translation_memory WHERE {' OR '.join(conditions)}"
+
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute(f"DELETE FROM translation_memory_lsh WHERE memory_id IN ({expired})", params)
+            deleted = conn.execute(f"DELETE FROM translation_memory WHERE id IN ({expired})", params).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+        if deleted:
+            logger.info(f"🧹 Pruned {deleted} old translation memory entries")
+        return deleted
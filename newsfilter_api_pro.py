@@ -3,13 +3,15 @@
 使用新的NewsFilter API替换Selenium，保持原有格式和接口
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import logging
 import traceback
 import asyncio
 import os
+import uuid
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -21,17 +23,30 @@ load_dotenv()
 
 from app.services.news_service import SuperFastNewsService
 from app.services.worker_manager import NewsWorkerSystem
+from app.services.article_export import ArticleExporter, EXPORT_FORMATS
+from app.utils.logger import setup_logging, request_id_var
+from app.utils.response_cache import ResponseCache, dumps
+# 註冊 limits 的 sqlite:// 存儲
+import app.database.rate_limit_storage  # noqa: F401
+from app.utils.cancellation import CancellationToken, cancel_token_var
+from app.utils.near_duplicate import collapse_near_duplicates
+from app.utils.date_parser import parse_duration, parse_time_value
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 配置日志（QueueHandler + 背景線程輸出JSON）
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 初始化服务
 news_service = None
 worker_system = None
 
+# 預序列化響應緩存（按 symbol + limit 保存字節和ETag）
+response_cache = ResponseCache()
+
 # 初始化Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
+# 計數默認保存在共享的 cache.db，多個 worker 進程共用同一個限額；也可以設為 redis://localhost:6379 等
+rate_limit_storage_uri = os.getenv("RATE_LIMIT_STORAGE_URI", "sqlite:///cache.db")
+limiter = Limiter(key_func=get_remote_address, storage_uri=rate_limit_storage_uri)
 # 每分鐘30個請求的全局限制
 
 @asynccontextmanager
@@ -40,12 +55,19 @@ async def lifespan(app: FastAPI):
     # 启动
     global news_service, worker_system
     logger.info("🚀 Starting NewsFilter Pro API...")
-    news_service = SuperFastNewsService()
+    news_service = SuperFastNewsService(response_cache=response_cache)
     
     # 重啟時清除登錄失敗冷卻，讓系統重新嘗試登錄
     news_service.auth._clear_login_failure()
     logger.info("🔄 Auth failure status cleared on startup")
     
+    # 後台維持JWT有效，上游調用不用等登錄
+    news_service.auth.start_background_refresh()
+    
+    # translate=async 的後台翻譯隊列、過期緩存清理、監控列表批量抓取（設置了 WATCHLIST_SYMBOLS 時）：
+    # 多進程部署時只由選出的一個進程運行，其他進程退出後由剩下的進程接手
+    news_service.leader.start()
+    
     # 启动工作者系统 (10个worker)
     worker_system = NewsWorkerSystem(news_service, worker_count=10)
     await worker_system.start()
@@ -59,6 +81,8 @@ async def lifespan(app: FastAPI):
     if worker_system:
         await worker_system.stop()
     if news_service:
+        news_service.auth.stop_background_refresh()
+        await news_service.leader.stop()
         news_service.cleanup_cache()
 
 # 创建FastAPI应用
@@ -72,8 +96,54 @@ app = FastAPI(
 # 添加Rate Limiting
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """為每個請求設置請求ID，用於關聯日誌"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# 單個請求的截止時間，超時或客戶端斷開後停止上游請求和翻譯
+request_deadline = float(os.getenv("REQUEST_DEADLINE_SECONDS", "45"))
+
+async def _cancel_on_disconnect(request: Request, token: CancellationToken, poll_interval: float = 0.5):
+    """輪詢客戶端連接，斷開時取消請求"""
+    while not token.cancelled:
+        if await request.is_disconnected():
+            logger.info("🔌 Client disconnected, cancelling request")
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(poll_interval)
+
+@asynccontextmanager
+async def _cancellation_scope(request: Request):
+    """為請求創建取消令牌（帶截止時間），並在客戶端斷開時取消"""
+    token = CancellationToken(request_deadline)
+    context_token = cancel_token_var.set(token)
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, token))
+    try:
+        yield token
+    finally:
+        watcher.cancel()
+        cancel_token_var.reset(context_token)
+
+def _raise_for_error_message(error_msg: str):
+    """把服務返回的錯誤訊息轉為HTTP錯誤"""
+    if "NewsFilter Fail" in error_msg:
+        raise HTTPException(status_code=503, detail="NewsFilter service temporarily unavailable")
+    if "Request cancelled" in error_msg:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    raise HTTPException(status_code=500, detail=error_msg)
+
 # 保持与原API相同的响应模型
 class NewsResponse(BaseModel):
+    article_id: Optional[str] = None  # 文章唯一ID，可作為 since 游標
     title: str
     title_cn: Optional[str]
     summary: str
@@ -86,6 +156,12 @@ class NewsResponse(BaseModel):
     type: str
     score: Optional[float]
     keywords: Optional[List[str]]
+    translation_pending: Optional[bool] = None  # 只在 translate=async 時出現
+    sources: Optional[List[dict]] = None  # 只在 collapse=true 時出現，列出同一新聞的所有轉載
+
+class SearchResponse(NewsResponse):
+    rank: float  # BM25 分數，越小越相關
+    snippet: str  # 命中片段，關鍵詞用 <b></b> 標出
 
 class ServiceStats(BaseModel):
     auth: dict
@@ -104,6 +180,10 @@ async def root(request: Request):
         "endpoints": [
             "/news/symbol/{symbol} - 获取股票新闻（与原API兼容）",
             "/news/symbol/{symbol}/fast - 高速获取股票新闻",
+            "/news/search?q= - 本地全文搜索（不调用上游）",
+            "/news/top?window=6h - 跨股票的高分新闻",
+            "/news/symbol/{symbol}/history?from=&to= - 历史新闻（NDJSON流）",
+            "/export?symbols=&from=&to=&format=ndjson|arrow|parquet - 批量導出文章",
             "/stats - 查看服务状态",
             "/health - 健康检查"
         ]
@@ -121,6 +201,7 @@ async def service_stats(request: Request):
     """获取服务统计信息"""
     try:
         stats = news_service.get_service_stats()
+        stats["cache"]["response_cache"] = response_cache.get_stats()
         return stats
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
@@ -131,8 +212,10 @@ async def service_stats(request: Request):
 async def reset_auth_failure(request: Request):
     """重置认证失败状态 (管理员功能)"""
     try:
-        if news_service and hasattr(news_service, 'auth_manager'):
-            news_service.auth_manager._clear_login_failure()
+        if news_service:
+            news_service.auth._clear_login_failure()
+            # 同時關閉所有上游熔斷（429/5xx/超時）
+            news_service.circuit_breaker.reset()
             return {"message": "Auth failure status cleared successfully", "status": "success"}
         else:
             raise HTTPException(status_code=503, detail="Service not available")
@@ -140,15 +223,54 @@ async def reset_auth_failure(request: Request):
         logger.error(f"Reset auth error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to reset auth: {e}")
 
+@app.get("/admin/translation-failures")
+@limiter.limit("5/minute")
+async def translation_failures(request: Request, limit: int = 50):
+    """查看多次重試後仍失敗的翻譯任務 (管理员功能)"""
+    try:
+        return news_service.translation_queue.job_store.get_failures(min(limit, 500))
+    except Exception as e:
+        logger.error(f"Translation failures error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to load translation failures: {e}")
+
+def _cursor_headers(meta: dict, since: Optional[str]) -> dict:
+    """
+    下一個 since 游標 "時間戳:文章ID"：本頁（過濾前）位置最後的文章，同一秒發布的文章以文章ID區分；
+    沒有新文章時沿用原游標
+    """
+    cursor = meta.get("cursor") or since
+    return {"X-Next-Cursor": cursor} if cursor else {}
+
+def _freshness_headers(meta: dict) -> dict:
+    """數據來源和新鮮度響應頭；降級返回的過期緩存帶 Warning: 110"""
+    if not meta.get("source"):
+        return {}
+    headers = {"X-Data-Source": meta["source"], "X-Data-Freshness": meta["freshness"]}
+    if meta.get("age") is not None:
+        headers["X-Data-Age"] = str(meta["age"])
+    if meta["freshness"] == "stale":
+        headers["Warning"] = '110 - "Response is Stale"'
+    return headers
+
+def _store_response(cache_key: tuple, articles: List[dict], headers: dict):
+    """序列化響應；有翻譯尚未完成的文章時不緩存，讓下次請求拿到翻譯"""
+    if any(a.get("translation_pending") for a in articles):
+        return response_cache.build(articles, headers)
+    return response_cache.put(cache_key, articles, headers)
+
 # 保持与原API完全相同的接口
 @app.get("/news/symbol/{symbol}", response_model=List[NewsResponse])
 @limiter.limit("30/minute")  # 主要API端點限制
-async def get_news_by_symbol(request: Request, symbol: str):
+async def get_news_by_symbol(request: Request, symbol: str, since: Optional[str] = None, translate: str = "sync",
+                             collapse: bool = False):
     """
     获取指定股票的新闻（与原API接口完全兼容）
     
     Args:
         symbol: 股票代码（如 TSLA, AAPL）
+        since: 可选游標（X-Next-Cursor 頭的值、時間戳或文章ID），返回游標之後最早的文章（從舊到新）；下一個游標在 X-Next-Cursor 頭
+        translate: sync（默認，等待翻譯）或 async（立即返回，翻譯在後台完成）
+        collapse: 把近似重複的轉載合併為一條，sources 列出所有來源
         
     Returns:
         新闻列表，格式与原API相同
@@ -156,26 +278,39 @@ async def get_news_by_symbol(request: Request, symbol: str):
     try:
         logger.info(f"📰 Fetching news for symbol: {symbol}")
         
+        # 內容未變時直接返回已序列化的字節（或304）
+        translate_async = translate == "async"
+        cache_key = (symbol.upper(), 10, since, translate_async, collapse)
+        cached = response_cache.get(cache_key)
+        if cached:
+            return response_cache.respond(request, cached)
+        
         # 使用Worker系统进行排队处理
         # 即使多个请求同时到达，也会进入队列由10个worker处理
-        news_articles = await worker_system.process_news_request(symbol, limit=10)
+        meta = {}
+        async with _cancellation_scope(request) as cancel_token:
+            news_articles = await worker_system.process_news_request(
+                symbol, limit=10, since=since, meta=meta, cancel_token=cancel_token,
+                translate_async=translate_async
+            )
         
         if not news_articles:
             logger.info(f"📭 No news found for {symbol}")
-            return []
+            return response_cache.respond(
+                request, response_cache.put(cache_key, [], {**_cursor_headers(meta, since), **_freshness_headers(meta)})
+            )
         
         # 检查是否有错误消息
         if len(news_articles) == 1 and "msg" in news_articles[0]:
             error_msg = news_articles[0]["msg"]
             logger.warning(f"⚠️ Service error for {symbol}: {error_msg}")
-            
-            if "NewsFilter Fail" in error_msg:
-                raise HTTPException(status_code=503, detail="NewsFilter service temporarily unavailable")
-            else:
-                raise HTTPException(status_code=500, detail=error_msg)
+            _raise_for_error_message(error_msg)
         
         logger.info(f"✅ Found {len(news_articles)} news articles for {symbol}")
-        return news_articles
+        headers = {**_cursor_headers(meta, since), **_freshness_headers(meta)}
+        if collapse:
+            news_articles = collapse_near_duplicates(news_articles)
+        return response_cache.respond(request, _store_response(cache_key, news_articles, headers))
         
     except HTTPException:
         raise  # 重新抛出HTTP异常
@@ -190,13 +325,17 @@ async def get_news_by_symbol(request: Request, symbol: str):
 # 新增：快速获取接口
 @app.get("/news/symbol/{symbol}/fast", response_model=List[NewsResponse])
 @limiter.limit("20/minute")  # 快速端點稍微寬鬆的限制
-async def get_news_by_symbol_fast(request: Request, symbol: str, limit: int = 20):
+async def get_news_by_symbol_fast(request: Request, symbol: str, limit: int = 20, since: Optional[str] = None,
+                                  translate: str = "sync", collapse: bool = False):
     """
     高速获取指定股票的新闻（更多数量，更快响应）
     
     Args:
         symbol: 股票代码（如 TSLA, AAPL）
         limit: 返回数量限制（默认20，最大50）
+        since: 可选游標（X-Next-Cursor 頭的值、時間戳或文章ID），返回游標之後最早的文章（從舊到新）；下一個游標在 X-Next-Cursor 頭
+        translate: sync（默認，等待翻譯）或 async（立即返回，翻譯在後台完成）
+        collapse: 把近似重複的轉載合併為一條，sources 列出所有來源
         
     Returns:
         新闻列表
@@ -207,21 +346,32 @@ async def get_news_by_symbol_fast(request: Request, symbol: str, limit: int = 20
         
         logger.info(f"⚡ Fast fetching {limit} news for symbol: {symbol}")
         
-        news_articles = await news_service.get_symbol_news(symbol, limit=limit)
+        translate_async = translate == "async"
+        cache_key = (symbol.upper(), limit, since, translate_async, collapse)
+        cached = response_cache.get(cache_key)
+        if cached:
+            return response_cache.respond(request, cached)
+        
+        meta = {}
+        async with _cancellation_scope(request):
+            news_articles = await news_service.get_symbol_news(
+                symbol, limit=limit, since=since, meta=meta, translate_async=translate_async
+            )
         
         if not news_articles:
-            return []
+            return response_cache.respond(
+                request, response_cache.put(cache_key, [], {**_cursor_headers(meta, since), **_freshness_headers(meta)})
+            )
         
         # 处理错误消息
         if len(news_articles) == 1 and "msg" in news_articles[0]:
-            error_msg = news_articles[0]["msg"]
-            if "NewsFilter Fail" in error_msg:
-                raise HTTPException(status_code=503, detail="NewsFilter service temporarily unavailable")
-            else:
-                raise HTTPException(status_code=500, detail=error_msg)
+            _raise_for_error_message(news_articles[0]["msg"])
         
         logger.info(f"⚡ Fast returned {len(news_articles)} articles for {symbol}")
-        return news_articles
+        headers = {**_cursor_headers(meta, since), **_freshness_headers(meta)}
+        if collapse:
+            news_articles = collapse_near_duplicates(news_articles)
+        return response_cache.respond(request, _store_response(cache_key, news_articles, headers))
         
     except HTTPException:
         raise
@@ -229,6 +379,143 @@ async def get_news_by_symbol_fast(request: Request, symbol: str, limit: int = 20
         logger.error(f"❌ Error in fast endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Fast endpoint error: {str(e)}")
 
+def _parse_time_param(name: str, value: Optional[str]) -> Optional[int]:
+    """解析時間查詢參數，格式錯誤返回 400"""
+    if not value:
+        return None
+    timestamp = parse_time_value(value)
+    if timestamp is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+    return timestamp
+
+@app.get("/news/symbol/{symbol}/history")
+@limiter.limit("20/minute")
+async def get_symbol_history(request: Request, symbol: str, from_: Optional[str] = Query(None, alias="from"),
+                             to: Optional[str] = None, cursor: Optional[str] = None, limit: int = 1000):
+    """
+    从MongoDB按發布時間從新到舊流式返回某股票的歷史新聞（NDJSON，每行一篇）
+    
+    Args:
+        symbol: 股票代码
+        from / to: 發布時間範圍 [from, to)，時間戳或 ISO 日期
+        cursor: 下一頁游標，取自上一頁最後一行的 next_cursor
+        limit: 每頁数量（默认1000，最大50000）
+        
+    Returns:
+        application/x-ndjson；返回滿 limit 條時最後一行為 {"next_cursor": "..."}
+    """
+    if not news_service.mongodb:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    
+    from_ts = _parse_time_param("from", from_)
+    to_ts = _parse_time_param("to", to)
+    try:
+        rows = news_service.symbol_history(symbol, from_ts, to_ts, cursor, min(max(limit, 1), 50000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    
+    # 同步迭代器由 Starlette 在線程池中逐條拉取，客戶端斷開時關閉 MongoDB 游標
+    return StreamingResponse((dumps(row) + b"\n" for row in rows), media_type="application/x-ndjson")
+
+@app.get("/export")
+@limiter.limit("5/minute")
+async def export_articles(request: Request, symbols: Optional[str] = None,
+                          from_: Optional[str] = Query(None, alias="from"), to: Optional[str] = None,
+                          format: str = "ndjson"):
+    """
+    从MongoDB流式導出文章（帶翻譯、評分和關鍵字），供數據倉庫批量導入
+    
+    Args:
+        symbols: 可选，逗號分隔的股票代碼，不填為全部
+        from / to: 發布時間範圍 [from, to)，時間戳或 ISO 日期
+        format: ndjson（默认）、arrow（Arrow IPC 流）或 parquet，後兩者需要安裝 pyarrow
+        
+    Returns:
+        分塊傳輸的文件流，按發布時間從新到舊
+    """
+    if not news_service.mongodb:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    
+    from_ts = _parse_time_param("from", from_)
+    to_ts = _parse_time_param("to", to)
+    symbol_list = [s.strip().upper() for s in (symbols or "").split(",") if s.strip()]
+    
+    exporter = ArticleExporter(news_service.mongodb, news_service.news_analyzer)
+    try:
+        chunks = exporter.export(format, symbol_list or None, from_ts, to_ts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="articles.{extension}"'}
+    )
+
+@app.get("/news/search", response_model=List[SearchResponse])
+@limiter.limit("60/minute")  # 只查本地索引，不消耗上游額度
+async def search_news(request: Request, q: str, symbols: Optional[str] = None, since: Optional[str] = None,
+                      limit: int = 20):
+    """
+    在本地緩存中全文搜索新聞（SQLite FTS5，BM25 排序）
+    
+    Args:
+        q: 關鍵詞，多個詞都要出現；"..." 為短語，OR 為或，詞尾 * 為前綴匹配
+        symbols: 可选，逗號分隔的股票代碼，只搜索關聯這些股票的文章
+        since: 可选游標（時間戳、ISO 日期或文章ID），只搜索更新的文章
+        limit: 返回数量限制（默认20，最大100）
+        
+    Returns:
+        按相關度排序的新聞列表，帶 rank 和 snippet
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query parameter q must not be empty")
+    
+    try:
+        symbol_list = [s.strip().upper() for s in (symbols or "").split(",") if s.strip()]
+        results = await asyncio.to_thread(
+            news_service.search_news, q, symbol_list or None, since, min(max(limit, 1), 100)
+        )
+        logger.info(f"🔎 Search {q!r} returned {len(results)} articles")
+        return response_cache.respond(request, response_cache.build(results))
+    except Exception as e:
+        logger.error(f"❌ Error in search endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+
+@app.get("/news/top", response_model=List[NewsResponse])
+@limiter.limit("60/minute")  # 只查本地評分索引，不消耗上游額度
+async def get_top_news(request: Request, window: str = "6h", min_score: Optional[float] = None, limit: int = 20,
+                       cursor: Optional[str] = None):
+    """
+    跨所有股票、按入庫時計算的評分從高到低返回最近的新聞
+    
+    Args:
+        window: 時間窗口（如 30m、6h、2d，最長30天），按發布時間
+        min_score: 可选，最低評分
+        limit: 每頁数量（默认20，最大100）
+        cursor: 下一頁游標，取自上一頁的 X-Next-Cursor 頭
+        
+    Returns:
+        新闻列表；還有更多時下一頁游標在 X-Next-Cursor 頭
+    """
+    window_seconds = parse_duration(window)
+    if not window_seconds or window_seconds > 30 * 86400:
+        raise HTTPException(status_code=400, detail="window must be a duration such as 30m, 6h or 2d (max 30d)")
+    
+    try:
+        articles, next_cursor = await asyncio.to_thread(
+            news_service.get_top_news, window_seconds, min_score, min(max(limit, 1), 100), cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    except Exception as e:
+        logger.error(f"❌ Error in top news endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Top news error: {str(e)}")
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return response_cache.respond(request, response_cache.build(articles, headers))
+
 # 新增：缓存管理接口
 @app.post("/cache/cleanup")
 async def cleanup_cache():
@@ -256,6 +543,14 @@ if __name__ == "__main__":
     
     # 从环境变量获取端口，默认8001
     port = int(os.getenv("API_PORT", "8001"))
+    # 進程數：令牌桶、單飛鎖和JWT都存在共享的 SQLite 中，可以直接多進程
+    workers = int(os.getenv("API_WORKERS", "1"))
+    
+    if workers > 1 and rate_limit_storage_uri.startswith("memory://"):
+        # 每個進程各自計數，實際限額會變成 N 倍
+        logger.error("❌ API_WORKERS > 1 requires shared rate limit storage; "
+                     "unset RATE_LIMIT_STORAGE_URI (shared cache.db) or point it to redis://")
+        raise SystemExit(1)
     
     print(f"🚀 Starting NewsFilter Pro API on port {port}")
     print("📋 Available endpoints:")
@@ -265,8 +560,11 @@ if __name__ == "__main__":
     print("   GET /health - 健康检查")
     
     uvicorn.run(
-        app, 
+        # 多進程時 uvicorn 需要用導入字符串在每個子進程中重新加載應用
+        "newsfilter_api_pro:app" if workers > 1 else app, 
         host="0.0.0.0", 
         port=port,
-        log_level="info"
-    )
\ No newline at end of file
+        workers=workers,
+        log_level="info",
+        log_config=None  # 使用 setup_logging 的隊列日誌，不讓uvicorn另建同步handler
+    )
@@ -0,0 +1,145 @@
+"""
+NewsFilter 命令行工具
+直接讀寫本地存儲，不經過 API 服務、不調用上游和 OpenAI
+
+用法:
+    python newsfilter_cli.py export --symbols AAPL,MSFT --from 2025-01-01 --format parquet -o aapl.parquet
+    python newsfilter_cli.py import dump-2025-01.jsonl.gz articles.parquet --workers 8
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database.mongodb_manager import MongoDBManager
+from app.database.sqlite_cache import SQLiteCacheManager
+from app.services.article_export import ArticleExporter, EXPORT_FORMATS
+from app.services.article_import import ArticleImporter
+from app.utils.date_parser import parse_time_value
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+logger = logging.getLogger("newsfilter_cli")
+
+
+def _time_arg(value: str) -> int:
+    """時間參數：時間戳或 ISO 日期"""
+    timestamp = parse_time_value(value)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f"invalid time: {value}")
+    return timestamp
+
+
+def _symbols_arg(value: str):
+    return [s.strip().upper() for s in value.split(",") if s.strip()]
+
+
+def cmd_export(args) -> int:
+    """導出文章到文件或標準輸出"""
+    mongodb = MongoDBManager()
+    if mongodb.client is None:
+        logger.error("❌ MongoDB is not available")
+        return 1
+
+    exporter = ArticleExporter(mongodb, batch_size=args.batch_size)
+    try:
+        chunks = exporter.export(args.format, args.symbols or None, args.from_ts, args.to_ts)
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        return 2
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    start = time.time()
+    last_report = start
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            if time.time() - last_report >= 5:
+                last_report = time.time()
+                logger.info(f"📦 Exported {exporter.exported} articles "
+                            f"({exporter.exported / (last_report - start):.0f}/s)")
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+        mongodb.close()
+
+    logger.info(f"✅ Exported {exporter.exported} articles in {time.time() - start:.1f}s")
+    return 0
+
+
+def cmd_import(args) -> int:
+    """從轉儲文件導入文章到 MongoDB 和 SQLite 緩存"""
+    mongodb = None
+    if not args.no_mongodb:
+        mongodb = MongoDBManager()
+        if mongodb.client is None:
+            logger.error("❌ MongoDB is not available (use --no-mongodb to load only the SQLite cache)")
+            return 1
+    sqlite_cache = None if args.no_sqlite else SQLiteCacheManager()
+
+    importer = ArticleImporter(
+        mongodb, sqlite_cache,
+        workers=args.workers,
+        chunk_size=args.batch_size,
+        sqlite_hours=args.sqlite_hours,
+        default_symbol=args.symbol
+    )
+
+    def report(stats):
+        logger.info(f"📦 Read {stats['read']} articles ({stats['rate']}/s), "
+                    f"MongoDB +{stats['mongodb_saved']}, SQLite +{stats['sqlite_saved']}, "
+                    f"{stats['errors']} bad lines")
+
+    try:
+        stats = importer.run(args.files, progress=report)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ {e}")
+        return 2
+    finally:
+        if mongodb:
+            mongodb.close()
+
+    logger.info(f"✅ Imported {stats['read']} articles in {stats['elapsed_seconds']}s")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="NewsFilter 本地存儲工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="從 MongoDB 導出文章（NDJSON / Arrow / Parquet）")
+    export.add_argument("--symbols", type=_symbols_arg, default=[], help="逗號分隔的股票代碼，不填為全部")
+    export.add_argument("--from", dest="from_ts", type=_time_arg, help="發布時間下限（含），時間戳或 ISO 日期")
+    export.add_argument("--to", dest="to_ts", type=_time_arg, help="發布時間上限（不含）")
+    export.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    export.add_argument("-o", "--output", help="輸出文件，不填寫到標準輸出")
+    export.add_argument("--batch-size", type=int, default=1000, help="每批讀取 / 寫入的文章數")
+    export.set_defaults(func=cmd_export)
+
+    imp = subparsers.add_parser("import", help="從轉儲文件導入文章（JSONL 或 export 導出的文件）")
+    imp.add_argument("files", nargs="+", help=".jsonl / .ndjson（可 .gz）、.parquet 或 .arrows 文件")
+    imp.add_argument("--workers", type=int, help="預處理進程數，默認為 CPU 核數")
+    imp.add_argument("--batch-size", type=int, default=2000, help="每批寫入的文章數（一次 bulk_write / 一個事務）")
+    imp.add_argument("--symbol", help="沒有 symbols 欄位的文章歸入此股票")
+    imp.add_argument("--sqlite-hours", type=float,
+                     help="只把發布時間在此小時數內的文章寫入 SQLite 緩存，默認為緩存保留期")
+    imp.add_argument("--no-mongodb", action="store_true", help="不寫入 MongoDB")
+    imp.add_argument("--no-sqlite", action="store_true", help="不寫入 SQLite 緩存")
+    imp.set_defaults(func=cmd_import)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
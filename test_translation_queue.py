@@ -0,0 +1,63 @@
+"""
+翻譯任務隊列測試
+用臨時 SQLite 文件和假的 ChatGPT 回覆，不需要 OpenAI key：python -m pytest test_translation_queue.py
+"""
+
+import asyncio
+import sqlite3
+
+from app.database.shared_state import SharedStateManager
+from app.database.translation_jobs import TranslationJobStore
+from app.services.translation_queue import BackgroundTranslationQueue
+from app.utils.chatgpt_translator import ChatGPTTranslator
+
+
+def _make_queue(tmp_path, monkeypatch, reply="", rpm="500", tpm="200000"):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_RPM", rpm)
+    monkeypatch.setenv("OPENAI_TPM", tpm)
+
+    translator = ChatGPTTranslator()
+    translator.enabled = True
+    translator.memory = None
+    prompts = []
+    translator._chat_completion = lambda **kwargs: prompts.append(kwargs["messages"]) or reply
+
+    saved = []
+    db_path = str(tmp_path / "cache.db")
+    queue = BackgroundTranslationQueue(
+        translator,
+        lambda original, title_cn, summary_cn: saved.append((title_cn, summary_cn)),
+        job_store=TranslationJobStore(db_path),
+        shared_state=SharedStateManager(db_path),
+    )
+    return queue, saved, prompts
+
+
+def test_job_with_empty_summary_translates_title_only(tmp_path, monkeypatch):
+    queue, saved, prompts = _make_queue(tmp_path, monkeypatch, reply='{"title_cn": "蘋果發布財報"}')
+    queue.job_store.enqueue("a1", {"title": "Apple reports earnings", "description": ""},
+                            "Apple reports earnings", "", "AAPL")
+
+    asyncio.run(queue._run_job(queue.job_store.claim()))
+
+    assert saved == [("蘋果發布財報", "")]
+    assert '"title_cn"' in prompts[0][0]["content"] and '"summary_cn"' not in prompts[0][0]["content"]
+    assert not queue.job_store.is_pending("a1")
+    assert queue.job_store.get_failures() == []
+
+
+def test_tpm_timeout_returns_rpm_token(tmp_path, monkeypatch):
+    queue, _, _ = _make_queue(tmp_path, monkeypatch, rpm="60", tpm="600")
+
+    # 先用完 TPM 桶，下一次翻譯等不到 token
+    assert queue._acquire_budget(60, timeout=0)
+    conn = sqlite3.connect(queue.shared_state.db_path)
+    rpm_before = conn.execute("SELECT tokens FROM rate_buckets WHERE bucket_name = 'openai_rpm'").fetchone()[0]
+
+    assert not queue._acquire_budget(60, timeout=0.01)
+
+    rpm_after = conn.execute("SELECT tokens FROM rate_buckets WHERE bucket_name = 'openai_rpm'").fetchone()[0]
+    conn.close()
+    # 只多了等待期間按速率補充的一點點，沒有被扣掉一個請求
+    assert rpm_before <= rpm_after < rpm_before + 0.1